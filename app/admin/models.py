@@ -1,5 +1,8 @@
 from pydantic import BaseModel, Field, EmailStr
 from datetime import datetime
+from typing import List
+
+from app.admin.verification import VERIFICATION_BULK_MAX
 
 
 class VerificationRequestModel(BaseModel):
@@ -30,4 +33,13 @@ class VerificationRequestModel(BaseModel):
                 "request_date": "2025-05-18T07:46:02.978+00:00",
                 "profile_image": "base64_encoded_profile_image..."
             }
-        }
\ No newline at end of file
+        }
+
+
+class VerificationDecision(BaseModel):
+    request_id: str
+    status: str = Field(..., pattern="^(approved|rejected)$")
+
+
+class VerificationDecisions(BaseModel):
+    decisions: List[VerificationDecision] = Field(..., min_length=1, max_length=VERIFICATION_BULK_MAX)
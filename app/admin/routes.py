@@ -1,117 +1,252 @@
+import io
+import csv
+import asyncio
+from typing import Optional
+
 from bson import ObjectId
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Body, Depends, File, HTTPException, Query, UploadFile
+from app.auth.jwt_handler import get_current_admin
+from app.auth.user_import import detect_format, import_users, read_rows, IMPORT_FORMATS, USER_IMPORT_BATCH_SIZE
 from app.database import get_db
-from app.admin.utils import format_verification_request
+from app.admin.models import VerificationDecisions
+from app.admin.verification import decide_verification_request, decide_verification_requests, VERIFICATION_DECISIONS
+from app.admin.utils import (
+    format_verification_summary,
+    verification_status_counts_pipeline,
+    EXPORT_COLLECTIONS,
+    VERIFICATION_QUEUE_SORT,
+    VERIFICATION_REQUEST_PROJECTION,
+    VERIFICATION_STATUSES,
+    VERIFICATION_SUMMARY_PROJECTION,
+)
+from app.nft.similarity import near_duplicate_index, NEAR_DUPLICATE_DISTANCE
+from app.pagination import fetch_page
+from app.responses import FastJSONResponse
+from app.workers import WorkerPoolBusy
+from app.streaming import iter_documents, stream_documents, STREAM_BATCH_MAX, STREAM_BATCH_SIZE
 
 admin_router = APIRouter()
 
+# json returns a list; ndjson and array stream documents as the cursor yields them
+LISTING_FORMATS = "^(json|ndjson|array)$"
 
-@admin_router.get("/verification-requests", response_model=list)
-async def get_all_verification_requests():
+VERIFICATION_QUEUE_PAGE_SIZE = 50
+VERIFICATION_QUEUE_PAGE_MAX = 200
+
+
+async def list_verification_requests(query: dict, not_found_detail: str, format: str, batch_size: int):
     """
-    Fetch all verification requests without authorization
+    Shared body of the verification request listings: a list by default, or a stream
     """
     db = await get_db()
 
-    cursor = db["VerificationRequests"].find().sort("request_date", -1)  # Sort by request_date descending
-    verification_requests = []
+    cursor = db["VerificationRequests"].find(query, VERIFICATION_REQUEST_PROJECTION)
+    cursor = cursor.sort("request_date", -1)  # Sort by request_date descending
+
+    if format != "json":
+        return stream_documents(iter_documents(cursor, batch_size), format)
 
-    async for request in cursor:
-        formatted_request = format_verification_request(request)
-        verification_requests.append(formatted_request)
+    verification_requests = await cursor.to_list(length=None)
 
     if not verification_requests:
-        raise HTTPException(status_code=404, detail="No verification requests found")
+        raise HTTPException(status_code=404, detail=not_found_detail)
 
-    return verification_requests
+    return FastJSONResponse(verification_requests)
+
+
+@admin_router.get("/verification-requests", response_model=list)
+async def get_all_verification_requests(
+    format: str = Query("json", regex=LISTING_FORMATS),
+    batch_size: int = Query(STREAM_BATCH_SIZE, ge=1, le=STREAM_BATCH_MAX)
+):
+    """
+    Fetch all verification requests without authorization
+    """
+    return await list_verification_requests({}, "No verification requests found", format, batch_size)
 
 
 @admin_router.get("/pending-verification-requests", response_model=list)
-async def get_pending_verification_requests():
+async def get_pending_verification_requests(
+    format: str = Query("json", regex=LISTING_FORMATS),
+    batch_size: int = Query(STREAM_BATCH_SIZE, ge=1, le=STREAM_BATCH_MAX)
+):
     """
     Fetch all pending verification requests
     """
-    db = await get_db()
+    return await list_verification_requests({"status": "pending"}, "No pending verification requests found",
+                                            format, batch_size)
 
-    cursor = db["VerificationRequests"].find({"status": "pending"}).sort("request_date", -1)  # Sort by request_date descending
-    verification_requests = []
 
-    async for request in cursor:
-        formatted_request = format_verification_request(request)
-        verification_requests.append(formatted_request)
+@admin_router.get("/approved-verification-requests", response_model=list)
+async def get_approved_verification_requests(
+    format: str = Query("json", regex=LISTING_FORMATS),
+    batch_size: int = Query(STREAM_BATCH_SIZE, ge=1, le=STREAM_BATCH_MAX)
+):
+    """
+    Fetch all approved verification requests
+    """
+    return await list_verification_requests({"status": "approved"}, "No approved verification requests found",
+                                            format, batch_size)
 
-    if not verification_requests:
-        raise HTTPException(status_code=404, detail="No pending verification requests found")
 
-    return verification_requests
+@admin_router.get("/rejected-verification-requests", response_model=list)
+async def get_rejected_verification_requests(
+    format: str = Query("json", regex=LISTING_FORMATS),
+    batch_size: int = Query(STREAM_BATCH_SIZE, ge=1, le=STREAM_BATCH_MAX)
+):
+    """
+    Fetch all rejected verification requests
+    """
+    return await list_verification_requests({"status": "rejected"}, "No rejected verification requests found",
+                                            format, batch_size)
 
 
-@admin_router.get("/approved-verification-requests", response_model=list)
-async def get_approved_verification_requests():
+@admin_router.get("/verification-queue")
+async def get_verification_queue(
+    status: Optional[str] = Query(None, regex="^(pending|approved|rejected)$"),
+    limit: int = Query(VERIFICATION_QUEUE_PAGE_SIZE, ge=1, le=VERIFICATION_QUEUE_PAGE_MAX),
+    after: Optional[str] = Query(None, description="next_cursor from the previous page")
+):
     """
-    Fetch all approved verification requests
+    One page of the verification queue (without images), plus per-status counts for the dashboard
     """
     db = await get_db()
+    collection = db["VerificationRequests"]
+
+    query = {"status": status} if status else {}
+
+    # Two queries, sent together so the call still costs one round trip. A $facet over both would
+    # need every request document streamed through it, whereas apart the page is an indexed
+    # (status, request_date, _id) range and the counts a covered scan of the status index.
+    try:
+        (requests, next_cursor), summary = await asyncio.gather(
+            fetch_page(collection, query, VERIFICATION_QUEUE_SORT, limit, after, VERIFICATION_SUMMARY_PROJECTION),
+            collection.aggregate(verification_status_counts_pipeline()).to_list(length=1),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    counts = {status_name: 0 for status_name in VERIFICATION_STATUSES}
+    total = 0
+    if summary:
+        counts.update({row["_id"]: row["count"] for row in summary[0]["by_status"]})
+        total = summary[0]["total"][0]["count"] if summary[0]["total"] else 0
+
+    # The rows come back with their raw _id and request_date because next_cursor is made from
+    # them; format_verification_summary only renames _id and formats the date of at most `limit` rows
+    return FastJSONResponse({
+        "items": [format_verification_summary(request) for request in requests],
+        "next_cursor": next_cursor,
+        "counts": {**counts, "total": total},
+    })
+
+
+@admin_router.get("/verification-requests/{request_id}")
+async def get_verification_request(request_id: str):
+    """
+    Fetch a single verification request, including its images
+    """
+    if not ObjectId.is_valid(request_id):
+        raise HTTPException(status_code=400, detail="Invalid verification request ID")
 
-    cursor = db["VerificationRequests"].find({"status": "approved"}).sort("request_date", -1)  # Sort by request_date descending
-    verification_requests = []
-
-    async for request in cursor:
-        formatted_request = format_verification_request(request)
-        verification_requests.append(formatted_request)
+    db = await get_db()
+    request = await db["VerificationRequests"].find_one({"_id": ObjectId(request_id)}, VERIFICATION_REQUEST_PROJECTION)
 
-    if not verification_requests:
-        raise HTTPException(status_code=404, detail="No approved verification requests found")
+    if not request:
+        raise HTTPException(status_code=404, detail="Verification request not found")
 
-    return verification_requests
+    return FastJSONResponse(request)
 
 
-@admin_router.get("/rejected-verification-requests", response_model=list)
-async def get_rejected_verification_requests():
+@admin_router.get("/nft-similarity/clusters")
+async def get_near_duplicate_clusters(
+    max_distance: int = Query(NEAR_DUPLICATE_DISTANCE, ge=0, le=32, description="Max differing pHash bits")
+):
     """
-    Fetch all rejected verification requests
+    Groups of NFTs whose images are near-copies of each other, largest first
     """
-    db = await get_db()
+    await near_duplicate_index.sync()
+    try:
+        clusters = await near_duplicate_index.clusters(max_distance)
+    except WorkerPoolBusy:
+        raise HTTPException(status_code=503, detail="Image workers are busy, please try again shortly")
+
+    return {"count": len(clusters), "clusters": clusters, "scanned": len(near_duplicate_index.entries)}
+
+
+@admin_router.get("/export/{collection}", dependencies=[Depends(get_current_admin)])
+async def export_collection(
+    collection: str,
+    after: Optional[str] = Query(None, description="_id of the last document already received, to resume"),
+    format: str = Query("ndjson", regex="^(ndjson|array)$"),
+    batch_size: int = Query(STREAM_BATCH_SIZE, ge=1, le=STREAM_BATCH_MAX)
+):
+    """
+    Stream a whole collection in _id order; pass the last _id received as `after` to resume
+    """
+    if collection not in EXPORT_COLLECTIONS:
+        raise HTTPException(status_code=404, detail=f"Collection can't be exported. Allowed: {', '.join(EXPORT_COLLECTIONS)}")
 
-    cursor = db["VerificationRequests"].find({"status": "rejected"}).sort("request_date", -1)  # Sort by request_date descending
-    verification_requests = []
+    export = EXPORT_COLLECTIONS[collection]
+    query = {}
+    if after:
+        if export["object_ids"] and not ObjectId.is_valid(after):
+            raise HTTPException(status_code=400, detail="Invalid value for after")
+        query["_id"] = {"$gt": ObjectId(after) if export["object_ids"] else after}
 
-    async for request in cursor:
-        formatted_request = format_verification_request(request)
-        verification_requests.append(formatted_request)
+    db = await get_db()
+    cursor = db[collection].find(query, export["projection"]).sort("_id", 1)
+    return stream_documents(iter_documents(cursor, batch_size), format)
 
-    if not verification_requests:
-        raise HTTPException(status_code=404, detail="No rejected verification requests found")
 
-    return verification_requests
+@admin_router.post("/users/import", dependencies=[Depends(get_current_admin)])
+async def import_user_accounts(
+    file: UploadFile = File(..., description="CSV with a header row, or NDJSON, with the signup fields"),
+    format: Optional[str] = Query(None, regex=f"^({'|'.join(IMPORT_FORMATS)})$",
+                                  description="Default: from the file extension"),
+    batch_size: int = Query(USER_IMPORT_BATCH_SIZE, ge=1, le=5000)
+):
+    """
+    Bulk-create user accounts and report the outcome of every row
+    """
+    lines = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        return await import_users(read_rows(lines, format or detect_format(file.filename)), batch_size)
+    except WorkerPoolBusy:
+        raise HTTPException(status_code=503, detail="Another import is using the hashing workers, please try again later")
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Could not read the file: {e}")
 
 
-@admin_router.put("/verification-requests/{request_id}/status")
+@admin_router.put("/verification-requests/{request_id}/status", dependencies=[Depends(get_current_admin)])
 async def update_verification_request_status(request_id: str, status: str):
     """
     Update the status of a verification request to 'approved' or 'rejected'
     """
-    if status not in ["approved", "rejected"]:
+    if status not in VERIFICATION_DECISIONS:
         raise HTTPException(status_code=400, detail="Invalid status. Allowed values are 'approved' or 'rejected'.")
+    if not ObjectId.is_valid(request_id):
+        raise HTTPException(status_code=400, detail="Invalid verification request ID")
 
-    db = await get_db()
-
-    # Find the verification request by ID
-    request = await db["VerificationRequests"].find_one({"_id": ObjectId(request_id)})
+    outcome, _ = await decide_verification_request(ObjectId(request_id), status)
 
-    if not request:
+    if outcome == "not_found":
         raise HTTPException(status_code=404, detail="Verification request not found")
 
-    if request["status"] != "pending":
+    if outcome == "not_pending":
         raise HTTPException(status_code=400, detail="Only pending requests can be updated")
 
-    # Update the status
-    result = await db["VerificationRequests"].update_one(
-        {"_id": ObjectId(request_id)},
-        {"$set": {"status": status}}
-    )
+    return {"message": f"Verification request {request_id} status updated to {status}"}
 
-    if result.modified_count == 0:
-        raise HTTPException(status_code=500, detail="Failed to update status")
 
-    return {"message": f"Verification request {request_id} status updated to {status}"}
\ No newline at end of file
+@admin_router.post("/verification-requests/decisions", dependencies=[Depends(get_current_admin)])
+async def decide_verification_requests_in_bulk(body: VerificationDecisions = Body(...)):
+    """
+    Approve or reject many verification requests at once. Each decision only applies to a request
+    that is still pending; the result lists the outcome for every request_id, in order.
+    """
+    results = await decide_verification_requests([(item.request_id, item.status) for item in body.decisions])
+    summary = {outcome: 0 for outcome in ("updated", "not_pending", "not_found", "invalid", "duplicate")}
+    for result in results:
+        summary[result["outcome"]] += 1
+    return {"count": len(results), **summary, "results": results}
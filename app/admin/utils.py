@@ -1,23 +1,98 @@
 from datetime import datetime
 from bson import ObjectId
 
+from app.images.store import PRIVATE_IMAGE_BASE_URL
 
-def format_verification_request(request):
+# Collections the bulk export can dump, whether their _id values are ObjectIds
+# (users use string ids), and the fields that must never leave the database
+EXPORT_COLLECTIONS = {
+    "users": {"object_ids": False, "projection": {"password": 0}},
+    "NFT": {"object_ids": True, "projection": None},
+    # ID scans are only ever shown one request at a time, never in bulk
+    "VerificationRequests": {"object_ids": True, "projection": {
+        "id_front_image": 0, "id_back_image": 0, "id_front_image_ref": 0, "id_back_image_ref": 0,
+    }},
+}
+
+VERIFICATION_STATUSES = ["pending", "approved", "rejected"]
+
+# Queue order, newest first; backed by the (status, request_date, _id) and (request_date, _id) indexes
+VERIFICATION_QUEUE_SORT = [("request_date", -1), ("_id", -1)]
+
+# Queue rows carry only what format_verification_summary returns: no ID scans, references to
+# them or profile image; those come from the detail endpoint
+VERIFICATION_SUMMARY_PROJECTION = {
+    "user_id": 1,
+    "user_email": 1,
+    "user_name": 1,
+    "address": 1,
+    "about_user_article_link": 1,
+    "status": 1,
+    "request_date": 1,
+}
+
+
+def _image_projection(field):
+    # images.derivatives.image_fields_projection for ID scans, which are kept in the
+    # private image store (without renditions) and so are only served to authorised users
+    stored = {"$ifNull": [f"${field}_ref", False]}
+    return {
+        field: {"$cond": [stored, None, {"$ifNull": [f"${field}", ""]}]},
+        f"{field}_urls": {"$cond": [
+            stored, {"original": {"$concat": [PRIVATE_IMAGE_BASE_URL + "/", f"${field}_ref.sha256"]}}, None
+        ]},
+    }
+
+
+# Verification requests shaped for the response by MongoDB itself, so documents can be
+# serialized as they come off the cursor without a per-document copy
+VERIFICATION_REQUEST_PROJECTION = {
+    "_id": 0,
+    "id": {"$toString": "$_id"},
+    "user_id": 1,
+    "user_email": 1,
+    "user_name": 1,
+    "address": 1,
+    **_image_projection("id_front_image"),
+    **_image_projection("id_back_image"),
+    "about_user_article_link": 1,
+    "status": 1,
+    "request_date": {"$cond": [
+        {"$eq": [{"$type": "$request_date"}, "date"]},
+        {"$dateToString": {"format": "%Y-%m-%d %H:%M:%S", "date": "$request_date"}},
+        "$request_date",
+    ]},
+    "profile_image": {"$ifNull": ["$profile_image", None]},
+}
+
+
+def format_verification_summary(request):
     """
-    Format verification request data for response
+    Format a verification queue row (no images) for response
     """
     return {
         "id": str(request["_id"]),
         "user_id": request["user_id"],
-        "user_email": request["user_email"],
-        "user_name": request["user_name"],
-        "address": request["address"],
-        "id_front_image": request["id_front_image"],
-        "id_back_image": request["id_back_image"],
-        "about_user_article_link": request["about_user_article_link"],
+        "user_email": request.get("user_email", ""),
+        "user_name": request.get("user_name", ""),
+        "address": request.get("address", ""),
+        "about_user_article_link": request.get("about_user_article_link", ""),
         "status": request["status"],
         "request_date": request["request_date"].strftime("%Y-%m-%d %H:%M:%S")
         if isinstance(request["request_date"], datetime)
         else request["request_date"],
-        "profile_image": request["profile_image"],
-    }
\ No newline at end of file
+    }
+
+
+def verification_status_counts_pipeline():
+    """
+    Per-status counts as a covered scan of the status index, summarised with $facet
+    """
+    return [
+        {"$match": {"status": {"$in": VERIFICATION_STATUSES}}},
+        {"$project": {"_id": 0, "status": 1}},
+        {"$facet": {
+            "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+            "total": [{"$count": "count"}],
+        }},
+    ]
@@ -0,0 +1,117 @@
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import ReturnDocument, UpdateOne
+
+from app.auth.jwt_handler import invalidate_cached_user
+from app.database import get_db
+
+load_dotenv()
+
+# Most decisions accepted by one bulk review call
+VERIFICATION_BULK_MAX = int(os.getenv("VERIFICATION_BULK_MAX", 500))
+
+# Decisions a reviewer can make, and the verification_status each one gives the user
+VERIFICATION_DECISIONS = {
+    "approved": "verified",
+    "rejected": "rejected",
+}
+
+# Only pending requests can be decided; the precondition lives in the update filter, so of two
+# reviewers acting at once exactly one wins and the other sees "not_pending"
+PENDING = {"status": "pending"}
+
+
+def decision_update(status: str, review_id: ObjectId, now: datetime) -> dict:
+    return {"$set": {"status": status, "reviewed_at": now, "review_id": review_id}}
+
+
+def user_status_update(status: str, now: datetime) -> dict:
+    return {"$set": {"verification_status": VERIFICATION_DECISIONS[status], "updated_at": now}}
+
+
+async def decide_verification_request(request_id: ObjectId, status: str) -> Tuple[str, Optional[dict]]:
+    """
+    Move one pending request to `status` in a single conditional write and update its user.
+    Returns (outcome, request): "updated", "not_pending" (with the request as it is) or "not_found".
+    """
+    db = await get_db()
+    now = datetime.utcnow()
+
+    request = await db["VerificationRequests"].find_one_and_update(
+        {"_id": request_id, **PENDING},
+        decision_update(status, ObjectId(), now),
+        projection={"user_id": 1, "status": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if request is None:
+        # Only the failure path pays for a second look, to tell "gone" from "already decided"
+        current = await db["VerificationRequests"].find_one({"_id": request_id}, {"status": 1})
+        return ("not_pending", current) if current else ("not_found", None)
+
+    await db["users"].update_one({"_id": request["user_id"]}, user_status_update(status, now))
+    invalidate_cached_user(request["user_id"])
+    return "updated", request
+
+
+async def decide_verification_requests(decisions: List[Tuple[str, str]]) -> List[dict]:
+    """
+    Apply many (request_id, status) decisions: one unordered bulk_write on the requests, one read
+    to see which of them this call won, and one bulk_write that updates the users.
+    Returns one result per decision, in order.
+    """
+    results: List[Optional[dict]] = [None] * len(decisions)
+    wanted: Dict[ObjectId, Tuple[int, str]] = {}
+    for index, (request_id, status) in enumerate(decisions):
+        if not ObjectId.is_valid(request_id):
+            results[index] = {"request_id": request_id, "status": status, "outcome": "invalid"}
+        elif ObjectId(request_id) in wanted:
+            results[index] = {"request_id": request_id, "status": status, "outcome": "duplicate"}
+        else:
+            wanted[ObjectId(request_id)] = (index, status)
+
+    if not wanted:
+        return results
+
+    db = await get_db()
+    now = datetime.utcnow()
+    # Tags the writes of this call, so that the read-back can tell them from anyone else's
+    review_id = ObjectId()
+    await db["VerificationRequests"].bulk_write(
+        [UpdateOne({"_id": _id, **PENDING}, decision_update(status, review_id, now))
+         for _id, (_, status) in wanted.items()],
+        ordered=False,
+    )
+
+    current = {
+        request["_id"]: request
+        async for request in db["VerificationRequests"].find(
+            {"_id": {"$in": list(wanted)}}, {"user_id": 1, "status": 1, "review_id": 1}
+        )
+    }
+
+    decided_users = {}
+    for _id, (index, status) in wanted.items():
+        request = current.get(_id)
+        result = {"request_id": str(_id), "status": status}
+        if request is None:
+            result["outcome"] = "not_found"
+        elif request.get("review_id") == review_id:
+            result["outcome"] = "updated"
+            decided_users[request["user_id"]] = status
+        else:
+            result.update(outcome="not_pending", current_status=request["status"])
+        results[index] = result
+
+    if decided_users:
+        await db["users"].bulk_write(
+            [UpdateOne({"_id": user_id}, user_status_update(status, now)) for user_id, status in decided_users.items()],
+            ordered=False,
+        )
+        for user_id in decided_users:
+            invalidate_cached_user(user_id)
+
+    return results
@@ -6,7 +6,9 @@ from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from dotenv import load_dotenv
+from app.cache import TTLCache
 from app.database import get_db
+from app.user.models import UserRole
 
 load_dotenv()
 
@@ -14,10 +16,27 @@ load_dotenv()
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", 60))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", 10000))
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Authenticated users keyed by the token subject, so repeat requests skip the users lookup
+user_cache = TTLCache(max_size=USER_CACHE_MAX_SIZE, ttl_seconds=USER_CACHE_TTL_SECONDS)
+
+# The same users' response bodies as MongoDB projected them, {representation: body} per user id,
+# so /me and /users/me don't read the document again either
+user_view_cache = TTLCache(max_size=USER_CACHE_MAX_SIZE, ttl_seconds=USER_CACHE_TTL_SECONDS)
+
+
+def invalidate_cached_user(user_id: str):
+    """
+    Drop a user from the caches; call this after any write to their document
+    """
+    user_cache.invalidate(str(user_id))
+    user_view_cache.invalidate(str(user_id))
+
 
 def create_access_token(data: Dict, expires_delta: Optional[timedelta] = None) -> str:
     """
@@ -38,9 +57,9 @@ def create_access_token(data: Dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+async def get_user_from_token(token: str) -> dict:
     """
-    Validate the token and return the current user
+    Validate a raw access token and return the user it belongs to
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -56,19 +75,42 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         if user_id is None:
             raise credentials_exception
 
-        # Get user from database
-        db = await get_db()
-        user = await db["users"].find_one({"_id": user_id})
-
+        user = user_cache.get(user_id)
         if user is None:
-            raise credentials_exception
+            # Get user from database
+            db = await get_db()
+            user = await db["users"].find_one({"_id": user_id}, {"password": 0})
+
+            if user is None:
+                raise credentials_exception
 
-        # Convert MongoDB ObjectId to string for response
-        user["id"] = str(user["_id"])
-        del user["_id"]
-        del user["password"]
+            # Convert MongoDB ObjectId to string for response
+            user["id"] = str(user["_id"])
+            del user["_id"]
 
-        return user
+            user_cache.set(user_id, user)
+
+        # Hand out a copy so handlers can't modify the cached entry
+        return dict(user)
 
     except JWTError:
-        raise credentials_exception
\ No newline at end of file
+        raise credentials_exception
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """
+    Validate the token and return the current user
+    """
+    return await get_user_from_token(token)
+
+
+async def get_current_admin(current_user: dict = Depends(get_current_user)):
+    """
+    Validate the token and return the current user, who must have the admin role
+    """
+    if current_user.get("role") != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return current_user
@@ -1,15 +1,98 @@
+import os
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.workers import BoundedExecutor
+
+load_dotenv()
+
+# Configuration
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_POOL_KIND = os.getenv("PASSWORD_POOL_KIND", "thread")  # "thread" or "process"
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", os.cpu_count() or 1))
+PASSWORD_POOL_QUEUE = int(os.getenv("PASSWORD_POOL_QUEUE", 64))
+
+
+@lru_cache(maxsize=None)
+def get_crypt_context(rounds: int) -> CryptContext:
+    """
+    Build (once per process) a bcrypt context that hashes with the given cost
+    and flags hashes made with a lower cost as needing an update
+    """
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+    )
+
+
+pwd_context = get_crypt_context(BCRYPT_ROUNDS)
 
-def hash_password(password: str) -> str:
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
     """
     Hash the password using bcrypt
     """
-    return pwd_context.hash(password)
+    return get_crypt_context(rounds).hash(password)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verify the password against its hashed version
     """
-    return pwd_context.verify(plain_password, hashed_password)
\ No newline at end of file
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str,
+                               rounds: int = BCRYPT_ROUNDS) -> Tuple[bool, Optional[str]]:
+    """
+    Verify the password and return a re-hashed value when the stored hash uses an outdated cost
+    """
+    return get_crypt_context(rounds).verify_and_update(plain_password, hashed_password)
+
+
+class PasswordEngine:
+    """
+    Async front end for bcrypt that keeps hashing work off the event loop
+    """
+
+    def __init__(self, rounds: int, pool: BoundedExecutor):
+        self.rounds = rounds
+        self.pool = pool
+
+    def set_rounds(self, rounds: int):
+        """
+        Change the bcrypt cost used for new hashes; existing hashes are upgraded on next login
+        """
+        self.rounds = rounds
+
+    async def hash(self, password: str) -> str:
+        return await self.pool.run("hash", hash_password, password, self.rounds)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Returns (is_valid, new_hash); new_hash is set when the stored hash should be replaced
+        """
+        return await self.pool.run("verify", verify_and_update_password,
+                                   plain_password, hashed_password, self.rounds)
+
+    def stats(self) -> dict:
+        return {"bcrypt_rounds": self.rounds, **self.pool.stats()}
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+
+password_engine = PasswordEngine(
+    rounds=BCRYPT_ROUNDS,
+    pool=BoundedExecutor(
+        "password",
+        kind=PASSWORD_POOL_KIND,
+        max_workers=PASSWORD_POOL_WORKERS,
+        max_queue=PASSWORD_POOL_QUEUE,
+    ),
+)
@@ -1,48 +1,48 @@
 from fastapi import APIRouter, Body, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from datetime import datetime, timedelta
+from datetime import timedelta
 import os
-from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 
 from app.auth.models import UserSignUp, UserLogin, TokenResponse
-from app.auth.password_handler import hash_password, verify_password
-from app.auth.jwt_handler import create_access_token
+from app.auth.password_handler import password_engine
+from app.auth.jwt_handler import create_access_token, invalidate_cached_user
+from app.auth.utils import new_user_document
 from app.database import get_db
+from app.workers import WorkerPoolBusy
 
 auth_router = APIRouter()
 
 
+def password_engine_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, please try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
 @auth_router.post("/signup", response_model=dict, status_code=status.HTTP_201_CREATED)
 async def create_user(user_data: UserSignUp = Body(...)):
     db = await get_db()
 
-    # Check if user with email already exists
-    user_exists = await db["users"].find_one({"email": user_data.email})
-    if user_exists:
+    # Hash the password in the worker pool so the event loop stays free
+    try:
+        hashed_password = await password_engine.hash(user_data.password)
+    except WorkerPoolBusy:
+        raise password_engine_busy()
+
+    new_user = new_user_document(user_data, hashed_password)
+
+    # The unique index on users.email rejects existing addresses, without a racy lookup first
+    try:
+        await db["users"].insert_one(new_user)
+    except DuplicateKeyError:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="User with this email already exists"
         )
 
-    # Hash the password
-    hashed_password = hash_password(user_data.password)
-
-    # Create user dict with hashed password
-    new_user = {
-        "_id": str(ObjectId()),
-        "first_name": user_data.first_name,
-        "last_name": user_data.last_name,
-        "email": user_data.email,
-        "password": hashed_password,
-        "contact": user_data.contact,
-        "birthday": user_data.birthday.strftime("%Y-%m-%d"),
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow()
-    }
-
-    # Insert user into database
-    await db["users"].insert_one(new_user)
-
     return {
         "message": "User created successfully",
         "id": new_user["_id"]
@@ -63,13 +63,23 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         )
 
     # Verify password
-    if not verify_password(form_data.password, user["password"]):
+    try:
+        is_valid, new_hash = await password_engine.verify(form_data.password, user["password"])
+    except WorkerPoolBusy:
+        raise password_engine_busy()
+
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Re-hash with the current bcrypt cost if it has changed since the password was stored
+    if new_hash:
+        await db["users"].update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
+        invalidate_cached_user(user["_id"])
+
     # Create access token
     access_token_expires = timedelta(
         minutes=int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
@@ -0,0 +1,201 @@
+"""
+Bulk-create user accounts from a CSV or NDJSON file.
+
+    python -m app.auth.user_import users.csv [--format csv|ndjson] [--batch-size 500] [--report report.json]
+
+Rows need the signup fields (first_name, last_name, email, password, contact, birthday).
+Passwords are hashed in parallel across cores and each batch is written with one unordered
+bulk_write; emails that already exist are rejected by the users.email unique index and
+reported per row, so the import can be re-run safely after an interruption.
+"""
+import io
+import os
+import csv
+import json
+import argparse
+import asyncio
+import itertools
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from dotenv import load_dotenv
+from pydantic import ValidationError
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError
+
+from app.auth.models import UserSignUp
+from app.auth.password_handler import hash_password, password_engine
+from app.auth.utils import new_user_document
+from app.database import get_db
+from app.images.store import DUPLICATE_KEY_ERROR
+from app.workers import BoundedExecutor
+
+load_dotenv()
+
+# Configuration
+USER_IMPORT_BATCH_SIZE = int(os.getenv("USER_IMPORT_BATCH_SIZE", 500))
+USER_IMPORT_POOL_KIND = os.getenv("USER_IMPORT_POOL_KIND", "process")  # "thread" or "process"
+USER_IMPORT_WORKERS = int(os.getenv("USER_IMPORT_WORKERS", os.cpu_count() or 1))
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+# Separate from the login/signup pool so that an import never makes interactive requests wait
+import_pool = BoundedExecutor(
+    "user_import",
+    kind=USER_IMPORT_POOL_KIND,
+    max_workers=USER_IMPORT_WORKERS,
+    max_queue=USER_IMPORT_WORKERS * 2,
+)
+
+
+def hash_passwords(passwords: List[str], rounds: int) -> List[str]:
+    """
+    Hash a slice of passwords inside one worker (one pool round trip for many hashes)
+    """
+    return [hash_password(password, rounds) for password in passwords]
+
+
+async def hash_passwords_parallel(passwords: List[str]) -> List[str]:
+    """
+    Spread a batch of passwords evenly over the import workers
+    """
+    if not passwords:
+        return []
+    workers = min(import_pool.max_workers, len(passwords))
+    size = -(-len(passwords) // workers)
+    slices = [passwords[start:start + size] for start in range(0, len(passwords), size)]
+    hashed = await asyncio.gather(*(
+        import_pool.run("hash_batch", hash_passwords, part, password_engine.rounds) for part in slices
+    ))
+    return [value for part in hashed for value in part]
+
+
+def detect_format(filename: Optional[str]) -> str:
+    extension = os.path.splitext(filename or "")[1].lower()
+    return "ndjson" if extension in (".ndjson", ".jsonl") else "csv"
+
+
+def read_rows(lines: Iterable[str], format: str) -> Iterator[dict]:
+    """
+    Yield one dict per input row; NDJSON lines that aren't objects come back as {"_error": ...}
+    """
+    if format == "csv":
+        for row in csv.DictReader(lines):
+            yield {key.strip(): value.strip() if isinstance(value, str) else value
+                   for key, value in row.items() if key}
+        return
+
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield {"_error": f"Invalid JSON: {e}"}
+            continue
+        yield row if isinstance(row, dict) else {"_error": "Expected a JSON object"}
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors())
+
+
+async def import_batch(rows: List[tuple], seen_emails: set) -> List[dict]:
+    """
+    Validate, hash and insert one batch of (row number, row) pairs; returns one result per row
+    """
+    results: Dict[int, dict] = {}
+    valid = []
+    for number, row in rows:
+        email = row.get("email")
+        if "_error" in row:
+            results[number] = {"row": number, "email": email, "status": "invalid", "error": row["_error"]}
+            continue
+        try:
+            user_data = UserSignUp(**row)
+        except ValidationError as e:
+            results[number] = {"row": number, "email": email, "status": "invalid", "error": _validation_message(e)}
+            continue
+        if user_data.email in seen_emails:
+            results[number] = {"row": number, "email": user_data.email, "status": "duplicate_in_file"}
+            continue
+        seen_emails.add(user_data.email)
+        valid.append((number, user_data))
+
+    hashed = await hash_passwords_parallel([user_data.password for _, user_data in valid])
+    documents = [new_user_document(user_data, password) for (_, user_data), password in zip(valid, hashed)]
+
+    failed: Dict[int, dict] = {}
+    if documents:
+        db = await get_db()
+        try:
+            await db["users"].bulk_write([InsertOne(document) for document in documents], ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"]: error for error in e.details.get("writeErrors", [])}
+
+    for index, ((number, user_data), document) in enumerate(zip(valid, documents)):
+        error = failed.get(index)
+        if error is None:
+            results[number] = {"row": number, "email": user_data.email, "status": "created", "id": document["_id"]}
+        elif error["code"] == DUPLICATE_KEY_ERROR:
+            results[number] = {"row": number, "email": user_data.email, "status": "exists"}
+        else:
+            results[number] = {"row": number, "email": user_data.email, "status": "error", "error": error["errmsg"]}
+
+    return [results[number] for number, _ in rows]
+
+
+# Called with the report so far after every batch, e.g. to print progress
+ProgressCallback = Optional[Callable[[dict], None]]
+
+
+async def import_users(rows: Iterable[dict], batch_size: int = USER_IMPORT_BATCH_SIZE,
+                       on_progress: ProgressCallback = None) -> dict:
+    """
+    Import rows in batches and return totals per status plus one result per row (numbered from 1).
+
+    Each batch is read from `rows` in a thread: behind it is a file (the spooled upload, or a local
+    one for the CLI) whose reads and parsing would otherwise block the event loop.
+    """
+    report = {"total": 0, "created": 0, "exists": 0, "invalid": 0, "duplicate_in_file": 0, "error": 0, "rows": []}
+    seen_emails = set()
+    numbered = enumerate(rows, start=1)
+
+    while True:
+        batch = await asyncio.to_thread(list, itertools.islice(numbered, batch_size))
+        if not batch:
+            break
+        report["total"] += len(batch)
+        for result in await import_batch(batch, seen_emails):
+            report[result["status"]] += 1
+            report["rows"].append(result)
+        if on_progress is not None:
+            on_progress(report)
+
+    return report
+
+
+def print_progress(report: dict):
+    print(f"Imported {report['total']} rows: {report['created']} created, {report['exists']} already existed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-create user accounts from a CSV or NDJSON file")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Default: from the file extension")
+    parser.add_argument("--batch-size", type=int, default=USER_IMPORT_BATCH_SIZE)
+    parser.add_argument("--report", help="Write the per-row report to this JSON file")
+    args = parser.parse_args()
+
+    with io.open(args.path, encoding="utf-8-sig", newline="") as f:
+        rows = read_rows(f, args.format or detect_format(args.path))
+        report = asyncio.run(import_users(rows, args.batch_size, on_progress=print_progress))
+    import_pool.shutdown()
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    print(f"Done: { {key: value for key, value in report.items() if key != 'rows'} }")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.auth.models import UserSignUp
+
+
+def new_user_document(user_data: UserSignUp, hashed_password: str) -> dict:
+    """
+    The users document for a new account; email uniqueness is enforced by the users.email index
+    """
+    now = datetime.utcnow()
+    return {
+        "_id": str(ObjectId()),
+        "first_name": user_data.first_name,
+        "last_name": user_data.last_name,
+        "email": user_data.email,
+        "password": hashed_password,
+        "contact": user_data.contact,
+        "birthday": user_data.birthday.strftime("%Y-%m-%d"),
+        "created_at": now,
+        "updated_at": now
+    }
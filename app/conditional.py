@@ -0,0 +1,80 @@
+import os
+import hashlib
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import Request, Response
+from pymongo import ReturnDocument
+
+from app.cache import TTLCache
+from app.database import get_db
+from app.responses import dumps
+
+load_dotenv()
+
+# Configuration
+LISTING_CACHE_CONTROL = os.getenv("LISTING_CACHE_CONTROL", "public, max-age=0, must-revalidate")
+PRIVATE_CACHE_CONTROL = os.getenv("PRIVATE_CACHE_CONTROL", "private, no-cache")
+COLLECTION_VERSION_TTL_SECONDS = float(os.getenv("COLLECTION_VERSION_TTL_SECONDS", 1))
+
+# {_id: collection name, version: n}; bumped by every write this service makes to that collection
+COLLECTION_VERSIONS = "CollectionVersions"
+
+# Versions are re-read at most once per TTL per process; local writes invalidate immediately
+_versions = TTLCache(max_size=64, ttl_seconds=COLLECTION_VERSION_TTL_SECONDS)
+
+
+def make_etag(*parts) -> str:
+    """
+    Strong ETag derived from whatever identifies a representation (version, id, query...)
+    """
+    return f'"{hashlib.sha256(dumps(parts, sort_keys=True)).hexdigest()[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Whether the request's If-None-Match already names this ETag
+    """
+    if_none_match: Optional[str] = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    return etag in (candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates)
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def set_cache_headers(response: Response, etag: str, cache_control: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+
+
+async def get_collection_version(name: str) -> int:
+    version = _versions.get(name)
+    if version is None:
+        db = await get_db()
+        document = await db[COLLECTION_VERSIONS].find_one({"_id": name})
+        version = document["version"] if document else 0
+        _versions.set(name, version)
+    return version
+
+
+async def bump_collection_version(name: str) -> int:
+    """
+    Record that a collection changed, which invalidates every ETag derived from its version
+    """
+    db = await get_db()
+    document = await db[COLLECTION_VERSIONS].find_one_and_update(
+        {"_id": name},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    _versions.set(name, document["version"])
+    return document["version"]
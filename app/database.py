@@ -1,21 +1,137 @@
 import os
+import time
+import threading
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Configuration
+MONGODB_URI = os.getenv("MONGODB_URI")
+DB_NAME = os.getenv("DB_NAME", "pixora_db")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000))
+UPLOAD_JOB_RETENTION_SECONDS = int(os.getenv("UPLOAD_JOB_RETENTION_SECONDS", 7 * 24 * 3600))
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Tracks connection checkouts and pool size from the driver's pool events.
+
+    The driver fires these from Motor's worker threads, so counters are updated under a lock
+    and the checkout start time is kept per thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.open_connections = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        wait = time.perf_counter() - getattr(self._local, "started", time.perf_counter())
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.total_wait_seconds += wait
+            self.max_wait_seconds = max(self.max_wait_seconds, wait)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections -= 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_pool_size": MONGO_MAX_POOL_SIZE,
+                "min_pool_size": MONGO_MIN_POOL_SIZE,
+                "open_connections": self.open_connections,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "avg_wait_seconds": self.total_wait_seconds / self.checkouts if self.checkouts else 0.0,
+                "max_wait_seconds": self.max_wait_seconds,
+            }
+
+
 class Database:
     client: AsyncIOMotorClient = None
     db_name: str = None
+    pool_listener: PoolStatsListener = None
 
 db = Database()
+db.db_name = DB_NAME
+
+
+def create_client() -> AsyncIOMotorClient:
+    """
+    Build the one MongoDB client the whole app shares
+    """
+    db.pool_listener = PoolStatsListener()
+    return AsyncIOMotorClient(
+        MONGODB_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        event_listeners=[db.pool_listener],
+    )
+
+
+def connect_db():
+    if db.client is None:
+        db.client = create_client()
+
+
+def close_db():
+    if db.client is not None:
+        db.client.close()
+        db.client = None
 
-# Initialize database connection right away, not just during startup event
-mongodb_uri = os.getenv("MONGODB_URI")
-db.db_name = os.getenv("DB_NAME", "pixora_db")
-db.client = AsyncIOMotorClient(mongodb_uri)
 
 async def init_db():
+    connect_db()
+
     # Ensure indexes for better query performance and unique constraints
     await db.client[db.db_name]["users"].create_index("email", unique=True)
 
@@ -26,12 +142,57 @@ async def init_db():
         ("request_date", -1)  # -1 for descending order
     ])
 
-    # Add index for status field which will be used in queries
-    await db.client[db.db_name]["VerificationRequests"].create_index("status")
+    # Admin verification queue: status filter + newest-first keyset pagination in one index,
+    # and the same order without a status filter. The first one also covers status-only queries.
+    await db.client[db.db_name]["VerificationRequests"].create_index([
+        ("status", 1),
+        ("request_date", -1),
+        ("_id", -1)
+    ])
+    await db.client[db.db_name]["VerificationRequests"].create_index([
+        ("request_date", -1),
+        ("_id", -1)
+    ])
 
-    # Ensure indexes for better query performance and unique constraints
-    await db.client[db.db_name]["users"].create_index("email", unique=True)
+    # Indexes backing the keyset-paginated NFT listing, with and without an art_type filter
+    await db.client[db.db_name]["NFT"].create_index([("art_type", 1), ("_id", -1)])
+    await db.client[db.db_name]["NFT"].create_index([("art_type", 1), ("price", 1), ("_id", 1)])
+    await db.client[db.db_name]["NFT"].create_index([("price", 1), ("_id", 1)])
+
+    # One NFT per image content; documents the upload service has just inserted have no hash yet
+    await db.client[db.db_name]["NFT"].create_index(
+        "content_hash",
+        unique=True,
+        partialFilterExpression={"content_hash": {"$exists": True}}
+    )
+    # One artist's portfolio, newest first or by price
+    await db.client[db.db_name]["NFT"].create_index([("nft_owner", 1), ("_id", -1)])
+    await db.client[db.db_name]["NFT"].create_index([("nft_owner", 1), ("price", 1), ("_id", 1)])
+    # Finding the document the upload service created for a name, newest first
+    await db.client[db.db_name]["NFT"].create_index([("name", 1), ("_id", -1)])
+    # Full-text search over name and description; price filters within an art_type use
+    # the (art_type, price, _id) index above
+    await db.client[db.db_name]["NFT"].create_index(
+        [("name", "text"), ("description", "text")],
+        weights={"name": 3, "description": 1},
+        name="nft_text_search"
+    )
+    # Lets each worker's near-duplicate index pick up NFTs hashed elsewhere
+    await db.client[db.db_name]["NFT"].create_index("perceptual_hashed_at")
+
+    # Upload job queue: claiming the next due job, and dropping finished jobs after a while
+    await db.client[db.db_name]["UploadJobs"].create_index([("status", 1), ("available_at", 1)])
+    await db.client[db.db_name]["UploadJobs"].create_index(
+        "finished_at",
+        expireAfterSeconds=UPLOAD_JOB_RETENTION_SECONDS
+    )
     print("Connected to MongoDB!")
 
 async def get_db():
-    return db.client[db.db_name]
\ No newline at end of file
+    # Scripts that never ran the app lifespan still get the shared client
+    connect_db()
+    return db.client[db.db_name]
+
+
+def pool_stats() -> dict:
+    return db.pool_listener.stats() if db.pool_listener else {}
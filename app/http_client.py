@@ -0,0 +1,184 @@
+import os
+import time
+import random
+import asyncio
+import importlib.util
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+UPSTREAM_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_TIMEOUT_SECONDS", 20))
+UPSTREAM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT_SECONDS", 5))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", 20))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", 30))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 2))
+HTTP_RETRY_BACKOFF_SECONDS = float(os.getenv("HTTP_RETRY_BACKOFF_SECONDS", 0.2))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", 30))
+
+# Errors raised before the request reached the server, so retrying is safe for any method
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling an upstream host that has been failing
+    """
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one upstream host.
+
+    closed: calls go through. open: calls fail fast until reset_seconds have passed.
+    half_open: a single probe call is let through; its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+
+    def before_call(self):
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+            self.state = "half_open"
+        elif self.state == "half_open":
+            # A probe is already in flight
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit half-open)")
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """
+        End a call that neither succeeded nor failed (it was cancelled). A half-open probe gives
+        its slot back, so the next call probes again; nothing is counted against the host.
+        """
+        if self.state == "half_open":
+            self.state = "open"
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+class HttpClient:
+    client: httpx.AsyncClient = None
+    breakers: Dict[str, CircuitBreaker] = {}
+    host_limits: Dict[str, asyncio.Semaphore] = {}
+
+
+http = HttpClient()
+
+
+async def init_http_client(transport: Optional[httpx.AsyncBaseTransport] = None):
+    """
+    Open the shared outbound client; called from the app lifespan
+    """
+    if http.client is not None:
+        return
+
+    http.client = httpx.AsyncClient(
+        timeout=httpx.Timeout(UPSTREAM_TIMEOUT_SECONDS, connect=UPSTREAM_CONNECT_TIMEOUT_SECONDS),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+        ),
+        # HTTP/2 needs the optional h2 package
+        http2=transport is None and importlib.util.find_spec("h2") is not None,
+        transport=transport,
+    )
+    http.breakers = {}
+    http.host_limits = {}
+
+
+async def close_http_client():
+    if http.client is not None:
+        await http.client.aclose()
+        http.client = None
+
+
+async def get_http_client() -> httpx.AsyncClient:
+    # Scripts that never ran the app lifespan still get a working client
+    if http.client is None:
+        await init_http_client()
+    return http.client
+
+
+def _backoff_delay(attempt: int) -> float:
+    # Full jitter: anywhere between zero and the exponential ceiling
+    return random.uniform(0, HTTP_RETRY_BACKOFF_SECONDS * (2 ** attempt))
+
+
+async def send_with_retries(method: str, url: str, **kwargs) -> httpx.Response:
+    """
+    Send a request through the shared client with per-host limits, retries and a circuit breaker.
+
+    Connection failures are retried for every method; timeouts, dropped connections and
+    502/503/504 responses are only retried for idempotent methods. Raises CircuitOpenError
+    without touching the network while the host's circuit is open.
+    """
+    client = await get_http_client()
+    host = urlsplit(url).netloc
+    breaker = http.breakers.setdefault(host, CircuitBreaker(host))
+    limit = http.host_limits.setdefault(host, asyncio.Semaphore(HTTP_MAX_CONNECTIONS_PER_HOST))
+    idempotent = method.upper() in IDEMPOTENT_METHODS
+
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            async with limit:
+                response = await client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            breaker.record_failure()
+            retryable = isinstance(e, CONNECT_ERRORS) or idempotent
+            if not retryable or attempt >= HTTP_MAX_RETRIES:
+                raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancellation (a client that went away) says nothing about the upstream, but must
+            # not leave a half-open circuit stuck waiting for a probe that will never finish
+            breaker.release_probe()
+            raise
+        else:
+            if response.status_code < 500:
+                breaker.record_success()
+                return response
+
+            breaker.record_failure()
+            if not (idempotent and response.status_code in RETRYABLE_STATUS_CODES) or attempt >= HTTP_MAX_RETRIES:
+                return response
+
+        await asyncio.sleep(_backoff_delay(attempt))
+        attempt += 1
+
+
+def http_client_stats() -> dict:
+    return {host: breaker.stats() for host, breaker in http.breakers.items()}
@@ -0,0 +1,135 @@
+import io
+import os
+from concurrent.futures import BrokenExecutor
+from typing import Dict
+
+from dotenv import load_dotenv
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app.images.store import image_url, put_image, IMAGE_BASE_URL
+from app.workers import BoundedExecutor, WorkerPoolBusy
+
+load_dotenv()
+
+# Configuration
+IMAGE_POOL_KIND = os.getenv("IMAGE_POOL_KIND", "thread")  # "thread" or "process"
+IMAGE_POOL_WORKERS = int(os.getenv("IMAGE_POOL_WORKERS", os.cpu_count() or 1))
+IMAGE_POOL_QUEUE = int(os.getenv("IMAGE_POOL_QUEUE", 32))
+RENDITION_FORMAT = os.getenv("RENDITION_FORMAT", "WEBP")  # or "AVIF" where Pillow supports it
+RENDITION_QUALITY = int(os.getenv("RENDITION_QUALITY", 80))
+
+# Longest edge in pixels for each thumbnail rendition; "webp" is the full-size recompressed copy
+RENDITION_SIZES = {
+    "thumb": 160,
+    "small": 320,
+    "medium": 640,
+}
+RENDITION_NAMES = ("original", *RENDITION_SIZES, "webp")
+
+# What a bad upload can make decoding raise: not an image, truncated, or a decompression bomb
+IMAGE_DECODE_ERRORS = (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError)
+
+# The pool could not run the job: saturated, or a process worker died (e.g. killed for memory)
+IMAGE_POOL_ERRORS = (WorkerPoolBusy, BrokenExecutor)
+
+image_pool = BoundedExecutor(
+    "images",
+    kind=IMAGE_POOL_KIND,
+    max_workers=IMAGE_POOL_WORKERS,
+    max_queue=IMAGE_POOL_QUEUE,
+)
+
+
+def _encode(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=RENDITION_FORMAT, quality=RENDITION_QUALITY)
+    return buffer.getvalue()
+
+
+def render_derivatives(data: bytes) -> dict:
+    """
+    Decode the image once and encode every rendition (runs in the image worker pool)
+    """
+    with Image.open(io.BytesIO(data)) as opened:
+        image = ImageOps.exif_transpose(opened)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+        renditions = {"webp": _encode(image)}
+        for name, edge in RENDITION_SIZES.items():
+            thumbnail = image.copy()
+            thumbnail.thumbnail((edge, edge), Image.LANCZOS)
+            renditions[name] = _encode(thumbnail)
+
+        return {"width": image.width, "height": image.height, "renditions": renditions}
+
+
+async def create_derivatives(data: bytes) -> dict:
+    """
+    Render and store the thumbnails and recompressed copy of an image.
+
+    Returns {"width", "height", "renditions": {name: image reference}}, or an empty dict when the
+    bytes are not a decodable image or the pool can't run the job; derivatives can be backfilled
+    later with `python -m app.images.migrate --renditions`.
+    """
+    try:
+        rendered = await image_pool.run("render", render_derivatives, data)
+    except IMAGE_DECODE_ERRORS as e:
+        print(f"Could not render image derivatives: {e}")
+        return {}
+    except IMAGE_POOL_ERRORS as e:
+        print(f"Skipping image derivatives: {e}")
+        return {}
+
+    mime_type = f"image/{RENDITION_FORMAT.lower()}"
+    renditions = {}
+    for name, encoded in rendered["renditions"].items():
+        renditions[name] = await put_image(encoded, mime_type)
+
+    return {"width": rendered["width"], "height": rendered["height"], "renditions": renditions}
+
+
+def pick_rendition(image: dict, size: str) -> dict:
+    """
+    The reference for the requested rendition, falling back to the original
+    """
+    if size == "original":
+        return image
+    return image.get("renditions", {}).get(size, image)
+
+
+def image_urls(image: dict) -> Dict[str, str]:
+    """
+    URLs of the original and of every rendition of a stored image
+    """
+    urls = {"original": image_url(image)}
+    for name, ref in image.get("renditions", {}).items():
+        urls[name] = image_url(ref)
+    return urls
+
+
+def image_fields_projection(field: str) -> dict:
+    """
+    Projection of the response fields for an image kept on a document as base64 in `field` and,
+    once it has been put in the image store, as a reference in `field`_ref: the image_urls of the
+    reference when stored, the base64 otherwise. Computed by MongoDB, so the document needs no copy.
+    """
+    ref = f"${field}_ref"
+    stored = {"$ifNull": [ref, False]}
+    renditions = {"$objectToArray": {"$ifNull": [f"{ref}.renditions", {}]}}
+    urls = {"$arrayToObject": {"$concatArrays": [
+        [{"k": "original", "v": {"$concat": [IMAGE_BASE_URL + "/", f"{ref}.sha256"]}}],
+        {"$map": {
+            "input": renditions,
+            "as": "rendition",
+            "in": {"k": "$$rendition.k", "v": {"$concat": [IMAGE_BASE_URL + "/", "$$rendition.v.sha256"]}},
+        }},
+    ]}}
+    return {
+        field: {"$cond": [stored, None, {"$ifNull": [f"${field}", ""]}]},
+        f"{field}_urls": {"$cond": [stored, urls, None]},
+    }
+
+
+def rendition_stats() -> Dict[str, dict]:
+    return image_pool.stats()
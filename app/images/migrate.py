@@ -0,0 +1,274 @@
+"""
+Move inline NFT images into the content-addressed image store and record their content hash.
+
+    python -m app.images.migrate [--batch-size 100] [--dry-run] [--renditions] [--perceptual] [--id-scans]
+
+Safe to interrupt and re-run: NFTs that already carry a content hash are skipped. NFTs whose
+image is a byte-for-byte copy of one that is already hashed are reported and left untouched.
+--renditions additionally backfills thumbnails for NFTs whose image has none yet, and
+--perceptual computes the perceptual hashes used by near-duplicate detection, and --id-scans
+moves verification ID scans stored before the private image store existed out of the public one.
+"""
+import argparse
+import asyncio
+from datetime import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.conditional import bump_collection_version
+from app.database import get_db
+from app.images.derivatives import create_derivatives
+from app.images.store import (
+    decode_base64_image,
+    delete_image,
+    get_image_info,
+    put_image,
+    read_image,
+    read_images,
+    DUPLICATE_KEY_ERROR,
+)
+from app.nft.similarity import hash_to_hex, perceptual_hashes
+from app.nft.utils import NFT_KEEP_INLINE_IMAGE
+
+
+async def migrate_nft_images(batch_size: int = 100, dry_run: bool = False) -> dict:
+    db = await get_db()
+    totals = {"migrated": 0, "invalid": 0, "duplicates": 0, "batches": 0}
+    last_id = None
+
+    while True:
+        # Only NFTs whose upload has completed (they have an owner) and that have no hash yet
+        query = {
+            "content_hash": {"$exists": False},
+            "nft_owner": {"$exists": True},
+            "$or": [{"imageBase64": {"$type": "string"}}, {"image.sha256": {"$exists": True}}],
+        }
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+
+        batch = await db["NFT"].find(query, {"imageBase64": 1, "image": 1}).sort("_id", 1).to_list(length=batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        operations, operation_ids = [], []
+        for nft in batch:
+            if nft.get("image"):
+                # Already in the image store, only the hash is missing
+                if dry_run:
+                    totals["migrated"] += 1
+                    continue
+                operations.append(UpdateOne({"_id": nft["_id"]}, {"$set": {"content_hash": nft["image"]["sha256"]}}))
+                operation_ids.append(nft["_id"])
+                continue
+
+            try:
+                data = decode_base64_image(nft["imageBase64"])
+            except ValueError:
+                totals["invalid"] += 1
+                print(f"Skipping NFT {nft['_id']}: imageBase64 is not valid base64")
+                continue
+
+            if dry_run:
+                totals["migrated"] += 1
+                continue
+
+            image = await put_image(data)
+            image.update(await create_derivatives(data))
+            update = {"$set": {"image": image, "content_hash": image["sha256"]}}
+            if not NFT_KEEP_INLINE_IMAGE:
+                update["$unset"] = {"imageBase64": ""}
+            operations.append(UpdateOne({"_id": nft["_id"]}, update))
+            operation_ids.append(nft["_id"])
+
+        if operations:
+            try:
+                result = await db["NFT"].bulk_write(operations, ordered=False)
+                totals["migrated"] += result.modified_count
+            except BulkWriteError as e:
+                totals["migrated"] += e.details.get("nModified", 0)
+                for error in e.details.get("writeErrors", []):
+                    if error["code"] != DUPLICATE_KEY_ERROR:
+                        raise
+                    totals["duplicates"] += 1
+                    print(f"Duplicate image: NFT {operation_ids[error['index']]} is a copy of an already hashed NFT")
+            await bump_collection_version("NFT")
+
+        totals["batches"] += 1
+        print(f"Batch {totals['batches']}: up to {last_id}, {totals['migrated']} migrated so far")
+
+    return totals
+
+
+async def backfill_nft_renditions(batch_size: int = 100, dry_run: bool = False) -> dict:
+    db = await get_db()
+    totals = {"rendered": 0, "failed": 0, "batches": 0}
+    last_id = None
+
+    while True:
+        query = {"image.sha256": {"$exists": True}, "image.renditions": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+
+        batch = await db["NFT"].find(query, {"image": 1}).sort("_id", 1).to_list(length=batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        if dry_run:
+            totals["rendered"] += len(batch)
+            totals["batches"] += 1
+            continue
+
+        images = await read_images(nft["image"]["sha256"] for nft in batch)
+        operations = []
+        for nft in batch:
+            data = images.get(nft["image"]["sha256"])
+            derivatives = await create_derivatives(data) if data else {}
+            if not derivatives:
+                totals["failed"] += 1
+                continue
+            operations.append(UpdateOne({"_id": nft["_id"]}, {"$set": {
+                "image.width": derivatives["width"],
+                "image.height": derivatives["height"],
+                "image.renditions": derivatives["renditions"],
+            }}))
+
+        if operations:
+            result = await db["NFT"].bulk_write(operations, ordered=False)
+            totals["rendered"] += result.modified_count
+            await bump_collection_version("NFT")
+
+        totals["batches"] += 1
+        print(f"Batch {totals['batches']}: up to {last_id}, {totals['rendered']} rendered so far")
+
+    return totals
+
+
+async def backfill_perceptual_hashes(batch_size: int = 100, dry_run: bool = False) -> dict:
+    db = await get_db()
+    totals = {"hashed": 0, "failed": 0, "batches": 0}
+    last_id = None
+
+    while True:
+        query = {"image.sha256": {"$exists": True}, "perceptual_hash": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+
+        batch = await db["NFT"].find(query, {"image.sha256": 1}).sort("_id", 1).to_list(length=batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        if dry_run:
+            totals["hashed"] += len(batch)
+            totals["batches"] += 1
+            continue
+
+        images = await read_images(nft["image"]["sha256"] for nft in batch)
+        operations = []
+        for nft in batch:
+            data = images.get(nft["image"]["sha256"])
+            hashes = await perceptual_hashes(data) if data else None
+            if not hashes:
+                totals["failed"] += 1
+                continue
+            operations.append(UpdateOne({"_id": nft["_id"]}, {"$set": {
+                "perceptual_hash": {key: hash_to_hex(value) for key, value in hashes.items()},
+                "perceptual_hashed_at": datetime.utcnow(),
+            }}))
+
+        if operations:
+            result = await db["NFT"].bulk_write(operations, ordered=False)
+            totals["hashed"] += result.modified_count
+
+        totals["batches"] += 1
+        print(f"Batch {totals['batches']}: up to {last_id}, {totals['hashed']} hashed so far")
+
+    return totals
+
+
+async def _publicly_referenced(db, sha256: str) -> bool:
+    # An ID scan byte-identical to an NFT or profile image must stay public for that document
+    if await db["NFT"].find_one({"$or": [{"content_hash": sha256}, {"image.sha256": sha256}]}, {"_id": 1}):
+        return True
+    return bool(await db["users"].find_one(
+        {"$or": [{"profile_image_ref.sha256": sha256}, {"cover_image_ref.sha256": sha256}]}, {"_id": 1}
+    ))
+
+
+async def move_id_scans_to_private_store(batch_size: int = 100, dry_run: bool = False) -> dict:
+    db = await get_db()
+    totals = {"moved": 0, "missing": 0, "kept_public": 0, "batches": 0}
+    last_id = None
+    fields = ("id_front_image_ref", "id_back_image_ref")
+
+    while True:
+        query = {"$or": [{f"{field}.sha256": {"$exists": True}} for field in fields]}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+
+        projection = {f"{field}.sha256": 1 for field in fields}
+        batch = await db["VerificationRequests"].find(query, projection).sort("_id", 1).to_list(length=batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        # The references stay as they are; only where the bytes live changes
+        for sha256 in {request[field]["sha256"] for request in batch for field in fields if request.get(field)}:
+            if not await get_image_info(sha256):
+                if not await get_image_info(sha256, private=True):
+                    totals["missing"] += 1
+                continue
+            if dry_run:
+                totals["moved"] += 1
+                continue
+
+            if not await get_image_info(sha256, private=True):
+                data = await read_image(sha256)
+                if data is None:
+                    totals["missing"] += 1
+                    continue
+                await put_image(data, private=True)
+            totals["moved"] += 1
+
+            if await _publicly_referenced(db, sha256):
+                totals["kept_public"] += 1
+                print(f"Keeping public copy of {sha256}: it is also an NFT or profile image")
+                continue
+            await delete_image(sha256)
+
+        totals["batches"] += 1
+        print(f"Batch {totals['batches']}: up to {last_id}, {totals['moved']} ID scans moved so far")
+
+    return totals
+
+
+async def run(batch_size: int, dry_run: bool, renditions: bool, perceptual: bool, id_scans: bool) -> dict:
+    totals = {"images": await migrate_nft_images(batch_size=batch_size, dry_run=dry_run)}
+    if renditions:
+        totals["renditions"] = await backfill_nft_renditions(batch_size=batch_size, dry_run=dry_run)
+    if perceptual:
+        totals["perceptual"] = await backfill_perceptual_hashes(batch_size=batch_size, dry_run=dry_run)
+    if id_scans:
+        totals["id_scans"] = await move_id_scans_to_private_store(batch_size=batch_size, dry_run=dry_run)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move inline NFT images into the image store")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be migrated")
+    parser.add_argument("--renditions", action="store_true", help="Also backfill missing thumbnails")
+    parser.add_argument("--perceptual", action="store_true", help="Also backfill missing perceptual hashes")
+    parser.add_argument("--id-scans", action="store_true", help="Also move ID scans into the private image store")
+    args = parser.parse_args()
+
+    totals = asyncio.run(run(batch_size=args.batch_size, dry_run=args.dry_run, renditions=args.renditions,
+                             perceptual=args.perceptual, id_scans=args.id_scans))
+    print(f"Done: {totals}")
+
+
+if __name__ == "__main__":
+    main()
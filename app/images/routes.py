@@ -0,0 +1,134 @@
+import os
+import re
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+from app.auth.jwt_handler import get_current_user
+from app.conditional import etag_matches, not_modified
+from app.database import get_db
+from app.images.store import get_image_info, iter_image_range
+from app.user.models import UserRole
+
+load_dotenv()
+
+# Images are addressed by the SHA-256 of their bytes, so a URL's content never changes
+IMAGE_CACHE_CONTROL = os.getenv("IMAGE_CACHE_CONTROL", "public, max-age=31536000, immutable")
+
+# ID scans must never be kept by a browser, proxy or CDN
+PRIVATE_IMAGE_CACHE_CONTROL = "private, no-store"
+
+# The document fields that refer to private images, which their owner may also see
+PRIVATE_IMAGE_FIELDS = ("id_front_image_ref.sha256", "id_back_image_ref.sha256")
+
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+images_router = APIRouter()
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) inclusive for a single byte range, None to send the whole image.
+    Raises ValueError when the range can't be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    # Multiple ranges and other units are allowed to be ignored; the full image is sent instead
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+
+    first, last = match.group(1), match.group(2)
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+@images_router.api_route("/private/{sha256}", methods=["GET", "HEAD"], summary="A private image (ID scan)")
+async def get_private_image(sha256: str, request: Request, current_user: dict = Depends(get_current_user)):
+    """
+    Serve an ID scan to an admin, or to the user whose verification request it belongs to.
+    Never cacheable.
+    """
+    if not SHA256_PATTERN.match(sha256):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    if current_user.get("role") != UserRole.ADMIN:
+        db = await get_db()
+        # Served by the (user_id, request_date) index; a user only ever has a handful of requests
+        owns = await db["VerificationRequests"].find_one(
+            {"user_id": current_user["id"], "$or": [{field: sha256} for field in PRIVATE_IMAGE_FIELDS]},
+            {"_id": 1},
+        )
+        if not owns:
+            # Someone else's image looks the same as a missing one
+            raise HTTPException(status_code=404, detail="Image not found")
+
+    return await serve_image(sha256, request, PRIVATE_IMAGE_CACHE_CONTROL, private=True)
+
+
+@images_router.api_route("/{sha256}", methods=["GET", "HEAD"], summary="Raw image bytes by content hash")
+async def get_image(sha256: str, request: Request):
+    """
+    Serve a stored image (an original or a rendition) with its own Content-Type.
+    Supports single byte ranges and If-None-Match; the response may be cached forever.
+    """
+    if not SHA256_PATTERN.match(sha256):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    return await serve_image(sha256, request, IMAGE_CACHE_CONTROL)
+
+
+async def serve_image(sha256: str, request: Request, cache_control: str, private: bool = False) -> Response:
+    """
+    The bytes (or the requested range) of a stored image, with conditional GET support
+    """
+    etag = f'"{sha256}"'
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+
+    blob = await get_image_info(sha256, private=private)
+    if not blob:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    size = blob["size"]
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    # A stale If-Range means the client's partial copy is of something else; send it all
+    if byte_range and request.headers.get("if-range", etag) != etag:
+        byte_range = None
+
+    status_code = 200
+    start, end = 0, size - 1
+    if byte_range:
+        status_code = 206
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1 if size else 0)
+
+    if request.method == "HEAD" or size == 0:
+        return Response(status_code=status_code, headers=headers, media_type=blob["mime"])
+
+    return StreamingResponse(iter_image_range(blob, start, end, private=private), status_code=status_code,
+                             headers=headers, media_type=blob["mime"])
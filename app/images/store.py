@@ -0,0 +1,234 @@
+import os
+import base64
+import binascii
+import hashlib
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+from pymongo.errors import BulkWriteError
+
+from app.database import get_db
+
+load_dotenv()
+
+# Content-addressed image storage.
+#
+# Every image is stored once, keyed by the SHA-256 of its decoded bytes:
+#   ImageBlobs:  {_id: sha256, size, mime, chunk_size, chunks, created_at}
+#   ImageChunks: {_id: "<sha256>:<n>", blob: sha256, n, data}
+# Chunks are written before the manifest, so a blob is only visible once it is complete,
+# and because chunk ids are derived from the content, concurrent writes of the same image
+# are harmless.
+IMAGE_BLOBS = "ImageBlobs"
+IMAGE_CHUNKS = "ImageChunks"
+IMAGE_CHUNK_SIZE = int(os.getenv("IMAGE_CHUNK_SIZE", 255 * 1024))
+
+# Private images (ID scans) use the same layout in their own collections. The public endpoint
+# never reads these, so a private image can't be fetched, or cached, by anyone who learns its hash.
+PRIVATE_IMAGE_BLOBS = "PrivateImageBlobs"
+PRIVATE_IMAGE_CHUNKS = "PrivateImageChunks"
+
+# Where images are served from (the /api/images endpoint, or a CDN in front of it)
+IMAGE_BASE_URL = os.getenv("IMAGE_BASE_URL", "/api/images").rstrip("/")
+
+# Private images are only served by the API itself, to authorised users
+PRIVATE_IMAGE_BASE_URL = os.getenv("PRIVATE_IMAGE_BASE_URL", "/api/images/private").rstrip("/")
+
+# Chunks fetched (or written) per round trip while streaming an image
+IMAGE_STREAM_BATCH_CHUNKS = int(os.getenv("IMAGE_STREAM_BATCH_CHUNKS", 8))
+
+DUPLICATE_KEY_ERROR = 11000
+
+_MAGIC_NUMBERS = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+
+def decode_base64_image(value: str) -> bytes:
+    """
+    Decode a base64 image string, with or without a data: URL prefix
+    """
+    if value.startswith("data:") and "," in value:
+        value = value.split(",", 1)[1]
+
+    try:
+        return base64.b64decode("".join(value.split()), validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid base64 image: {e}")
+
+
+def detect_mime_type(data: bytes) -> str:
+    """
+    Guess the image type from its leading bytes
+    """
+    for magic, mime in _MAGIC_NUMBERS:
+        if data.startswith(magic):
+            return mime
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    return "application/octet-stream"
+
+
+def content_hash(data: bytes) -> str:
+    """
+    SHA-256 of the decoded image bytes; the key of the image store and of NFTs
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def _collections(private: bool):
+    return (PRIVATE_IMAGE_BLOBS, PRIVATE_IMAGE_CHUNKS) if private else (IMAGE_BLOBS, IMAGE_CHUNKS)
+
+
+def chunk_id(sha256: str, n: int) -> str:
+    # Zero-padded so that _id order matches chunk order
+    return f"{sha256}:{n:06d}"
+
+
+def image_ref(blob: dict) -> dict:
+    """
+    The small reference stored on documents that point at an image
+    """
+    return {"sha256": blob["_id"], "size": blob["size"], "mime": blob["mime"]}
+
+
+def image_url(ref: dict) -> str:
+    """
+    URL of the raw image bytes; immutable because it is derived from the content
+    """
+    return f"{IMAGE_BASE_URL}/{ref['sha256']}"
+
+
+async def _store_blob(sha256: str, size: int, mime_type: str, chunk_data: Iterable[bytes],
+                      batch_chunks: Optional[int] = None, private: bool = False) -> dict:
+    db = await get_db()
+    blobs, chunks = _collections(private)
+
+    existing = await db[blobs].find_one({"_id": sha256})
+    if existing:
+        return image_ref(existing)
+
+    # With batch_chunks, chunks are inserted a few at a time so that only those are held in memory
+    count = 0
+    batch = []
+    for data in chunk_data:
+        batch.append({"_id": chunk_id(sha256, count), "blob": sha256, "n": count, "data": data})
+        count += 1
+        if batch_chunks and len(batch) >= batch_chunks:
+            await _insert_chunks(db[chunks], batch)
+            batch = []
+    if batch:
+        await _insert_chunks(db[chunks], batch)
+
+    blob = {
+        "_id": sha256,
+        "size": size,
+        "mime": mime_type,
+        "chunk_size": IMAGE_CHUNK_SIZE,
+        "chunks": count,
+        "created_at": datetime.utcnow(),
+    }
+    await db[blobs].update_one({"_id": sha256}, {"$setOnInsert": blob}, upsert=True)
+    return image_ref(blob)
+
+
+async def _insert_chunks(collection, chunks: List[dict]):
+    try:
+        await collection.insert_many(chunks, ordered=False)
+    except BulkWriteError as e:
+        # Chunks written by a concurrent upload of the same image are identical; anything else is real
+        if any(error["code"] != DUPLICATE_KEY_ERROR for error in e.details.get("writeErrors", [])):
+            raise
+
+
+async def put_image(data: bytes, mime_type: Optional[str] = None, private: bool = False) -> dict:
+    """
+    Store raw image bytes (once per distinct content) and return a reference to them
+    """
+    chunks = (data[offset:offset + IMAGE_CHUNK_SIZE] for offset in range(0, max(len(data), 1), IMAGE_CHUNK_SIZE))
+    return await _store_blob(content_hash(data), len(data), mime_type or detect_mime_type(data), chunks,
+                             private=private)
+
+
+async def put_image_file(image, private: bool = False) -> dict:
+    """
+    Store a SpooledImage (see app.images.uploads) chunk by chunk, straight from its file
+    """
+    return await _store_blob(image.sha256, image.size, image.mime, image.iter_chunks(IMAGE_CHUNK_SIZE),
+                             batch_chunks=IMAGE_STREAM_BATCH_CHUNKS, private=private)
+
+
+async def get_image_info(sha256: str, private: bool = False) -> Optional[dict]:
+    db = await get_db()
+    return await db[_collections(private)[0]].find_one({"_id": sha256})
+
+
+async def read_images(sha256s: Iterable[str], private: bool = False) -> Dict[str, bytes]:
+    """
+    Load several images in two round trips: one for the manifests, one for all of their chunks
+    """
+    db = await get_db()
+    blobs, chunks = _collections(private)
+    wanted = list(set(sha256s))
+    if not wanted:
+        return {}
+
+    chunk_ids: List[str] = []
+    async for blob in db[blobs].find({"_id": {"$in": wanted}}, {"chunks": 1}):
+        chunk_ids.extend(chunk_id(blob["_id"], n) for n in range(blob["chunks"]))
+
+    parts: Dict[str, List[bytes]] = {}
+    async for chunk in db[chunks].find({"_id": {"$in": chunk_ids}}).sort("_id", 1):
+        parts.setdefault(chunk["blob"], []).append(bytes(chunk["data"]))
+
+    return {sha256: b"".join(data) for sha256, data in parts.items()}
+
+
+async def read_image(sha256: str, private: bool = False) -> Optional[bytes]:
+    return (await read_images([sha256], private=private)).get(sha256)
+
+
+async def delete_image(sha256: str, private: bool = False):
+    """
+    Remove a stored image; the manifest goes first, so nothing serves a half-deleted blob
+    """
+    db = await get_db()
+    blobs, chunks = _collections(private)
+    await db[blobs].delete_one({"_id": sha256})
+    # Chunk ids are "<sha256>:<n>", so the _id index finds them all (";" sorts right after ":")
+    await db[chunks].delete_many({"_id": {"$gte": f"{sha256}:", "$lt": f"{sha256};"}})
+
+
+async def load_images_base64(refs: Iterable[dict]) -> Dict[str, str]:
+    """
+    Base64 strings for a set of image references, keyed by SHA-256
+    """
+    images = await read_images(ref["sha256"] for ref in refs)
+    return {sha256: base64.b64encode(data).decode("ascii") for sha256, data in images.items()}
+
+
+async def iter_image_range(blob: dict, start: int, end: int, private: bool = False) -> AsyncIterator[bytes]:
+    """
+    Yield bytes start..end (inclusive) of a stored image, reading only the chunks that overlap
+    """
+    db = await get_db()
+    chunks = _collections(private)[1]
+    chunk_size = blob["chunk_size"]
+    first, last = start // chunk_size, end // chunk_size
+
+    for batch_start in range(first, last + 1, IMAGE_STREAM_BATCH_CHUNKS):
+        batch_end = min(batch_start + IMAGE_STREAM_BATCH_CHUNKS - 1, last)
+        cursor = db[chunks].find({
+            "_id": {"$gte": chunk_id(blob["_id"], batch_start), "$lte": chunk_id(blob["_id"], batch_end)}
+        }).sort("_id", 1)
+        async for chunk in cursor:
+            offset = chunk["n"] * chunk_size
+            data = bytes(chunk["data"])
+            yield data[max(start - offset, 0):end - offset + 1]
@@ -0,0 +1,195 @@
+import io
+import os
+import base64
+import hashlib
+from typing import AsyncIterator, BinaryIO, Dict, Iterator, Optional
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+from app.images.store import decode_base64_image, detect_mime_type
+from app.responses import dumps
+
+load_dotenv()
+
+# Largest image accepted by any upload endpoint, as a file part or decoded from base64
+IMAGE_UPLOAD_MAX_BYTES = int(os.getenv("IMAGE_UPLOAD_MAX_BYTES", 20 * 1024 * 1024))
+
+# Whole multipart bodies are capped while they arrive: room for two images (verification
+# requests) plus the text fields. Starlette spools file parts to disk past 1 MB.
+UPLOAD_MAX_BODY_BYTES = int(os.getenv("UPLOAD_MAX_BODY_BYTES", 2 * IMAGE_UPLOAD_MAX_BYTES + 1024 * 1024))
+
+# Any other body (JSON with base64 images) is read into memory whole, so it is capped too: room
+# for two base64 images (verification requests, profile and cover images) plus the other fields
+JSON_MAX_BODY_BYTES = int(os.getenv("JSON_MAX_BODY_BYTES", 2 * 4 * -(-IMAGE_UPLOAD_MAX_BYTES // 3) + 1024 * 1024))
+
+# Read size while hashing a spooled upload; a multiple of 3 so base64 chunks concatenate cleanly
+UPLOAD_READ_CHUNK_SIZE = 48 * 1024
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class SpooledImage:
+    """
+    An uploaded image kept in a file (Starlette's spooled temp file, or memory for base64 input)
+    with its SHA-256, size and type worked out in one streaming pass
+    """
+
+    def __init__(self, file: BinaryIO, sha256: str, size: int, mime: str):
+        self.file = file
+        self.sha256 = sha256
+        self.size = size
+        self.mime = mime
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SpooledImage":
+        return cls(io.BytesIO(data), hashlib.sha256(data).hexdigest(), len(data), detect_mime_type(data))
+
+    def iter_chunks(self, chunk_size: int = UPLOAD_READ_CHUNK_SIZE) -> Iterator[bytes]:
+        self.file.seek(0)
+        while True:
+            chunk = self.file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def read(self) -> bytes:
+        """
+        All of the bytes, for the steps that have to decode the image anyway
+        """
+        self.file.seek(0)
+        return self.file.read()
+
+    def base64_length(self) -> int:
+        return 4 * -(-self.size // 3)
+
+
+class Base64JSONBody:
+    """
+    A {"name": ..., "imageBase64": ...} request body encoded from the file as it is sent, so the
+    base64 string never exists in memory. Iterable more than once, so the request can be retried.
+    """
+
+    def __init__(self, image: SpooledImage, **fields):
+        self.image = image
+        self.prefix = dumps(fields)[:-1] + (b',' if fields else b'') + b'"imageBase64":"'
+        self.suffix = b'"}'
+
+    def content_length(self) -> int:
+        return len(self.prefix) + self.image.base64_length() + len(self.suffix)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        yield self.prefix
+        for chunk in self.image.iter_chunks():
+            yield base64.b64encode(chunk)
+        yield self.suffix
+
+
+async def spool_upload(upload: UploadFile, max_bytes: int = IMAGE_UPLOAD_MAX_BYTES) -> SpooledImage:
+    """
+    Hash and measure a file part chunk by chunk, without reading it into memory
+    """
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+
+    await upload.seek(0)
+    while True:
+        chunk = await upload.read(UPLOAD_READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge(f"Image is larger than {max_bytes} bytes")
+        if not head:
+            head = chunk[:16]
+        digest.update(chunk)
+    await upload.seek(0)
+
+    if not size:
+        raise ValueError("Empty image")
+
+    mime = detect_mime_type(head)
+    if mime == "application/octet-stream" and (upload.content_type or "").startswith("image/"):
+        mime = upload.content_type
+    return SpooledImage(upload.file, digest.hexdigest(), size, mime)
+
+
+async def image_from_form(upload: Optional[UploadFile], base64_value: Optional[str] = None,
+                          field: str = "image") -> SpooledImage:
+    """
+    The image of an upload form: a multipart file part, or the older base64 text field
+    """
+    if upload is not None:
+        return await spool_upload(upload)
+    if not base64_value:
+        raise ValueError(f"Send the image as the '{field}' file part or as base64")
+
+    # Base64 inflates by 4/3, so oversized input can be refused before decoding it
+    if len(base64_value) > 4 * -(-IMAGE_UPLOAD_MAX_BYTES // 3) + 1024:
+        raise UploadTooLarge(f"Image is larger than {IMAGE_UPLOAD_MAX_BYTES} bytes")
+    data = decode_base64_image(base64_value)
+    if len(data) > IMAGE_UPLOAD_MAX_BYTES:
+        raise UploadTooLarge(f"Image is larger than {IMAGE_UPLOAD_MAX_BYTES} bytes")
+    return SpooledImage.from_bytes(data)
+
+
+def upload_error_response(error: ValueError) -> JSONResponse:
+    status_code = 413 if isinstance(error, UploadTooLarge) else 400
+    return JSONResponse(content={"error": str(error)}, status_code=status_code)
+
+
+def upload_http_error(error: ValueError) -> HTTPException:
+    return HTTPException(status_code=413 if isinstance(error, UploadTooLarge) else 400, detail=str(error))
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Pure ASGI middleware refusing request bodies over their limit: UPLOAD_MAX_BODY_BYTES for
+    multipart, JSON_MAX_BODY_BYTES for anything else, or the multipart limit given for the path
+    in multipart_path_limits. Up front when Content-Length says so, otherwise as soon as the
+    streamed body goes past the limit.
+    """
+
+    def __init__(self, app, max_bytes: int = UPLOAD_MAX_BODY_BYTES, max_other_bytes: int = JSON_MAX_BODY_BYTES,
+                 multipart_path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.max_other_bytes = max_other_bytes
+        self.multipart_path_limits = multipart_path_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        if headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            max_bytes = self.multipart_path_limits.get(scope["path"], self.max_bytes)
+        else:
+            max_bytes = self.max_other_bytes
+
+        content_length = headers.get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > max_bytes:
+            response = JSONResponse({"detail": f"Request body is larger than {max_bytes} bytes"},
+                                    status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # Raised while the endpoint reads its body or form, so FastAPI answers it like any HTTPException
+                    raise HTTPException(status_code=413,
+                                        detail=f"Request body is larger than {max_bytes} bytes")
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,238 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from starlette.routing import Match
+
+# Prometheus text exposition (format 0.0.4) without a client library.
+#
+# Everything here is updated from the event loop only, so no locking is done. Labels are
+# kept to method, route template and status, which bounds the number of series by the
+# number of routes rather than by the number of distinct URLs.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, label_names)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, labels: LabelValues = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_number(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: LabelValues = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+
+class Histogram(Metric):
+    """
+    Fixed-bucket histogram; observe() is one bisect and two additions
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [non-cumulative bucket counts (+Inf last), sum]
+        self.series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, labels: LabelValues = ()):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        bucket_names = self.label_names + ("le",)
+        for labels, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(bucket_names, labels + (_format_number(bound),))} {cumulative}"
+                )
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_number(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        # Callables returning (name, help, type, [(labels dict, value), ...]) for values that
+        # other components already track (pool sizes, cache hits...) and are read at scrape time
+        self.collectors: List[Callable[[], Iterable[tuple]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[tuple]]):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for name, help_text, kind, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    "pixora_http_requests_total", "HTTP requests by method, route template and status",
+    ("method", "route", "status")))
+IN_FLIGHT = registry.register(Gauge(
+    "pixora_http_requests_in_flight", "HTTP requests currently being served", ("method", "route")))
+LATENCY = registry.register(Histogram(
+    "pixora_http_request_duration_seconds", "Time until the last response byte was sent",
+    ("method", "route"), LATENCY_BUCKETS))
+RESPONSE_SIZE = registry.register(Histogram(
+    "pixora_http_response_size_bytes", "Response body size", ("method", "route"), SIZE_BUCKETS))
+
+
+def stats_collector(prefix: str, help_text: str, stats: Callable[[], dict], label: Optional[str] = None):
+    """
+    Expose the numeric fields of an existing stats() dict as gauges, e.g. pool_stats().
+    With a label, stats() returns {label value: {field: value}} instead.
+    """
+    def collect():
+        values = stats()
+        groups = values.items() if label else [(None, values)]
+        fields: Dict[str, list] = {}
+        for group, fields_of_group in groups:
+            labels = {label: group} if label else {}
+            for field, value in fields_of_group.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    fields.setdefault(field, []).append((labels, value))
+        return [(f"{prefix}_{field}", f"{help_text}: {field}", "gauge", samples)
+                for field, samples in fields.items()]
+
+    registry.add_collector(collect)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording count, status, in-flight, latency and response size per route
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._templates: Optional[Dict[Callable, Optional[str]]] = None
+
+    def _route_template(self, scope) -> str:
+        # The router stores the matched endpoint in the scope; map it back to its path template.
+        # Endpoints shared by several routes fall back to matching the request again.
+        router_app = scope["app"]
+        if self._templates is None:
+            templates: Dict[Callable, Optional[str]] = {}
+            for route in router_app.routes:
+                endpoint = getattr(route, "endpoint", None)
+                if endpoint is not None:
+                    templates[endpoint] = None if endpoint in templates else route.path
+            self._templates = templates
+
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        template = self._templates.get(endpoint)
+        if template is not None:
+            return template
+        for route in router_app.routes:
+            if getattr(route, "endpoint", None) is endpoint and route.matches(scope)[0] == Match.FULL:
+                return route.path
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        started = time.perf_counter()
+        status = 500
+        size = 0
+        # The route is only known once routing has happened; count in-flight under a
+        # placeholder and move the request to its route once the response starts
+        in_flight_labels = (method, "pending")
+        IN_FLIGHT.inc(in_flight_labels)
+
+        async def send_wrapper(message):
+            nonlocal status, size, in_flight_labels
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                IN_FLIGHT.dec(in_flight_labels)
+                in_flight_labels = (method, self._route_template(scope))
+                IN_FLIGHT.inc(in_flight_labels)
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec(in_flight_labels)
+            route = in_flight_labels[1] if in_flight_labels[1] != "pending" else self._route_template(scope)
+            labels = (method, route)
+            REQUESTS.inc((method, route, str(status)))
+            LATENCY.observe(time.perf_counter() - started, labels)
+            RESPONSE_SIZE.observe(size, labels)
@@ -0,0 +1,167 @@
+"""
+Per-artist NFT counters kept on the user document, so profiles never count NFTs, and
+catalogue-wide facet counters, so a search without conditions never aggregates every NFT.
+
+    python -m app.nft.counters [--dry-run]
+
+Every write that gives an NFT an owner $incs its owner's counters in the same step:
+    artworks_count, artworks_total_price, artworks_by_art_type.<art_type>
+and the facet counters, one per (art_type, price bucket):
+    NFTStats {_id: "facets", counts: {<art_type>: {<bucket>: n}}}
+An NFT that changes hands is a -1 for its old owner and a +1 for its new one (see
+artwork_increments). Running this module recomputes all of these from the NFT collection,
+for data written before the counters existed, after manual edits, or after changing
+NFT_PRICE_BUCKETS.
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from pymongo import UpdateOne
+
+from app.auth.jwt_handler import invalidate_cached_user
+from app.database import get_db
+from .utils import price_bucket_key
+
+# Art types with their own counter; anything else is counted under "other" so that a
+# free-form value can never produce an invalid field path
+ART_TYPES = ("digital_art", "photography")
+
+ARTWORK_COUNTER_FIELDS = ("artworks_count", "artworks_total_price", "artworks_by_art_type")
+
+NFT_STATS = "NFTStats"
+FACET_COUNTS_ID = "facets"
+
+
+def _art_type_key(art_type) -> str:
+    return art_type if art_type in ART_TYPES else "other"
+
+
+def artwork_increments(artworks: Iterable[Tuple[str, object]], sign: int = 1) -> Dict[str, float]:
+    """
+    The $inc document for adding (sign=1) or removing (sign=-1) some (art_type, price) artworks
+    """
+    inc: Dict[str, float] = defaultdict(int)
+    for art_type, price in artworks:
+        inc["artworks_count"] += sign
+        if isinstance(price, (int, float)) and not isinstance(price, bool):
+            inc["artworks_total_price"] += sign * price
+        inc[f"artworks_by_art_type.{_art_type_key(art_type)}"] += sign
+    return dict(inc)
+
+
+def facet_increments(artworks: Iterable[Tuple[str, object]], sign: int = 1) -> Dict[str, int]:
+    """
+    The $inc document for the facet counters of some (art_type, price) artworks
+    """
+    inc: Dict[str, int] = defaultdict(int)
+    for art_type, price in artworks:
+        inc[f"counts.{_art_type_key(art_type)}.{price_bucket_key(price)}"] += sign
+    return dict(inc)
+
+
+async def record_new_artworks(owner_id: str, artworks: List[Tuple[str, object]]):
+    """
+    Count newly owned artworks for one user, and in the facet counters, with one atomic $inc each.
+    The user's updated_at moves with the counters, so /users/me and /me stop revalidating as 304.
+    """
+    if not artworks:
+        return
+    db = await get_db()
+    await db["users"].update_one(
+        {"_id": owner_id},
+        {"$inc": artwork_increments(artworks), "$set": {"updated_at": datetime.utcnow()}}
+    )
+    invalidate_cached_user(owner_id)
+    await db[NFT_STATS].update_one({"_id": FACET_COUNTS_ID}, {"$inc": facet_increments(artworks)}, upsert=True)
+
+
+async def get_facet_counts() -> dict:
+    """
+    {art_type: {bucket: count}} over every owned NFT
+    """
+    db = await get_db()
+    document = await db[NFT_STATS].find_one({"_id": FACET_COUNTS_ID})
+    return document.get("counts", {}) if document else {}
+
+
+def format_artwork_counters(user: dict) -> dict:
+    return {
+        "count": user.get("artworks_count", 0),
+        "total_price": user.get("artworks_total_price", 0),
+        "by_art_type": user.get("artworks_by_art_type", {}),
+    }
+
+
+async def rebuild_artwork_counters(dry_run: bool = False) -> dict:
+    """
+    Recompute every user's counters from the NFTs they own (one aggregation, one bulk write),
+    and the facet counters from one pass over the owned NFTs
+    """
+    db = await get_db()
+    pipeline = [
+        {"$match": {"nft_owner": {"$type": "string"}}},
+        {"$group": {
+            "_id": {"owner": "$nft_owner", "art_type": "$art_type"},
+            "count": {"$sum": 1},
+            "total_price": {"$sum": "$price"},
+        }},
+    ]
+    counters: Dict[str, dict] = {}
+    async for row in db["NFT"].aggregate(pipeline):
+        owner = row["_id"]["owner"]
+        counter = counters.setdefault(owner, {"artworks_count": 0, "artworks_total_price": 0,
+                                              "artworks_by_art_type": {}})
+        counter["artworks_count"] += row["count"]
+        counter["artworks_total_price"] += row["total_price"]
+        by_art_type = counter["artworks_by_art_type"]
+        key = _art_type_key(row["_id"].get("art_type"))
+        by_art_type[key] = by_art_type.get(key, 0) + row["count"]
+
+    # The facet counters need each NFT's price bucket; the buckets are worked out here rather than
+    # in the pipeline so that they always match price_bucket_key
+    facet_counts: Dict[str, Dict[str, int]] = {}
+    async for nft in db["NFT"].find({"nft_owner": {"$type": "string"}}, {"_id": 0, "art_type": 1, "price": 1}):
+        buckets = facet_counts.setdefault(_art_type_key(nft.get("art_type")), {})
+        key = price_bucket_key(nft.get("price"))
+        buckets[key] = buckets.get(key, 0) + 1
+
+    totals = {"owners": len(counters), "reset": 0, "updated": 0,
+              "facet_counts": sum(sum(buckets.values()) for buckets in facet_counts.values())}
+    if dry_run:
+        return totals
+
+    # Users whose NFTs are all gone still carry old counters; clear those first
+    reset = await db["users"].update_many(
+        {"_id": {"$nin": list(counters)}, "artworks_count": {"$exists": True}},
+        {"$set": {"artworks_count": 0, "artworks_total_price": 0, "artworks_by_art_type": {},
+                  "updated_at": datetime.utcnow()}},
+    )
+    totals["reset"] = reset.modified_count
+    if counters:
+        # updated_at is part of the profile ETags; running API workers pick the counts up once
+        # their cached users expire
+        updated_at = datetime.utcnow()
+        result = await db["users"].bulk_write(
+            [UpdateOne({"_id": owner}, {"$set": {**counter, "updated_at": updated_at}})
+             for owner, counter in counters.items()],
+            ordered=False,
+        )
+        totals["updated"] = result.modified_count
+    await db[NFT_STATS].update_one({"_id": FACET_COUNTS_ID}, {"$set": {"counts": facet_counts}}, upsert=True)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute the per-user NFT counters and the facet counters")
+    parser.add_argument("--dry-run", action="store_true", help="Only report how many owners and NFTs there are")
+    args = parser.parse_args()
+
+    totals = asyncio.run(rebuild_artwork_counters(dry_run=args.dry_run))
+    print(f"Done: {totals}")
+
+
+if __name__ == "__main__":
+    main()
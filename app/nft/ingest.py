@@ -0,0 +1,227 @@
+import json
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+from app.conditional import bump_collection_version
+from app.images.derivatives import create_derivatives, image_urls
+from app.images.store import put_image_file
+from app.images.uploads import SpooledImage
+from app.workers import WorkerPoolBusy
+from .counters import record_new_artworks
+from .models import get_nft_collection
+from .similarity import (
+    hash_to_hex,
+    near_duplicate_index,
+    perceptual_hashes,
+    NEAR_DUPLICATE_POLICY,
+)
+from .utils import upload_image_file_to_api, locate_uploaded_nft, NFT_KEEP_INLINE_IMAGE, UNCLAIMED_NFT
+
+# Called with the name of each step as ingest_nft reaches it, e.g. to record job progress
+StageCallback = Optional[Callable[[str], Awaitable[None]]]
+
+# Called with {"result": upload service response, "nft_id": created document} once the image is
+# uploaded and its document found. The upload is not idempotent, so a retry passes this back as
+# `uploaded` and skips it.
+UploadedCallback = Optional[Callable[[dict], Awaitable[None]]]
+
+
+async def report_stage(on_stage: StageCallback, stage: str):
+    if on_stage is not None:
+        await on_stage(stage)
+
+
+def duplicate_nft_result(existing: dict, user_id: str) -> Tuple[dict, int]:
+    """
+    Result for an image that is already published: idempotent for its owner, 409 for anyone else
+    """
+    if existing and existing.get("nft_owner") == user_id:
+        return {
+            "message": "NFT already uploaded",
+            "user_id": user_id,
+            "image_id": str(existing["_id"]),
+            "description": existing.get("description"),
+            "art_type": existing.get("art_type"),
+            "price": existing.get("price"),
+            "image": existing.get("image"),
+            "image_urls": image_urls(existing["image"]) if existing.get("image") else None,
+            "image_name": existing.get("name"),
+            "duplicate": True
+        }, 200
+
+    return {
+        "error": "This image has already been published as an NFT.",
+        "image_id": str(existing["_id"]) if existing else None
+    }, 409
+
+
+def batch_duplicate_result(index: int, existing: dict, user_id: str) -> dict:
+    """
+    Batch counterpart of duplicate_nft_result
+    """
+    if existing.get("nft_owner") == user_id:
+        return {"index": index, "status": "exists", "image_id": str(existing["_id"])}
+    return {"index": index, "status": "duplicate", "image_id": str(existing["_id"]),
+            "error": "This image has already been published as an NFT."}
+
+
+async def find_near_duplicates(image_bytes: bytes, user_id: str):
+    """
+    Perceptual hashes of an image and other artists' NFTs within the near-duplicate distance.
+    Hashes are None when near-duplicate detection is off or, in "flag" mode, when the image could
+    not be hashed. In "reject" mode an image that was not checked is never let through: an
+    undecodable one raises ValueError and a saturated image pool WorkerPoolBusy.
+    """
+    if NEAR_DUPLICATE_POLICY == "off":
+        return None, []
+
+    hashes = await perceptual_hashes(image_bytes, required=NEAR_DUPLICATE_POLICY == "reject")
+    if not hashes:
+        return None, []
+
+    await near_duplicate_index.sync()
+    near_duplicates = [
+        {"nft_id": match["nft_id"], "distance": match["distance"]}
+        for match in near_duplicate_index.find(hashes["phash"])
+        if match["owner"] != user_id
+    ]
+    return hashes, near_duplicates
+
+
+def nft_metadata_update(art_type: str, user_id: str, description: str, price: float, image: dict,
+                        image_hash: str, hashes: Optional[dict], near_duplicates: list) -> dict:
+    """
+    The update that completes the document the upload service created
+    """
+    update = {
+        "$set": {
+            "art_type": art_type,
+            "nft_owner": user_id,
+            "description": description,
+            "price": price,
+            "image": image,
+            "content_hash": image_hash
+        }
+    }
+    if hashes:
+        update["$set"]["perceptual_hash"] = {key: hash_to_hex(value) for key, value in hashes.items()}
+        update["$set"]["perceptual_hashed_at"] = datetime.utcnow()
+    if near_duplicates:
+        update["$set"]["near_duplicates"] = near_duplicates
+    if not NFT_KEEP_INLINE_IMAGE:
+        update["$unset"] = {"imageBase64": ""}
+    return update
+
+
+async def ingest_nft(image: SpooledImage, name: str, user_id: str, art_type: str,
+                     description: str, price: float, on_stage: StageCallback = None,
+                     uploaded: Optional[dict] = None, on_uploaded: UploadedCallback = None) -> Tuple[dict, int]:
+    """
+    Publish one image for an already resolved uploader; returns (body, HTTP status).
+
+    Shared by frontend_upload, which answers with the result directly, and the upload job
+    workers, which record it on the job and resume a retried job from its recorded upload.
+    """
+    await report_stage(on_stage, "checking_duplicates")
+
+    # Step 2: Reject exact duplicates with one unique-index lookup; re-uploading your own image is a no-op.
+    # The hash was computed while the upload was spooled, so nothing has been read into memory yet.
+    nft_collection = await get_nft_collection()
+    image_hash = image.sha256
+    existing = await nft_collection.find_one({"content_hash": image_hash}, {"imageBase64": 0})
+    if existing:
+        return duplicate_nft_result(existing, user_id)
+
+    # Step 3: Look for near-copies of other artists' work in the in-memory pHash index.
+    # Hashing and rendering decode the image, so they get its bytes; nothing else does.
+    image_bytes = image.read()
+    try:
+        hashes, near_duplicates = await find_near_duplicates(image_bytes, user_id)
+    except WorkerPoolBusy:
+        return {"error": "Image workers are busy, please try again shortly"}, 503
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    if near_duplicates and NEAR_DUPLICATE_POLICY == "reject":
+        return {
+            "error": "This image is too similar to an existing NFT.",
+            "similar_nfts": near_duplicates
+        }, 409
+
+    # Step 4: Upload image, unless an earlier attempt already did
+    if uploaded:
+        upload_result = uploaded["result"]
+    else:
+        await report_stage(on_stage, "uploading")
+        upload_result, upload_error = await upload_image_file_to_api(image, name)
+        if upload_error:
+            return json.loads(upload_error.body), upload_error.status_code
+        if "error" in upload_result:
+            return {"upload_result": upload_result}, 400
+
+    # Step 5: Find the uploaded NFT
+    located_by = {"_id": str(uploaded["nft_id"])} if uploaded else upload_result
+    nft = await locate_uploaded_nft(nft_collection, name, image_hash, located_by)
+    if not nft:
+        return {
+            "error": "Could not find the uploaded NFT in MongoDB.",
+            "user_id": user_id,
+            "upload_result": upload_result
+        }, 404
+    if not uploaded and on_uploaded is not None:
+        await on_uploaded({"result": upload_result, "nft_id": nft["_id"]})
+
+    image_id = str(nft.get("_id"))
+
+    await report_stage(on_stage, "storing_image")
+
+    # Step 6: Keep the image and its thumbnails in the content-addressed store
+    # instead of inline on the document
+    stored, derivatives = await asyncio.gather(put_image_file(image), create_derivatives(image_bytes))
+    stored.update(derivatives)
+
+    await report_stage(on_stage, "saving_metadata")
+
+    # Step 7: Update the NFT with owner info and additional fields
+    update = nft_metadata_update(art_type, user_id, description, price, stored, image_hash, hashes, near_duplicates)
+
+    try:
+        # Still unclaimed, so two ingests that located the same document can't both complete it
+        update_result = await nft_collection.update_one({"_id": nft["_id"], **UNCLAIMED_NFT}, update)
+    except DuplicateKeyError:
+        # A concurrent upload of the same image won the unique index; drop the copy we just created
+        await nft_collection.delete_one({"_id": nft["_id"], **UNCLAIMED_NFT})
+        existing = await nft_collection.find_one({"content_hash": image_hash}, {"imageBase64": 0})
+        return duplicate_nft_result(existing, user_id)
+    if not update_result.matched_count:
+        return {
+            "error": "The uploaded NFT was completed by another upload.",
+            "user_id": user_id,
+            "upload_result": upload_result
+        }, 409
+    # Counters first, so that a page cached under the new collection version already includes them
+    await record_new_artworks(user_id, [(art_type, price)])
+    await bump_collection_version("NFT")
+
+    if hashes:
+        near_duplicate_index.add(image_id, hashes["phash"], user_id)
+
+    return {
+        "message": "NFT saved, user validated, and metadata stored",
+        "user_id": user_id,
+        "image_id": image_id,
+        "description": description,
+        "art_type": art_type,
+        "price": price,
+        "image": stored,
+        "image_urls": image_urls(stored),
+        "near_duplicates": near_duplicates,
+        "upload_result": upload_result,
+        "image_name": name,
+        "mongo_update": {
+            "matched_count": update_result.matched_count,
+            "modified_count": update_result.modified_count
+        }
+    }, 200
@@ -0,0 +1,290 @@
+import os
+import socket
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+
+from app.database import get_db
+from app.images.store import put_image_file, read_image
+from app.images.uploads import SpooledImage
+from .ingest import ingest_nft, StageCallback, UploadedCallback
+
+load_dotenv()
+
+# Configuration
+UPLOAD_JOB_WORKERS = int(os.getenv("UPLOAD_JOB_WORKERS", 4))
+UPLOAD_JOB_LEASE_SECONDS = float(os.getenv("UPLOAD_JOB_LEASE_SECONDS", 120))
+# How often a running job's lease is renewed; a few renewals fit in a lease, so one slow or
+# failed renewal doesn't lose the job
+UPLOAD_JOB_HEARTBEAT_SECONDS = float(os.getenv("UPLOAD_JOB_HEARTBEAT_SECONDS", UPLOAD_JOB_LEASE_SECONDS / 4))
+UPLOAD_JOB_MAX_ATTEMPTS = int(os.getenv("UPLOAD_JOB_MAX_ATTEMPTS", 3))
+UPLOAD_JOB_RETRY_SECONDS = float(os.getenv("UPLOAD_JOB_RETRY_SECONDS", 10))
+UPLOAD_JOB_POLL_SECONDS = float(os.getenv("UPLOAD_JOB_POLL_SECONDS", 5))
+
+# Durable upload queue, one document per job:
+#   {_id, status: queued|running|succeeded|failed, stage, user_id, params, image (image store ref),
+#    upload, attempts, available_at, lease_expires_at, worker, result, result_status, error, timestamps}
+# A running job holds a lease that its worker renews on a heartbeat for as long as it works on it,
+# however long a stage takes; if the process dies the lease runs out and any worker picks the job
+# up again, so restarts resume pending work. `upload` records
+# the remote upload once it has been done, so a later attempt never uploads the image twice.
+UPLOAD_JOBS = "UploadJobs"
+
+# Upstream failures worth another attempt; anything else is a final answer
+RETRYABLE_STATUS_CODES = {500, 502, 503, 504}
+
+
+async def get_upload_jobs_collection():
+    db = await get_db()
+    return db[UPLOAD_JOBS]
+
+
+async def enqueue_upload_job(upload: SpooledImage, user_id: str, name: str, art_type: str,
+                             description: str, price: float) -> dict:
+    """
+    Store the image and queue a job that publishes it; the image bytes stay out of the job document
+    """
+    image = await put_image_file(upload)
+    now = datetime.utcnow()
+    job = {
+        "_id": ObjectId(),
+        "status": "queued",
+        "stage": "queued",
+        "user_id": user_id,
+        "params": {"name": name, "art_type": art_type, "description": description, "price": price},
+        "image": image,
+        "attempts": 0,
+        "available_at": now,
+        "created_at": now,
+        "updated_at": now,
+    }
+    collection = await get_upload_jobs_collection()
+    await collection.insert_one(job)
+    upload_workers.notify()
+    return job
+
+
+async def get_upload_job(job_id: ObjectId) -> Optional[dict]:
+    collection = await get_upload_jobs_collection()
+    return await collection.find_one({"_id": job_id})
+
+
+def format_upload_job(job: dict) -> dict:
+    return {
+        "job_id": str(job["_id"]),
+        "status": job["status"],
+        "stage": job.get("stage"),
+        "attempts": job.get("attempts", 0),
+        "name": job["params"]["name"],
+        "user_id": job["user_id"],
+        "created_at": job["created_at"],
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+        "retry_at": job["available_at"] if job["status"] == "queued" and job.get("attempts") else None,
+        "error": job.get("error"),
+        "result_status": job.get("result_status"),
+        "result": job.get("result"),
+    }
+
+
+async def claim_upload_job(worker_id: str) -> Optional[dict]:
+    """
+    Atomically take the oldest runnable job: queued and due, or running with an expired lease
+    """
+    collection = await get_upload_jobs_collection()
+    now = datetime.utcnow()
+    return await collection.find_one_and_update(
+        {"$or": [
+            {"status": "queued", "available_at": {"$lte": now}},
+            {"status": "running", "lease_expires_at": {"$lte": now}},
+        ]},
+        {
+            "$set": {
+                "status": "running",
+                "worker": worker_id,
+                "lease_expires_at": _lease_expiry(),
+                "started_at": now,
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("available_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _update_own_job(job: dict, worker_id: str, fields: dict) -> bool:
+    # Only the worker holding the job may write to it; a job whose lease expired may have moved on
+    collection = await get_upload_jobs_collection()
+    fields["updated_at"] = datetime.utcnow()
+    result = await collection.update_one(
+        {"_id": job["_id"], "status": "running", "worker": worker_id},
+        {"$set": fields},
+    )
+    return result.matched_count == 1
+
+
+def _lease_expiry() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=UPLOAD_JOB_LEASE_SECONDS)
+
+
+async def _heartbeat(job: dict, worker_id: str):
+    # Runs beside the job: a stage (an upload retried against a slow upstream, say) can outlast
+    # the lease, and a job whose lease runs out is claimed and uploaded again by another worker
+    while True:
+        await asyncio.sleep(UPLOAD_JOB_HEARTBEAT_SECONDS)
+        try:
+            if not await _update_own_job(job, worker_id, {"lease_expires_at": _lease_expiry()}):
+                return
+        except Exception as e:
+            print(f"Could not renew the lease of upload job {job['_id']}: {e}")
+
+
+async def _finish(job: dict, worker_id: str, status: str, **fields) -> bool:
+    return await _update_own_job(job, worker_id, {"status": status, "stage": "done",
+                                                  "finished_at": datetime.utcnow(), **fields})
+
+
+async def _retry_or_fail(job: dict, worker_id: str, error, result_status: Optional[int] = None) -> str:
+    if job["attempts"] >= UPLOAD_JOB_MAX_ATTEMPTS:
+        await _finish(job, worker_id, "failed", error=error, result_status=result_status)
+        return "failed"
+
+    delay = UPLOAD_JOB_RETRY_SECONDS * (2 ** (job["attempts"] - 1))
+    await _update_own_job(job, worker_id, {
+        "status": "queued",
+        "stage": "waiting_retry",
+        "available_at": datetime.utcnow() + timedelta(seconds=delay),
+        "error": error,
+        "result_status": result_status,
+    })
+    return "retried"
+
+
+async def process_upload_job(job: dict, worker_id: str) -> str:
+    """
+    Run one claimed job to completion, or put it back for a later attempt; returns the outcome
+    """
+    if job["attempts"] > UPLOAD_JOB_MAX_ATTEMPTS:
+        # Claimed again after its worker died on the last attempt
+        await _finish(job, worker_id, "failed", error=f"Gave up after {UPLOAD_JOB_MAX_ATTEMPTS} attempts")
+        return "failed"
+
+    async def on_stage(stage: str):
+        await _update_own_job(job, worker_id, {"stage": stage, "lease_expires_at": _lease_expiry()})
+
+    async def on_uploaded(upload: dict):
+        await _update_own_job(job, worker_id, {"upload": upload})
+
+    heartbeat = asyncio.create_task(_heartbeat(job, worker_id))
+    try:
+        return await _run_upload_job(job, worker_id, on_stage, on_uploaded)
+    finally:
+        heartbeat.cancel()
+
+
+async def _run_upload_job(job: dict, worker_id: str, on_stage: StageCallback, on_uploaded: UploadedCallback) -> str:
+    try:
+        image_bytes = await read_image(job["image"]["sha256"])
+        if image_bytes is None:
+            await _finish(job, worker_id, "failed", error="The uploaded image is no longer available")
+            return "failed"
+
+        params = job["params"]
+        payload, status_code = await ingest_nft(
+            SpooledImage.from_bytes(image_bytes),
+            params["name"],
+            job["user_id"],
+            params["art_type"],
+            params["description"],
+            params["price"],
+            on_stage=on_stage,
+            uploaded=job.get("upload"),
+            on_uploaded=on_uploaded,
+        )
+    except asyncio.CancelledError:
+        # Shutting down: hand the job straight back instead of waiting for the lease to run out
+        await _update_own_job(job, worker_id, {"status": "queued", "stage": "queued",
+                                               "available_at": datetime.utcnow(),
+                                               "attempts": job["attempts"] - 1})
+        raise
+    except Exception as e:
+        print(f"Upload job {job['_id']} failed: {e}")
+        return await _retry_or_fail(job, worker_id, str(e))
+
+    if status_code in RETRYABLE_STATUS_CODES:
+        return await _retry_or_fail(job, worker_id, payload.get("error") or payload, status_code)
+
+    status = "succeeded" if status_code == 200 else "failed"
+    await _finish(job, worker_id, status, result=payload, result_status=status_code,
+                  error=None if status == "succeeded" else payload.get("error"))
+    return status
+
+
+class UploadJobWorkers:
+    """
+    asyncio tasks that drain the upload queue; woken by local enqueues and polling for the rest
+    (jobs from other instances, retries that became due, expired leases)
+    """
+
+    def __init__(self, concurrency: int = UPLOAD_JOB_WORKERS):
+        self.concurrency = concurrency
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self.busy = 0
+        self.outcomes = {"succeeded": 0, "failed": 0, "retried": 0}
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._wake = asyncio.Event()
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks = [asyncio.create_task(self._run(f"{prefix}:{n}")) for n in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self, worker_id: str):
+        while True:
+            # Cleared before looking, so an enqueue that lands meanwhile still wakes us
+            self._wake.clear()
+            try:
+                job = await claim_upload_job(worker_id)
+            except Exception as e:
+                print(f"Could not claim an upload job: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), UPLOAD_JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.busy += 1
+            try:
+                outcome = await process_upload_job(job, worker_id)
+                self.outcomes[outcome] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Upload job {job['_id']} could not be processed: {e}")
+            finally:
+                self.busy -= 1
+
+    def stats(self) -> dict:
+        return {"workers": len(self._tasks), "busy": self.busy, **self.outcomes}
+
+
+upload_workers = UploadJobWorkers()
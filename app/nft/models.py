@@ -1,13 +1,42 @@
 import os
+from typing import List
+
 from dotenv import load_dotenv
-from motor.motor_asyncio import AsyncIOMotorClient
+from pydantic import BaseModel, Field
+
+from app.database import get_db
+from app.images.uploads import IMAGE_UPLOAD_MAX_BYTES
 
 load_dotenv()
-MONGODB_URI = os.getenv("MONGODB_URI")
-DB_NAME = os.getenv("DB_NAME")
-if not MONGODB_URI or not DB_NAME:
-    raise Exception("MONGODB_URI and DB_NAME must be set in the .env file.")
-
-mongo_client = AsyncIOMotorClient(MONGODB_URI)
-db = mongo_client[DB_NAME]
-nft_collection = db["NFT"]
\ No newline at end of file
+
+NFT_COLLECTION = "NFT"
+
+# Most pieces accepted by one batch upload
+NFT_BATCH_MAX = int(os.getenv("NFT_BATCH_MAX", 200))
+
+# Most image bytes accepted by one batch upload, all pieces together
+NFT_BATCH_MAX_BYTES = int(os.getenv("NFT_BATCH_MAX_BYTES", 10 * IMAGE_UPLOAD_MAX_BYTES))
+
+
+async def get_nft_collection():
+    """
+    The NFT collection on the app's shared MongoDB client
+    """
+    db = await get_db()
+    return db[NFT_COLLECTION]
+
+
+class NFTBatchItemFields(BaseModel):
+    name: str = Field(..., min_length=1)
+    art_type: str = Field(..., pattern="^(digital_art|photography)$")
+    description: str
+    price: float
+
+
+class NFTBatchItem(NFTBatchItemFields):
+    imageBase64: str
+
+
+class NFTBatchUpload(BaseModel):
+    access_token: str
+    items: List[NFTBatchItem] = Field(..., min_length=1, max_length=NFT_BATCH_MAX)
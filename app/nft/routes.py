@@ -1,113 +1,553 @@
-from fastapi import APIRouter, Form, Query
+import json
+import asyncio
+
+from bson import ObjectId
+from fastapi import APIRouter, Body, Depends, File, Form, HTTPException, Query, Request, Response, UploadFile
 from fastapi.responses import JSONResponse
+from pymongo import UpdateOne
+from pydantic import TypeAdapter, ValidationError
+from pymongo.errors import BulkWriteError
 
-from .models import nft_collection
-from .utils import upload_image_to_api, get_user_info_from_api
+from app.auth.jwt_handler import oauth2_scheme
+from app.conditional import (
+    bump_collection_version,
+    etag_matches,
+    get_collection_version,
+    make_etag,
+    not_modified,
+    set_cache_headers,
+    LISTING_CACHE_CONTROL,
+)
+from app.database import get_db
+from app.images.derivatives import create_derivatives, image_urls, RENDITION_NAMES
+from app.images.store import put_image_file, DUPLICATE_KEY_ERROR
+from app.images.uploads import image_from_form, spool_upload, upload_error_response, SpooledImage
+from app.pagination import apply_after, fetch_page
+from app.responses import dumps, FastJSONResponse
+from app.streaming import iter_documents, stream_documents, STREAM_BATCH_MAX, STREAM_BATCH_SIZE
+from app.workers import WorkerPoolBusy
+from .counters import format_artwork_counters, get_facet_counts, record_new_artworks, ARTWORK_COUNTER_FIELDS
+from .jobs import enqueue_upload_job, format_upload_job, get_upload_job
+from .ingest import batch_duplicate_result, find_near_duplicates, ingest_nft, nft_metadata_update
+from .models import get_nft_collection, NFTBatchItemFields, NFTBatchUpload, NFT_BATCH_MAX, NFT_BATCH_MAX_BYTES
+from .similarity import near_duplicate_index, NEAR_DUPLICATE_POLICY
+from .utils import (
+    upload_image_file_to_api,
+    resolve_uploader_id,
+    attach_image_urls,
+    attach_inline_images,
+    locate_uploaded_nft,
+    NFT_BATCH_CONCURRENCY,
+    NFT_LIST_PROJECTION,
+    NFT_PAGE_MAX,
+    NFT_PAGE_SIZE,
+    NFT_SORTS,
+    facet_cache,
+    facets_from_counts,
+    format_facets,
+    nft_facets_pipeline,
+    UNCLAIMED_NFT,
+)
 
-from typing import Optional, List
+from typing import Dict, List, Optional, Sequence
 
 nft_router = APIRouter()
 
+# The item metadata of a multipart batch upload, sent as a JSON form field
+NFT_BATCH_ITEMS = TypeAdapter(List[NFTBatchItemFields])
+
 @nft_router.post("/frontend_upload")
 async def frontend_upload(
-    imageBase64: str = Form(...),
+    image: Optional[UploadFile] = File(None, description="The image as a file part (preferred)"),
+    imageBase64: Optional[str] = Form(None, description="The image as base64, for older clients"),
     name: str = Form(...),
     access_token: str = Form(...),
     art_type: str = Form(...),
     description: str = Form(...),
     price: float = Form(...)
 ):
-    # Step 1: Upload image
-    upload_result, upload_error = await upload_image_to_api(imageBase64, name)
-    if upload_error:
-        return upload_error
-    if "error" in upload_result:
-        return JSONResponse(content={"upload_result": upload_result}, status_code=400)
-
-    # Step 2: Get user info
-    user_data, user_error = await get_user_info_from_api(access_token)
+    try:
+        upload = await image_from_form(image, imageBase64)
+    except ValueError as e:
+        return upload_error_response(e)
+
+    # Step 1: Resolve the uploader before doing any upload work
+    user_id, user_error = await resolve_uploader_id(access_token)
     if user_error:
-        return JSONResponse(
-            content={
-                "error": user_error.body.decode() if hasattr(user_error, "body") else str(user_error),
-                "upload_result": upload_result
-            },
-            status_code=502
+        return user_error
+
+    payload, status_code = await ingest_nft(upload, name, user_id, art_type, description, price)
+    if status_code != 200:
+        return JSONResponse(content=payload, status_code=status_code)
+    return payload
+
+
+@nft_router.post("/upload_jobs", status_code=202, summary="Queue an NFT upload and return straight away")
+async def create_upload_job(
+    request: Request,
+    response: Response,
+    image: Optional[UploadFile] = File(None, description="The image as a file part (preferred)"),
+    imageBase64: Optional[str] = Form(None, description="The image as base64, for older clients"),
+    name: str = Form(...),
+    access_token: str = Form(...),
+    art_type: str = Form(...),
+    description: str = Form(...),
+    price: float = Form(...)
+):
+    """
+    Same fields as frontend_upload. The uploader is checked and the image stored before answering;
+    the remote upload and metadata write happen in the background. Poll status_url for the result.
+    """
+    try:
+        upload = await image_from_form(image, imageBase64)
+    except ValueError as e:
+        return upload_error_response(e)
+
+    user_id, user_error = await resolve_uploader_id(access_token)
+    if user_error:
+        return user_error
+
+    job = await enqueue_upload_job(upload, user_id, name, art_type, description, price)
+    status_url = str(request.url_for("get_upload_job_status", job_id=str(job["_id"])))
+    response.headers["Location"] = status_url
+    return {"job_id": str(job["_id"]), "status": job["status"], "status_url": status_url}
+
+
+@nft_router.get("/upload_jobs/{job_id}", summary="Progress and result of a queued upload")
+async def get_upload_job_status(job_id: str, response: Response, access_token: str = Depends(oauth2_scheme)):
+    """
+    Only the uploader can see a job; send the same token as a Bearer Authorization header
+    """
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job id")
+
+    user_id, user_error = await resolve_uploader_id(access_token)
+    if user_error:
+        return user_error
+
+    job = await get_upload_job(ObjectId(job_id))
+    # Someone else's job looks the same as a missing one
+    if not job or job["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+
+    if job["status"] in ("queued", "running"):
+        response.headers["Retry-After"] = "2"
+    return format_upload_job(job)
+
+
+@nft_router.post("/batch_upload", summary="Publish many NFTs in one request")
+async def batch_upload(batch: NFTBatchUpload = Body(...)):
+    """
+    Upload a collection in one call, with the images as base64. The whole body is held in memory,
+    so it is capped like any JSON body; bigger collections go to /batch_upload/files.
+    """
+    # Base64 inflates by 4/3, so an oversized batch is refused before anything is decoded
+    if sum(len(item.imageBase64) for item in batch.items) > 4 * -(-NFT_BATCH_MAX_BYTES // 3):
+        raise HTTPException(status_code=413, detail=f"The batch's images add up to more than {NFT_BATCH_MAX_BYTES} bytes")
+
+    user_id, user_error = await resolve_uploader_id(batch.access_token)
+    if user_error:
+        return user_error
+
+    results: List[Optional[dict]] = [None] * len(batch.items)
+    images: Dict[int, SpooledImage] = {}
+    for index, item in enumerate(batch.items):
+        try:
+            images[index] = await image_from_form(None, item.imageBase64, "imageBase64")
+        except ValueError as e:
+            results[index] = {"index": index, "status": "invalid", "error": str(e)}
+
+    return await publish_batch(user_id, batch.items, images, results)
+
+
+@nft_router.post("/batch_upload/files", summary="Publish many NFTs in one multipart request")
+async def batch_upload_files(
+    access_token: str = Form(...),
+    items: str = Form(..., description="JSON array of {name, art_type, description, price}, one per image"),
+    images: List[UploadFile] = File(..., description="The images as file parts, in the order of items"),
+):
+    """
+    Same as batch_upload with the images as file parts. They are spooled to disk as they arrive
+    and read one at a time while their item is processed, so memory doesn't grow with the batch.
+    Together they may take up to NFT_BATCH_MAX_BYTES.
+    """
+    try:
+        metadata = NFT_BATCH_ITEMS.validate_json(items)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=json.loads(e.json(include_url=False)))
+    if not 1 <= len(metadata) <= NFT_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {NFT_BATCH_MAX} items")
+    if len(metadata) != len(images):
+        raise HTTPException(status_code=400, detail="Send one image part per item")
+
+    user_id, user_error = await resolve_uploader_id(access_token)
+    if user_error:
+        return user_error
+
+    results: List[Optional[dict]] = [None] * len(metadata)
+    spooled: Dict[int, SpooledImage] = {}
+    total_bytes = 0
+    for index, upload in enumerate(images):
+        try:
+            spooled[index] = await spool_upload(upload)
+        except ValueError as e:
+            results[index] = {"index": index, "status": "invalid", "error": str(e)}
+            continue
+        total_bytes += spooled[index].size
+        if total_bytes > NFT_BATCH_MAX_BYTES:
+            raise HTTPException(status_code=413,
+                                detail=f"The batch's images add up to more than {NFT_BATCH_MAX_BYTES} bytes")
+
+    return await publish_batch(user_id, metadata, spooled, results)
+
+
+async def publish_batch(user_id: str, items: Sequence[NFTBatchItemFields], images: Dict[int, SpooledImage],
+                        results: List[Optional[dict]]) -> dict:
+    """
+    Shared by both batch uploads: duplicates are found with one query, pieces are processed
+    NFT_BATCH_CONCURRENCY at a time and all documents are completed with a single bulk_write.
+    `images` holds the items whose image could be read; results already has the others'.
+    Returns one result per item, in request order.
+    """
+    # Exact duplicates of published NFTs in one lookup, and repeats within the batch itself
+    nft_collection = await get_nft_collection()
+    existing = {
+        nft["content_hash"]: nft
+        async for nft in nft_collection.find(
+            {"content_hash": {"$in": list({image.sha256 for image in images.values()})}},
+            {"imageBase64": 0}
         )
+    }
+    first_seen = {}
+    pending = []
+    for index, image in images.items():
+        image_hash = image.sha256
+        if image_hash in existing:
+            results[index] = batch_duplicate_result(index, existing[image_hash], user_id)
+        elif image_hash in first_seen:
+            results[index] = {"index": index, "status": "duplicate_in_batch", "same_as": first_seen[image_hash]}
+        else:
+            first_seen[image_hash] = index
+            pending.append(index)
 
-    user_id = user_data.get("id")
-    if not user_id:
-        return JSONResponse(content={
-            "error": "Could not retrieve user ID from user API response.",
-            "user_api_response": user_data,
-            "upload_result": upload_result
-        }, status_code=500)
-
-    # Step 3: Find the uploaded NFT
-    nft = await nft_collection.find_one({"name": name, "imageBase64": imageBase64})
-    if not nft:
-        nft = await nft_collection.find_one({"name": name})
-        if not nft:
-            return JSONResponse(content={
-                "error": "Could not find the uploaded NFT in MongoDB.",
-                "user_id": user_id,
-                "upload_result": upload_result
-            }, status_code=404)
-
-    image_id = str(nft.get("_id"))
-
-    # Step 4: Update the NFT with owner info and additional fields
-    update_result = await nft_collection.update_one(
-        {"_id": nft["_id"]},
-        {
-            "$set": {
-                "art_type": art_type,
-                "nft_owner": user_id,
-                "description": description,
-                "price": price
-            }
-        }
-    )
-
-    return {
-        "message": "NFT saved, user validated, and metadata stored",
-        "user_id": user_id,
-        "image_id": image_id,
-        "description": description,
-        "art_type": art_type,
-        "price": price,
-        "upload_result": upload_result,
-        "image_name": name,
-        "mongo_update": {
-            "matched_count": update_result.matched_count,
-            "modified_count": update_result.modified_count
+    semaphore = asyncio.Semaphore(NFT_BATCH_CONCURRENCY)
+
+    async def prepare(index: int) -> dict:
+        try:
+            return await prepare_item(index)
+        except Exception as e:
+            # One failing piece gets an error result instead of failing (and stranding) the whole batch
+            return {"index": index, "status": "error", "error": f"Could not process this item: {e}"}
+
+    async def prepare_item(index: int) -> dict:
+        item = items[index]
+        image = images[index]
+        image_hash = image.sha256
+        async with semaphore:
+            # Spooled images are only read while their item is being processed
+            image_bytes = image.read()
+            try:
+                hashes, near_duplicates = await find_near_duplicates(image_bytes, user_id)
+            except WorkerPoolBusy:
+                return {"index": index, "status": "error", "error": "Image workers are busy, please try again shortly"}
+            except ValueError as e:
+                return {"index": index, "status": "invalid", "error": str(e)}
+            if near_duplicates and NEAR_DUPLICATE_POLICY == "reject":
+                return {"index": index, "status": "similar", "similar_nfts": near_duplicates}
+
+            upload_result, upload_error = await upload_image_file_to_api(image, item.name)
+            if upload_error:
+                return {"index": index, "status": "error", **json.loads(upload_error.body)}
+            if "error" in upload_result:
+                return {"index": index, "status": "error", "upload_result": upload_result}
+
+            nft = await locate_uploaded_nft(nft_collection, item.name, image_hash, upload_result)
+            if nft is None:
+                return {"index": index, "status": "error", "error": "Could not find the uploaded NFT in MongoDB.",
+                        "upload_result": upload_result}
+            nft_id = nft["_id"]
+
+            stored, derivatives = await asyncio.gather(put_image_file(image), create_derivatives(image_bytes))
+            stored.update(derivatives)
+
+        return {
+            "index": index,
+            "nft_id": nft_id,
+            "hashes": hashes,
+            "near_duplicates": near_duplicates,
+            "update": nft_metadata_update(item.art_type, user_id, item.description, item.price, stored,
+                                          image_hash, hashes, near_duplicates),
         }
-    }
 
-@nft_router.get("/all", summary="Get all NFTs, optionally filter by art_type")
+    operations = []
+    for prepared in await asyncio.gather(*(prepare(index) for index in pending)):
+        if "update" in prepared:
+            operations.append(prepared)
+        else:
+            results[prepared["index"]] = prepared
+
+    # Complete them all in one write; a document another upload completed in the meantime is left alone
+    failed = {}
+    if operations:
+        try:
+            result = await nft_collection.bulk_write(
+                [UpdateOne({"_id": prepared["nft_id"], **UNCLAIMED_NFT}, prepared["update"]) for prepared in operations],
+                ordered=False
+            )
+            matched_count = result.matched_count
+        except BulkWriteError as e:
+            failed = {error["index"]: error for error in e.details.get("writeErrors", [])}
+            matched_count = e.details.get("nMatched", 0)
+
+        if matched_count < len(operations) - len(failed):
+            # Some filters matched nothing: only documents now holding this uploader's image were ours
+            completed = {
+                nft["_id"]: nft.get("content_hash")
+                async for nft in nft_collection.find(
+                    {"_id": {"$in": [prepared["nft_id"] for prepared in operations]}, "nft_owner": user_id},
+                    {"content_hash": 1}
+                )
+            }
+            for position, prepared in enumerate(operations):
+                image_hash = prepared["update"]["$set"]["content_hash"]
+                if position not in failed and completed.get(prepared["nft_id"]) != image_hash:
+                    failed[position] = {"code": None, "errmsg": "The uploaded NFT was completed by another upload."}
+
+    lost_races = []
+    for position, prepared in enumerate(operations):
+        index = prepared["index"]
+        error = failed.get(position)
+        if error is None:
+            results[index] = {
+                "index": index,
+                "status": "created",
+                "image_id": str(prepared["nft_id"]),
+                "image_name": items[index].name,
+                "image": prepared["update"]["$set"]["image"],
+                "image_urls": image_urls(prepared["update"]["$set"]["image"]),
+                "near_duplicates": prepared["near_duplicates"],
+            }
+            if prepared["hashes"]:
+                near_duplicate_index.add(str(prepared["nft_id"]), prepared["hashes"]["phash"], user_id)
+        elif error["code"] == DUPLICATE_KEY_ERROR:
+            # A concurrent upload of the same image won the unique index; drop the copy we just created
+            lost_races.append(prepared["nft_id"])
+            results[index] = {"index": index, "status": "duplicate",
+                              "error": "This image has already been published as an NFT."}
+        else:
+            results[index] = {"index": index, "status": "error", "error": error["errmsg"]}
+
+    if lost_races:
+        await nft_collection.delete_many({"_id": {"$in": lost_races}, **UNCLAIMED_NFT})
+    created = [items[result["index"]] for result in results if result["status"] == "created"]
+    if created:
+        await record_new_artworks(user_id, [(item.art_type, item.price) for item in created])
+        await bump_collection_version("NFT")
+
+    return {"user_id": user_id, "count": len(results), "created": len(created), "results": results}
+
+
+@nft_router.get("/all", summary="List NFTs one page at a time, optionally filtered by art_type")
 async def get_all_nfts(
+    request: Request,
     art_type: Optional[str] = Query(
         None,
         description="NFT art type: digital_art or photography",
         regex="^(digital_art|photography)$"
-    )
+    ),
+    sort: str = Query("recent", description="recent, price_asc or price_desc", regex="^(recent|price_asc|price_desc)$"),
+    limit: int = Query(NFT_PAGE_SIZE, ge=1, le=NFT_PAGE_MAX),
+    after: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    include_image: bool = Query(False, description="Also embed imageBase64 in each item; image_urls are always included"),
+    size: Optional[str] = Query(
+        None,
+        description="Embed this rendition as imageBase64: " + ", ".join(RENDITION_NAMES),
+        regex="^(" + "|".join(RENDITION_NAMES) + ")$"
+    ),
+    format: str = Query(
+        "json",
+        description="json returns one page; ndjson or array streams every matching NFT after the cursor",
+        regex="^(json|ndjson|array)$"
+    ),
+    batch_size: int = Query(STREAM_BATCH_SIZE, ge=1, le=STREAM_BATCH_MAX, description="Cursor batch size when streaming")
 ):
+    # Any NFT write bumps the collection version, so the same query at the same version is the same page
+    version = await get_collection_version("NFT")
+    etag = make_etag("nft-list", version, sorted(request.query_params.multi_items()))
+    if etag_matches(request, etag):
+        return not_modified(etag, LISTING_CACHE_CONTROL)
+
+    nft_collection = await get_nft_collection()
     query = {}
     if art_type:
         query["art_type"] = art_type
+    if sort != "recent":
+        # Price-ordered pages only make sense for NFTs whose metadata has been stored
+        query["price"] = {"$type": "number"}
 
-    projection = {
-        "_id": 1,
-        "name": 1,
-        "imageBase64": 1,
-        "description": 1,
-        "nft_owner": 1,
-        "price": 1
-    }
+    include_image = include_image or size is not None
+    projection = dict(NFT_LIST_PROJECTION)
+    if include_image:
+        projection["imageBase64"] = 1
+
+    if format != "json":
+        try:
+            cursor = nft_collection.find(apply_after(query, NFT_SORTS[sort], after), projection).sort(NFT_SORTS[sort])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        async def prepare(batch):
+            attach_image_urls(batch)
+            if include_image:
+                await attach_inline_images(batch, size or "original")
+
+        documents = iter_documents(cursor, batch_size, prepare)
+        return stream_documents(documents, format, headers={"ETag": etag, "Cache-Control": LISTING_CACHE_CONTROL})
+
+    try:
+        nfts, next_cursor = await fetch_page(nft_collection, query, NFT_SORTS[sort], limit, after, projection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    attach_image_urls(nfts)
+
+    if include_image:
+        # Migrated NFTs keep only image references; load the requested renditions in one batch
+        await attach_inline_images(nfts, size or "original")
+
+    # Documents go out as fetched (ObjectId _id and all); orjson serializes them in one pass
+    response = FastJSONResponse({"count": len(nfts), "nfts": nfts, "next_cursor": next_cursor})
+    set_cache_headers(response, etag, LISTING_CACHE_CONTROL)
+    return response
+
+
+@nft_router.get("/search", summary="Full-text search over NFT names and descriptions with facet counts")
+async def search_nfts(
+    request: Request,
+    q: Optional[str] = Query(None, min_length=1, max_length=200, description="Words to look for in name and description"),
+    art_type: Optional[str] = Query(None, regex="^(digital_art|photography)$"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    sort: str = Query(
+        "recent",
+        description="relevance (needs q, single page), recent, price_asc or price_desc",
+        regex="^(relevance|recent|price_asc|price_desc)$"
+    ),
+    limit: int = Query(NFT_PAGE_SIZE, ge=1, le=NFT_PAGE_MAX),
+    after: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    facets: bool = Query(True, description="Include art_type and price bucket counts")
+):
+    if sort == "relevance" and not q:
+        raise HTTPException(status_code=400, detail="sort=relevance needs a search query")
+    if sort == "relevance" and after:
+        raise HTTPException(status_code=400, detail="sort=relevance returns a single page; after is not supported")
+
+    version = await get_collection_version("NFT")
+    etag = make_etag("nft-search", version, sorted(request.query_params.multi_items()))
+    if etag_matches(request, etag):
+        return not_modified(etag, LISTING_CACHE_CONTROL)
+
+    nft_collection = await get_nft_collection()
+
+    # Text and price conditions are shared by the results and both facets
+    base_query = {}
+    if q:
+        base_query["$text"] = {"$search": q}
+    price_range = {}
+    if min_price is not None:
+        price_range["$gte"] = min_price
+    if max_price is not None:
+        price_range["$lte"] = max_price
+
+    query = dict(base_query)
+    if art_type:
+        query["art_type"] = art_type
+    if price_range:
+        query["price"] = price_range
+    elif sort in ("price_asc", "price_desc"):
+        query["price"] = {"$type": "number"}
+
+    async def fetch_results():
+        if sort == "relevance":
+            projection = {**NFT_LIST_PROJECTION, "score": {"$meta": "textScore"}}
+            cursor = nft_collection.find(query, projection).sort([("score", {"$meta": "textScore"})]).limit(limit)
+            return await cursor.to_list(length=limit), None
+        return await fetch_page(nft_collection, query, NFT_SORTS[sort], limit, after, NFT_LIST_PROJECTION)
+
+    async def fetch_facets():
+        if not facets:
+            return None
+        key = (version, dumps([base_query, art_type, price_range]))
+        cached = facet_cache.get(key)
+        if cached is None and not base_query and not price_range:
+            # Nothing narrows the match, so the counts come from the maintained counters instead
+            # of an aggregation over every NFT
+            cached = facets_from_counts(await get_facet_counts(), art_type)
+            facet_cache.set(key, cached)
+        elif cached is None:
+            pipeline = nft_facets_pipeline(base_query, art_type, price_range or None)
+            result = await nft_collection.aggregate(pipeline).to_list(length=1)
+            cached = format_facets(result[0]) if result else {"art_type": {}, "price": []}
+            facet_cache.set(key, cached)
+        return cached
+
+    try:
+        (nfts, next_cursor), facet_counts = await asyncio.gather(fetch_results(), fetch_facets())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    attach_image_urls(nfts)
+
+    response = FastJSONResponse({"count": len(nfts), "nfts": nfts, "next_cursor": next_cursor, "facets": facet_counts})
+    set_cache_headers(response, etag, LISTING_CACHE_CONTROL)
+    return response
+
+
+@nft_router.get("/owners/{owner_id}", summary="One artist's NFTs one page at a time, with their totals")
+async def get_owner_portfolio(
+    owner_id: str,
+    request: Request,
+    art_type: Optional[str] = Query(None, regex="^(digital_art|photography)$"),
+    sort: str = Query("recent", description="recent, price_asc or price_desc", regex="^(recent|price_asc|price_desc)$"),
+    limit: int = Query(NFT_PAGE_SIZE, ge=1, le=NFT_PAGE_MAX),
+    after: Optional[str] = Query(None, description="next_cursor from the previous page")
+):
+    """
+    Served by the (nft_owner, _id) and (nft_owner, price, _id) indexes; the totals come from the
+    counters kept on the user document rather than from counting NFTs
+    """
+    version = await get_collection_version("NFT")
+    etag = make_etag("nft-owner", version, owner_id, sorted(request.query_params.multi_items()))
+    if etag_matches(request, etag):
+        return not_modified(etag, LISTING_CACHE_CONTROL)
+
+    nft_collection = await get_nft_collection()
+    query = {"nft_owner": owner_id}
+    if art_type:
+        query["art_type"] = art_type
+    if sort != "recent":
+        query["price"] = {"$type": "number"}
+
+    db = await get_db()
+    try:
+        (nfts, next_cursor), owner = await asyncio.gather(
+            fetch_page(nft_collection, query, NFT_SORTS[sort], limit, after, NFT_LIST_PROJECTION),
+            db["users"].find_one({"_id": owner_id}, {field: 1 for field in ARTWORK_COUNTER_FIELDS}),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if owner is None and not nfts:
+        raise HTTPException(status_code=404, detail="Artist not found")
 
-    nfts = []
-    async for nft in nft_collection.find(query, projection):
-        nft["_id"] = str(nft["_id"])
-        nfts.append(nft)
+    attach_image_urls(nfts)
 
-    return {"count": len(nfts), "nfts": nfts}
\ No newline at end of file
+    response = FastJSONResponse({
+        "owner_id": owner_id,
+        "artworks": format_artwork_counters(owner or {}),
+        "count": len(nfts),
+        "nfts": nfts,
+        "next_cursor": next_cursor,
+    })
+    set_cache_headers(response, etag, LISTING_CACHE_CONTROL)
+    return response
@@ -0,0 +1,235 @@
+import io
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from PIL import Image
+
+from app.database import get_db
+from app.images.derivatives import image_pool, IMAGE_DECODE_ERRORS, IMAGE_POOL_ERRORS
+from app.workers import WorkerPoolBusy
+
+load_dotenv()
+
+# Configuration
+NEAR_DUPLICATE_POLICY = os.getenv("NEAR_DUPLICATE_POLICY", "flag")  # "reject", "flag" or "off"
+NEAR_DUPLICATE_DISTANCE = int(os.getenv("NEAR_DUPLICATE_DISTANCE", 6))  # max differing bits of 64
+
+# Documents hashed by other workers are picked up by sync(); the overlap covers clock skew
+# between workers and writes that were in flight during the previous sync
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.astype(np.uint8).flatten()).tobytes(), "big")
+
+
+def compute_perceptual_hashes(data: bytes) -> Dict[str, int]:
+    """
+    64-bit pHash (low-frequency DCT signs) and dHash (horizontal gradient signs) of an image.
+    Runs in the image worker pool.
+    """
+    with Image.open(io.BytesIO(data)) as opened:
+        gray = opened.convert("L")
+
+    pixels = np.asarray(gray.resize((32, 32), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT_32 @ pixels @ _DCT_32.T)[:8, :8]
+    phash = _bits_to_int(low > np.median(low.flatten()[1:]))
+
+    pixels = np.asarray(gray.resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    dhash = _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+    return {"phash": phash, "dhash": dhash}
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def hash_to_hex(value: int) -> str:
+    return f"{value:016x}"
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over 64-bit hashes for "everything within distance r" queries
+    """
+
+    def __init__(self):
+        # Nodes are [hash, items, {distance: child}]
+        self.root = None
+        self.size = 0
+
+    def add(self, key: int, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [key, [item], {}]
+            return
+
+        node = self.root
+        while True:
+            distance = hamming(key, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [key, [item], {}]
+                return
+            node = child
+
+    def search(self, key: int, radius: int) -> List[Tuple[object, int]]:
+        results = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(key, node[0])
+            if distance <= radius:
+                results.extend((item, distance) for item in node[1])
+            # Triangle inequality: only subtrees at distance d±radius can hold matches
+            for child_distance, child in node[2].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return results
+
+
+def _popcount64(values: np.ndarray) -> np.ndarray:
+    # SWAR popcount on uint64 arrays (wrapping multiplication is intended)
+    values = values - ((values >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    values = (values & np.uint64(0x3333333333333333)) + ((values >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    values = (values + (values >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (values * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def near_duplicate_pairs(hashes: np.ndarray, max_distance: int, block_bytes: int = 32 * 1024 * 1024) -> np.ndarray:
+    """
+    All index pairs (i, j), i < j, whose hashes differ in at most max_distance bits.
+
+    Compares a block of rows against the rest of the array at a time, so memory stays around
+    block_bytes whatever the catalogue size.
+    """
+    count = len(hashes)
+    rows_per_block = max(1, block_bytes // max(count * 8, 1))
+    pairs = []
+    for start in range(0, count, rows_per_block):
+        rows = hashes[start:start + rows_per_block]
+        distances = _popcount64(rows[:, None] ^ hashes[None, :])
+        i, j = np.nonzero(distances <= max_distance)
+        i += start
+        upper = j > i
+        pairs.append(np.stack([i[upper], j[upper]], axis=1))
+
+    return np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+
+
+def cluster_near_duplicates(ids: List[str], hashes: List[int], max_distance: int) -> List[List[str]]:
+    """
+    Group NFTs into connected components of near-duplicate pairs (runs in the image worker pool)
+    """
+    pairs = near_duplicate_pairs(np.array(hashes, dtype=np.uint64), max_distance)
+
+    parent = list(range(len(ids)))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j in pairs:
+        parent[find(int(i))] = find(int(j))
+
+    groups: Dict[int, List[str]] = {}
+    for index, nft_id in enumerate(ids):
+        groups.setdefault(find(index), []).append(nft_id)
+    return sorted((group for group in groups.values() if len(group) > 1), key=len, reverse=True)
+
+
+class NearDuplicateIndex:
+    """
+    In-memory pHash index of every hashed NFT, rebuilt from MongoDB at startup and kept up to
+    date incrementally: local ingests are added directly, other workers' via sync()
+    """
+
+    def __init__(self):
+        self.tree = BKTree()
+        self.entries: Dict[str, Tuple[int, Optional[str]]] = {}
+        self.synced_at: Optional[datetime] = None
+
+    def add(self, nft_id: str, phash: int, owner: Optional[str]):
+        if nft_id in self.entries:
+            return
+        self.entries[nft_id] = (phash, owner)
+        self.tree.add(phash, nft_id)
+
+    async def _load(self, query: dict):
+        db = await get_db()
+        cursor = db["NFT"].find(query, {"perceptual_hash.phash": 1, "nft_owner": 1, "perceptual_hashed_at": 1})
+        async for nft in cursor:
+            self.add(str(nft["_id"]), int(nft["perceptual_hash"]["phash"], 16), nft.get("nft_owner"))
+
+    async def rebuild(self):
+        self.tree = BKTree()
+        self.entries = {}
+        started = datetime.utcnow()
+        await self._load({"perceptual_hash.phash": {"$exists": True}})
+        self.synced_at = started
+        print(f"Near-duplicate index loaded with {len(self.entries)} NFTs")
+
+    async def sync(self):
+        if self.synced_at is None:
+            await self.rebuild()
+            return
+        started = datetime.utcnow()
+        await self._load({"perceptual_hashed_at": {"$gte": self.synced_at - SYNC_OVERLAP}})
+        self.synced_at = started
+
+    def find(self, phash: int, max_distance: int = NEAR_DUPLICATE_DISTANCE) -> List[dict]:
+        matches = self.tree.search(phash, max_distance)
+        return sorted(
+            ({"nft_id": nft_id, "owner": self.entries[nft_id][1], "distance": distance} for nft_id, distance in matches),
+            key=lambda match: match["distance"]
+        )
+
+    async def clusters(self, max_distance: int = NEAR_DUPLICATE_DISTANCE) -> List[List[str]]:
+        ids = list(self.entries)
+        hashes = [self.entries[nft_id][0] for nft_id in ids]
+        return await image_pool.run("similarity_scan", cluster_near_duplicates, ids, hashes, max_distance)
+
+    def stats(self) -> dict:
+        return {"size": len(self.entries), "synced_at": self.synced_at}
+
+
+near_duplicate_index = NearDuplicateIndex()
+
+
+async def perceptual_hashes(data: bytes, required: bool = False) -> Optional[Dict[str, int]]:
+    """
+    Perceptual hashes of an image, or None when it can't be decoded or the pool can't run the job.
+    With required=True those cases raise instead: ValueError for an undecodable image and
+    WorkerPoolBusy when the pool is saturated or broken.
+    """
+    try:
+        return await image_pool.run("perceptual_hash", compute_perceptual_hashes, data)
+    except IMAGE_DECODE_ERRORS as e:
+        if required:
+            raise ValueError(f"Image could not be decoded: {e}")
+        print(f"Could not compute perceptual hash: {e}")
+    except IMAGE_POOL_ERRORS as e:
+        if required:
+            raise WorkerPoolBusy(str(e))
+        print(f"Skipping perceptual hash: {e}")
+    return None
@@ -1,19 +1,167 @@
+import os
+from bisect import bisect_right
+
+from dotenv import load_dotenv
+from bson import ObjectId
+from fastapi import HTTPException
 from fastapi.responses import JSONResponse
-import httpx
+
+from app.auth.jwt_handler import get_user_from_token
+from app.cache import TTLCache
+from app.http_client import CircuitOpenError, send_with_retries
+from app.images.derivatives import image_urls, pick_rendition
+from app.images.store import content_hash, decode_base64_image, load_images_base64
+from app.images.uploads import Base64JSONBody, SpooledImage
+
+load_dotenv()
 
 UPLOAD_API_URL = "https://pixora-nft-copyrights-7e3a5bcac7e4.herokuapp.com/upload"
-USER_API_URL = "https://pixora-f96ef5c321f5.herokuapp.com/api/user/me"
+USER_API_URL = os.getenv("USER_API_URL", "https://pixora-f96ef5c321f5.herokuapp.com/api/user/me")
+
+# "local" validates the uploader's token in-process; "remote" asks USER_API_URL instead,
+# for deployments where the NFT service does not share the users database or JWT secret
+USER_LOOKUP_MODE = os.getenv("USER_LOOKUP_MODE", "local")
+
+# Keep imageBase64 on NFT documents after moving the image into the image store. On by default
+# because the upload service may still read the inline copy; set it to false once it no longer does.
+NFT_KEEP_INLINE_IMAGE = os.getenv("NFT_KEEP_INLINE_IMAGE", "true").lower() == "true"
+
+# How many recent same-name NFTs to check when the upload service doesn't say which document it created
+NFT_LOCATE_CANDIDATES = int(os.getenv("NFT_LOCATE_CANDIDATES", 5))
+
+# Pieces of a batch upload that are processed (uploaded, hashed, rendered) at the same time
+NFT_BATCH_CONCURRENCY = int(os.getenv("NFT_BATCH_CONCURRENCY", 8))
+
+NFT_PAGE_SIZE = int(os.getenv("NFT_PAGE_SIZE", 50))
+NFT_PAGE_MAX = int(os.getenv("NFT_PAGE_MAX", 200))
+
+# Listing sort orders; each one is backed by an index created in init_db
+NFT_SORTS = {
+    "recent": [("_id", -1)],
+    "price_asc": [("price", 1), ("_id", 1)],
+    "price_desc": [("price", -1), ("_id", -1)],
+}
+
+# Listing fields; the image itself is only included on request
+NFT_LIST_PROJECTION = {
+    "_id": 1,
+    "name": 1,
+    "description": 1,
+    "art_type": 1,
+    "nft_owner": 1,
+    "price": 1,
+    "image": 1
+}
+
+# Lower bounds of the price facet buckets, e.g. "0,10,50" gives [0, 10), [10, 50), [50, and up)
+# and "other" for NFTs without a usable price. The maintained facet counters depend on these,
+# so rebuild them (python -m app.nft.counters) after changing the buckets.
+NFT_PRICE_BUCKETS = [float(bound) for bound in os.getenv("NFT_PRICE_BUCKETS", "0,10,50,100,500,1000,5000").split(",")]
+
+# Facet counts are cached per collection version, so a repeated search never recounts
+# until an NFT is written
+facet_cache = TTLCache(max_size=1024, ttl_seconds=float(os.getenv("NFT_FACET_CACHE_TTL_SECONDS", 300)))
+
+
+def nft_facets_pipeline(base_query: dict, art_type: str = None, price_range: dict = None) -> list:
+    """
+    Per-art_type counts (honouring the price filter) and price bucket counts (honouring the
+    art_type filter), so each facet shows the options still available on the other dimension
+    """
+    art_type_match = {"price": price_range} if price_range else {}
+    price_match = {"art_type": art_type} if art_type else {}
+    return [
+        {"$match": base_query},
+        {"$project": {"_id": 0, "art_type": 1, "price": 1}},
+        {"$facet": {
+            "art_type": [
+                {"$match": art_type_match},
+                {"$group": {"_id": "$art_type", "count": {"$sum": 1}}},
+            ],
+            "price": [
+                {"$match": price_match},
+                # The infinite bound gives the top bucket its own row instead of sharing "other" with missing prices
+                {"$bucket": {"groupBy": "$price", "boundaries": NFT_PRICE_BUCKETS + [float("inf")], "default": "other",
+                             "output": {"count": {"$sum": 1}}}},
+            ],
+        }},
+    ]
+
+
+def format_facets(result: dict) -> dict:
+    upper_bounds = dict(zip(NFT_PRICE_BUCKETS, NFT_PRICE_BUCKETS[1:]))
+    return {
+        "art_type": {row["_id"] or "unknown": row["count"] for row in result["art_type"]},
+        "price": [
+            {"min": row["_id"], "max": upper_bounds.get(row["_id"]), "count": row["count"]}
+            if row["_id"] != "other" else {"min": None, "max": None, "count": row["count"]}
+            for row in result["price"]
+        ],
+    }
+
+
+def price_bucket_key(price) -> str:
+    """
+    The facet bucket of a price, as nft_facets_pipeline puts it: "b<n>" for NFT_PRICE_BUCKETS[n], or "other"
+    """
+    if isinstance(price, (int, float)) and not isinstance(price, bool):
+        position = bisect_right(NFT_PRICE_BUCKETS, price) - 1
+        if position >= 0:
+            return f"b{position}"
+    return "other"
+
+
+def facets_from_counts(counts: dict, art_type: str = None) -> dict:
+    """
+    The facets of a search without text or price conditions, from the maintained
+    {art_type: {bucket: count}} counters instead of an aggregation over every NFT
+    """
+    art_type_rows = [{"_id": name, "count": sum(buckets.values())} for name, buckets in counts.items()]
+
+    price_counts = {}
+    for name, buckets in counts.items():
+        if art_type and name != art_type:
+            continue
+        for key, count in buckets.items():
+            price_counts[key] = price_counts.get(key, 0) + count
+    # Same rows, in the same order, as $bucket gives: by lower bound, then "other"
+    price_rows = [{"_id": bound, "count": price_counts.get(f"b{position}", 0)}
+                  for position, bound in enumerate(NFT_PRICE_BUCKETS)]
+    price_rows.append({"_id": "other", "count": price_counts.get("other", 0)})
+
+    return format_facets({
+        "art_type": [row for row in art_type_rows if row["count"] > 0],
+        "price": [row for row in price_rows if row["count"] > 0],
+    })
+
 
 async def upload_image_to_api(imageBase64: str, name: str):
     json_payload = {
         "imageBase64": imageBase64,
         "name": name
     }
+    return await _post_to_upload_api(json=json_payload)
+
+
+async def upload_image_file_to_api(image: SpooledImage, name: str):
+    """
+    Same request as upload_image_to_api, with the base64 body encoded from the spooled file as it is sent
+    """
+    body = Base64JSONBody(image, name=name)
+    headers = {"Content-Type": "application/json", "Content-Length": str(body.content_length())}
+    return await _post_to_upload_api(content=body, headers=headers)
+
+
+async def _post_to_upload_api(**request_kwargs):
     try:
-        async with httpx.AsyncClient(timeout=20) as client:
-            upload_response = await client.post(UPLOAD_API_URL, json=json_payload)
-            upload_result = upload_response.json()
+        upload_response = await send_with_retries("POST", UPLOAD_API_URL, **request_kwargs)
+        upload_result = upload_response.json()
         return upload_result, None
+    except CircuitOpenError as e:
+        return None, JSONResponse(
+            content={"error": f"Upload API unavailable: {str(e)}"},
+            status_code=503
+        )
     except Exception as e:
         return None, JSONResponse(
             content={"error": f"Upload API connection failed: {str(e)}"},
@@ -23,13 +171,133 @@ async def upload_image_to_api(imageBase64: str, name: str):
 async def get_user_info_from_api(access_token: str):
     headers = {"Authorization": f"Bearer {access_token}"}
     try:
-        async with httpx.AsyncClient(timeout=20) as client:
-            user_response = await client.get(USER_API_URL, headers=headers, follow_redirects=True)
-            user_response.raise_for_status()
-            user_data = user_response.json()
+        user_response = await send_with_retries("GET", USER_API_URL, headers=headers, follow_redirects=True)
+        user_response.raise_for_status()
+        user_data = user_response.json()
         return user_data, None
+    except CircuitOpenError as e:
+        return None, JSONResponse(
+            content={"error": f"User API unavailable: {str(e)}"},
+            status_code=503
+        )
     except Exception as e:
         return None, JSONResponse(
             content={"error": f"User API connection failed: {str(e)}"},
             status_code=502
-        )
\ No newline at end of file
+        )
+
+async def resolve_uploader(access_token: str):
+    """
+    Resolve the user behind an access token, returning (user_data, error_response)
+    """
+    if USER_LOOKUP_MODE == "remote":
+        return await get_user_info_from_api(access_token)
+
+    try:
+        return await get_user_from_token(access_token), None
+    except HTTPException as e:
+        return None, JSONResponse(
+            content={"error": e.detail},
+            status_code=e.status_code,
+            headers=e.headers
+        )
+
+
+async def resolve_uploader_id(access_token: str):
+    """
+    The id of the user behind an access token, returning (user_id, error_response)
+    """
+    user_data, user_error = await resolve_uploader(access_token)
+    if user_error:
+        return None, user_error
+
+    user_id = user_data.get("id")
+    if not user_id:
+        return None, JSONResponse(content={
+            "error": "Could not retrieve user ID from user API response.",
+            "user_api_response": user_data
+        }, status_code=500)
+    return user_id, None
+
+
+def attach_image_urls(nfts: list):
+    """
+    Add image_urls (original and renditions) to NFTs whose image is in the image store
+    """
+    for nft in nfts:
+        if nft.get("image"):
+            nft["image_urls"] = image_urls(nft["image"])
+
+
+async def attach_inline_images(nfts: list, size: str = "original"):
+    """
+    Fill in imageBase64 from the image store, using the requested rendition where one exists.
+    NFTs that were never migrated keep their inline original.
+    """
+    refs = {}
+    for nft in nfts:
+        if not nft.get("image") or (size == "original" and "imageBase64" in nft):
+            continue
+        refs[nft["_id"]] = pick_rendition(nft["image"], size)
+    if not refs:
+        return
+
+    images = await load_images_base64(refs.values())
+    for nft in nfts:
+        ref = refs.get(nft["_id"])
+        if ref and ref["sha256"] in images:
+            nft["imageBase64"] = images[ref["sha256"]]
+
+
+def uploaded_nft_id(upload_result: dict):
+    """
+    The ObjectId of the created document, when the upload service's response seems to include it.
+    The key is a guess, so the document it points at still has to pass is_uploaded_nft.
+    """
+    for key in ("_id", "id", "nft_id", "image_id", "inserted_id"):
+        value = upload_result.get(key) if isinstance(upload_result, dict) else None
+        if isinstance(value, str) and ObjectId.is_valid(value):
+            return ObjectId(value)
+    return None
+
+
+# Only documents that no ingest has completed yet can be the one just uploaded. An owned NFT
+# from before content hashes is not one of those: claiming it would move it to a new owner
+# without taking it off the previous owner's counters.
+UNCLAIMED_NFT = {"content_hash": {"$exists": False}, "nft_owner": {"$exists": False}}
+
+
+def is_uploaded_nft(nft: dict, image_hash: str) -> bool:
+    """
+    Whether an unclaimed NFT holds exactly this image
+    """
+    try:
+        return content_hash(decode_base64_image(nft.get("imageBase64") or "")) == image_hash
+    except ValueError:
+        return False
+
+
+async def locate_uploaded_nft(nft_collection, name: str, image_hash: str, upload_result: dict):
+    """
+    Find the document the upload service just inserted for this image.
+
+    Tries the id from the upload response first, then the most recent unclaimed NFTs with this
+    name (name index). Either way the document must be unclaimed (no hash, no owner) and its image
+    must hash to image_hash; anything else is someone else's NFT and is never returned.
+    """
+    nft_id = uploaded_nft_id(upload_result)
+    if nft_id:
+        nft = await nft_collection.find_one({"_id": nft_id, **UNCLAIMED_NFT}, {"imageBase64": 1})
+        if nft and is_uploaded_nft(nft, image_hash):
+            return nft
+
+    candidates = nft_collection.find(
+        {"name": name, **UNCLAIMED_NFT},
+        {"imageBase64": 1}
+    ).sort("_id", -1).limit(NFT_LOCATE_CANDIDATES)
+
+    async for candidate in candidates:
+        if is_uploaded_nft(candidate, image_hash):
+            return candidate
+
+    return None
@@ -0,0 +1,99 @@
+import json
+import base64
+import binascii
+from datetime import datetime
+from typing import List, Tuple
+
+from bson import ObjectId
+
+# A sort specification as passed to Motor, e.g. [("price", 1), ("_id", 1)].
+# Its last field must be unique (normally _id) so that every position is well defined.
+SortSpec = List[Tuple[str, int]]
+
+
+def _encode_value(value):
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "$oid" in value:
+            return ObjectId(value["$oid"])
+        if "$date" in value:
+            return datetime.fromisoformat(value["$date"])
+    return value
+
+
+def encode_cursor(values: dict) -> str:
+    """
+    Turn the sort-key values of the last document on a page into an opaque token
+    """
+    raw = json.dumps({key: _encode_value(value) for key, value in values.items()}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort: SortSpec) -> dict:
+    """
+    Decode a token produced by encode_cursor for the same sort; raises ValueError if it doesn't fit
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+    if not isinstance(values, dict) or set(values) != {field for field, _ in sort}:
+        raise ValueError("Invalid cursor for this sort order")
+
+    try:
+        return {key: _decode_value(value) for key, value in values.items()}
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def keyset_filter(sort: SortSpec, last: dict) -> dict:
+    """
+    Query matching documents that come strictly after `last` in the given sort order
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {prefix: last[prefix] for prefix, _ in sort[:i]}
+        clause[field] = {"$gt" if direction == 1 else "$lt": last[field]}
+        clauses.append(clause)
+
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def cursor_for(document: dict, sort: SortSpec) -> str:
+    return encode_cursor({field: document[field] for field, _ in sort})
+
+
+def apply_after(query: dict, sort: SortSpec, after: str = None) -> dict:
+    """
+    Restrict a query to documents after the cursor position; raises ValueError for a bad cursor
+    """
+    if not after:
+        return query
+
+    position = keyset_filter(sort, decode_cursor(after, sort))
+    return {"$and": [query, position]} if query else position
+
+
+async def fetch_page(collection, query: dict, sort: SortSpec, limit: int, after: str = None,
+                     projection: dict = None) -> Tuple[list, str]:
+    """
+    Fetch one keyset page and return (documents, next_cursor); next_cursor is None on the last page
+    """
+    query = apply_after(query, sort, after)
+    documents = await collection.find(query, projection).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = cursor_for(documents[-1], sort)
+
+    return documents, next_cursor
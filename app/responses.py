@@ -0,0 +1,31 @@
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+# orjson writes datetime/date (ISO 8601, like FastAPI), dicts with non-string keys, and UTF-8
+# without escaping, in C; only BSON types need the Python fallback below
+JSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def json_default(value):
+    """
+    Serialize the BSON types that show up in documents
+    """
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content, sort_keys: bool = False) -> bytes:
+    option = JSON_OPTIONS | orjson.OPT_SORT_KEYS if sort_keys else JSON_OPTIONS
+    return orjson.dumps(content, default=json_default, option=option)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    The app's default response class. Endpoints on hot paths return it directly with raw
+    documents (ObjectIds, datetimes and all), which also skips FastAPI's jsonable_encoder pass.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,59 @@
+import os
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+from fastapi.responses import StreamingResponse
+
+from app.responses import dumps
+
+load_dotenv()
+
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 200))
+STREAM_BATCH_MAX = int(os.getenv("STREAM_BATCH_MAX", 2000))
+
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "array": "application/json",
+}
+
+
+async def iter_documents(cursor, batch_size: int = STREAM_BATCH_SIZE,
+                         prepare: Optional[Callable[[list], Awaitable]] = None) -> AsyncIterator[dict]:
+    """
+    Yield documents as the cursor produces them, batch by batch.
+
+    prepare, if given, is awaited on each batch before it is yielded, so per-page work
+    (e.g. loading images for a batch) still happens once per batch rather than per document.
+    """
+    cursor.batch_size(batch_size)
+    while True:
+        batch = await cursor.to_list(length=batch_size)
+        if not batch:
+            return
+        if prepare is not None:
+            await prepare(batch)
+        for document in batch:
+            yield document
+
+
+async def _ndjson(documents: AsyncIterator[dict], transform: Callable) -> AsyncIterator[bytes]:
+    async for document in documents:
+        yield dumps(transform(document)) + b"\n"
+
+
+async def _json_array(documents: AsyncIterator[dict], transform: Callable) -> AsyncIterator[bytes]:
+    separator = b"["
+    async for document in documents:
+        yield separator + dumps(transform(document))
+        separator = b","
+    yield b"[]" if separator == b"[" else b"]"
+
+
+def stream_documents(documents: AsyncIterator[dict], format: str,
+                     transform: Callable[[dict], dict] = lambda document: document,
+                     headers: Optional[dict] = None) -> StreamingResponse:
+    """
+    Stream documents as NDJSON ("ndjson") or as one chunked JSON array ("array")
+    """
+    body = _ndjson(documents, transform) if format == "ndjson" else _json_array(documents, transform)
+    return StreamingResponse(body, media_type=STREAM_MEDIA_TYPES[format], headers=headers)
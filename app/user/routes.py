@@ -1,20 +1,144 @@
+import asyncio
+from typing import Optional
+
 from bson import ObjectId
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, status, Body, Request, UploadFile
+from pydantic import HttpUrl
 from datetime import datetime
-from app.auth.jwt_handler import get_current_user
+from app.auth.jwt_handler import get_current_user, invalidate_cached_user, user_view_cache
 from app.user.models import VerificationRequestInput, UpdateUserProfile
-from app.user.utils import user_helper, user_details_helper
+from app.user.utils import (
+    user_dashboard_pipeline,
+    USER_PROJECTION,
+    USER_DETAILS_PROJECTION,
+    DASHBOARD_HISTORY_PAGE_MAX,
+    DASHBOARD_HISTORY_PAGE_SIZE,
+    VERIFICATION_HISTORY_SORT,
+)
+from app.admin.utils import VERIFICATION_REQUEST_PROJECTION
+from app.nft.counters import format_artwork_counters
+from app.conditional import etag_matches, make_etag, not_modified, set_cache_headers, PRIVATE_CACHE_CONTROL
 from app.database import get_db
+from app.pagination import cursor_for
+from app.responses import FastJSONResponse
+from app.images.derivatives import create_derivatives, image_urls
+from app.images.store import put_image_file
+from app.images.uploads import image_from_form, spool_upload, upload_http_error, SpooledImage, UploadTooLarge
 
 user_router = APIRouter()
 
 
+def user_etag(representation: str, user_id: str, updated_at, body: Optional[dict] = None) -> str:
+    # updated_at changes on every profile write; older documents without it fall back to the body
+    return make_etag(representation, user_id, updated_at or body)
+
+
+async def projected_current_user(current_user: dict, representation: str, projection: dict) -> dict:
+    """
+    The current user's document shaped by `projection`. MongoDB builds it once; after that it is
+    served from user_view_cache, which expires and is invalidated together with the cached user.
+    """
+    user_id = current_user["id"]
+    views = user_view_cache.get(user_id)
+    if views is not None and representation in views:
+        return views[representation]
+
+    db = await get_db()
+    result = await db["users"].aggregate([
+        {"$match": {"_id": user_id}},
+        {"$project": projection},
+    ]).to_list(length=1)
+    if not result:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    if views is None:
+        views = {}
+        user_view_cache.set(user_id, views)
+    views[representation] = result[0]
+    return result[0]
+
+
+async def current_user_response(request: Request, current_user: dict, representation: str, projection: dict):
+    """
+    Conditional GET of the current user's document shaped by `projection`; steady-state
+    requests, revalidations or not, are answered from the caches
+    """
+    if current_user.get("updated_at"):
+        etag = user_etag(representation, current_user["id"], current_user["updated_at"])
+        if etag_matches(request, etag):
+            return not_modified(etag, PRIVATE_CACHE_CONTROL)
+
+    user = await projected_current_user(current_user, representation, projection)
+
+    etag = user_etag(representation, current_user["id"], user.get("updated_at"), user)
+    if etag_matches(request, etag):
+        return not_modified(etag, PRIVATE_CACHE_CONTROL)
+
+    response = FastJSONResponse(user)
+    set_cache_headers(response, etag, PRIVATE_CACHE_CONTROL)
+    return response
+
+
 @user_router.get("/me", response_model=dict)
-async def get_user_details(current_user: dict = Depends(get_current_user)):
+async def get_user_details(request: Request, current_user: dict = Depends(get_current_user)):
     """
     Get details of the currently authenticated user
     """
-    return user_helper(current_user)
+    return await current_user_response(request, current_user, "user", USER_PROJECTION)
+
+
+@user_router.get("/dashboard", summary="Profile, verification status and history, and NFT totals")
+async def get_user_dashboard(
+    limit: int = Query(DASHBOARD_HISTORY_PAGE_SIZE, ge=1, le=DASHBOARD_HISTORY_PAGE_MAX),
+    after: Optional[str] = Query(None, description="verification_history.next_cursor from the previous page"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Everything the user's dashboard shows, from a single aggregation. The verification history
+    is paginated with `limit` and `after` and never includes the ID images.
+    """
+    db = await get_db()
+    try:
+        pipeline = user_dashboard_pipeline(current_user["id"], limit, after)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    result = await db["users"].aggregate(pipeline).to_list(length=1)
+    if not result:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    dashboard = result[0]
+
+    history = dashboard.pop("verification_history")
+    next_cursor = None
+    if len(history) > limit:
+        history = history[:limit]
+        next_cursor = cursor_for(history[-1], VERIFICATION_HISTORY_SORT)
+
+    latest = dashboard.pop("latest_verification")
+
+    return FastJSONResponse({
+        "profile": dashboard["profile"],
+        "verification": {
+            "status": dashboard.get("verification_status") or (latest[0]["status"] if latest else None),
+            "latest": latest[0] if latest else None,
+            "history": history,
+            "next_cursor": next_cursor,
+        },
+        "nfts": format_artwork_counters(dashboard),
+    })
+
+
+@user_router.get("/verification-requests", response_description="Get all verification requests for the current user")
+async def get_verification_requests(current_user: dict = Depends(get_current_user)):
+    """
+    Get all verification requests for the current user, newest first
+    """
+    db = await get_db()
+
+    cursor = db["VerificationRequests"].find({"user_id": current_user["id"]}, VERIFICATION_REQUEST_PROJECTION)
+    cursor = cursor.sort("request_date", -1)  # Served by the (user_id, request_date) index
+
+    return FastJSONResponse(await cursor.to_list(length=None))
 
 
 @user_router.get("/{user_id}", response_model=dict)
@@ -29,16 +153,13 @@ async def get_user(user_id: str, current_user: dict = Depends(get_current_user))
             detail="Access denied"
         )
 
-    return user_helper(current_user)
+    return FastJSONResponse(await projected_current_user(current_user, "user", USER_PROJECTION))
 
 
-@user_router.post("/verification-request", response_model=dict)
-async def submit_verification_request(
-        request_data: VerificationRequestInput = Body(...),
-        current_user: dict = Depends(get_current_user)
-):
+async def verification_requester_id(current_user: dict) -> str:
     """
-    Submit a verification request
+    The id of the user submitting a verification request, who must not have one pending already.
+    Checked before the ID scans are stored, so a refused request leaves no images behind.
     """
     db = await get_db()
 
@@ -67,17 +188,26 @@ async def submit_verification_request(
             detail="You already have a pending verification request"
         )
 
-    # Create verification request
+    return user_id
+
+
+async def create_verification_request(user_id: str, current_user: dict, address: str,
+                                      about_user_article_link: HttpUrl, id_images: dict) -> dict:
+    """
+    Shared by the JSON and multipart submissions; id_images holds the ID scan fields
+    (base64 and/or image store references) to save on the request
+    """
+    db = await get_db()
+
     verification_request = {
         "user_id": user_id,
         "user_email": current_user.get("email", ""),
         "user_name": f"{current_user.get('first_name', '')} {current_user.get('last_name', '')}",
-        "address": request_data.address,
-        "id_front_image": request_data.id_front_image,
-        "id_back_image": request_data.id_back_image,
-        "about_user_article_link": request_data.about_user_article_link,
+        "address": address,
+        "about_user_article_link": str(about_user_article_link),
         "status": "pending",
         "request_date": datetime.utcnow(),
+        **id_images,
     }
 
     # Insert verification request into database
@@ -89,75 +219,74 @@ async def submit_verification_request(
     }
 
 
-@user_router.get("/verification-requests", response_description="Get all verification requests for the current user")
-async def get_verification_requests(current_user: dict = Depends(get_current_user)):
+@user_router.post("/verification-request", response_model=dict)
+async def submit_verification_request(
+        request_data: VerificationRequestInput = Body(...),
+        current_user: dict = Depends(get_current_user)
+):
     """
-    Get all verification requests for the current user
+    Submit a verification request
     """
-    # Get the database connection
-    db = await get_db()
-
-    # Get user ID from the current user (as string)
-    user_id = current_user["id"]
-
-    print(f"Current user: {current_user}")
-    print(f"Looking for verification requests with user_id: {user_id}")
-
-    # First check if there are ANY verification requests in the collection
-    all_requests_count = await db["VerificationRequests"].count_documents({})
-    print(f"Total documents in VerificationRequests collection: {all_requests_count}")
-
-    # Try to find ALL verification requests first
-    all_requests = []
-    async for doc in db["VerificationRequests"].find().limit(5):
-        print(f"Sample document: {doc}")
-        if "user_id" in doc:
-            print(f"Sample user_id: {doc['user_id']} (type: {type(doc['user_id']).__name__})")
-        all_requests.append(doc)
-
-    print(f"Sample of {len(all_requests)} documents from collection")
-
-    # Now try different ways to find documents for this specific user
-
-    # 1. Try exact match
-    cursor = db["VerificationRequests"].find({"user_id": user_id})
-
-    verification_requests = []
-    async for request in cursor:
-        # Keep a copy of the original document for inspection
-        request_copy = dict(request)
-
-        # Add a string id for API response
-        request_copy["id"] = str(request["_id"])
-
-        # Format date if needed
-        if "request_date" in request_copy and isinstance(request_copy["request_date"], datetime):
-            request_copy["request_date"] = request_copy["request_date"].strftime("%Y-%m-%d %H:%M:%S")
-
-        verification_requests.append(request_copy)
-
-    print(f"Found {len(verification_requests)} verification requests for user_id: {user_id}")
+    user_id = await verification_requester_id(current_user)
+
+    # The ID scans are also put in the private image store so that admins get them as URLs
+    id_images = {}
+    for field in ("id_front_image", "id_back_image"):
+        value = getattr(request_data, field)
+        id_images[field] = value
+        try:
+            id_images[f"{field}_ref"] = await put_image_file(await image_from_form(None, value, field), private=True)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+        except ValueError:
+            pass
+
+    return await create_verification_request(user_id, current_user, request_data.address,
+                                             request_data.about_user_article_link, id_images)
+
+
+@user_router.post("/verification-request/upload", response_model=dict)
+async def upload_verification_request(
+        address: str = Form(..., description="User's physical address"),
+        about_user_article_link: HttpUrl = Form(..., description="Link to an article about the user"),
+        id_front_image: UploadFile = File(..., description="Image of the ID front"),
+        id_back_image: UploadFile = File(..., description="Image of the ID back"),
+        current_user: dict = Depends(get_current_user)
+):
+    """
+    Submit a verification request with the ID scans as multipart file parts; they go
+    straight from the spooled upload into the private image store
+    """
+    user_id = await verification_requester_id(current_user)
 
-    # If nothing found, try a more flexible approach
-    if not verification_requests and all_requests:
-        print("Trying more flexible match...")
-        # This is a diagnostic step to see if we can find the user's requests with different approaches
-        for doc in all_requests:
-            if "user_id" in doc and doc["user_id"] == user_id:
-                print(f"Found match with exact string comparison!")
-            elif "user_id" in doc and str(doc["user_id"]) == user_id:
-                print(f"Found match after converting to string!")
+    id_images = {}
+    for field, upload in (("id_front_image", id_front_image), ("id_back_image", id_back_image)):
+        try:
+            image = await spool_upload(upload)
+        except ValueError as e:
+            raise upload_http_error(e)
+        id_images[field] = ""
+        id_images[f"{field}_ref"] = await put_image_file(image, private=True)
 
-    # Return whatever we found
-    return verification_requests
+    return await create_verification_request(user_id, current_user, address, about_user_article_link, id_images)
 
 
 @user_router.get("/users/me", response_model=dict)
-async def get_logged_in_user_details(current_user: dict = Depends(get_current_user)):
+async def get_logged_in_user_details(request: Request, current_user: dict = Depends(get_current_user)):
     """
     Fetch the logged-in user's details
     """
-    return user_details_helper(current_user)
+    return await current_user_response(request, current_user, "user-details", USER_DETAILS_PROJECTION)
+
+
+async def store_profile_image(image: SpooledImage):
+    """
+    Put a profile/cover image and its renditions into the image store
+    """
+    stored, derivatives = await asyncio.gather(put_image_file(image), create_derivatives(image.read()))
+    stored.update(derivatives)
+    return stored
+
 
 @user_router.put("/me/profile", response_model=dict)
 async def update_user_profile(
@@ -169,25 +298,42 @@ async def update_user_profile(
     """
     db = await get_db()
 
-    # Update the user's first_name, last_name, and bio in the database
+    profile_update = {
+        "first_name": update_data.first_name,
+        "last_name": update_data.last_name,
+        "contact": update_data.contact,
+        "profile_image": update_data.profile_image,
+        "cover_image": update_data.cover_image,
+        "bio": update_data.bio,
+        "facebook": update_data.facebook,
+        "instagram": update_data.instagram,
+        "twitter": update_data.twitter,
+        "linkedin": update_data.linkedin,
+        "updated_at": datetime.utcnow()
+    }
+
+    # Store changed profile/cover images with their thumbnails
+    for field in ("profile_image", "cover_image"):
+        value = profile_update[field]
+        if value and value != current_user.get(field):
+            try:
+                image = await image_from_form(None, value, field)
+            except UploadTooLarge as e:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+            except ValueError:
+                image = None
+            profile_update[f"{field}_ref"] = await store_profile_image(image) if image else None
+        elif not value:
+            profile_update[f"{field}_ref"] = None
+
+    # Update the user's profile fields in the database
     result = await db["users"].update_one(
         {"_id": current_user["id"]},  # Filter by user ID
-        {
-            "$set": {
-                "first_name": update_data.first_name,
-                "last_name": update_data.last_name,
-                "contact": update_data.contact,
-                "profile_image": update_data.profile_image,
-                "cover_image": update_data.cover_image,
-                "bio": update_data.bio,
-                "facebook": update_data.facebook,
-                "instagram": update_data.instagram,
-                "twitter": update_data.twitter,
-                "linkedin": update_data.linkedin
-            }
-        }
+        {"$set": profile_update}
     )
 
+    invalidate_cached_user(current_user["id"])
+
     if result.modified_count == 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -197,4 +343,41 @@ async def update_user_profile(
     # Return the updated fields
     return {
         "message": "Profile updated successfully"
-    }
\ No newline at end of file
+    }
+
+
+@user_router.put("/me/profile/images", response_model=dict)
+async def update_profile_images(
+    profile_image: Optional[UploadFile] = File(None),
+    cover_image: Optional[UploadFile] = File(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Replace the profile and/or cover image with multipart file parts instead of base64
+    """
+    uploads = {field: upload for field, upload in (("profile_image", profile_image), ("cover_image", cover_image))
+               if upload is not None}
+    if not uploads:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Send profile_image and/or cover_image")
+
+    images = {}
+    for field, upload in uploads.items():
+        try:
+            images[field] = await spool_upload(upload)
+        except ValueError as e:
+            raise upload_http_error(e)
+
+    profile_update = {"updated_at": datetime.utcnow()}
+    for field, image in images.items():
+        # The stored image replaces any inline base64 copy
+        profile_update[field] = ""
+        profile_update[f"{field}_ref"] = await store_profile_image(image)
+
+    db = await get_db()
+    await db["users"].update_one({"_id": current_user["id"]}, {"$set": profile_update})
+    invalidate_cached_user(current_user["id"])
+
+    return {
+        "message": "Profile images updated successfully",
+        **{f"{field}_urls": image_urls(profile_update[f"{field}_ref"]) for field in images},
+    }
@@ -1,23 +1,75 @@
+import os
 from datetime import datetime
+from typing import Optional
+
 from bson import ObjectId
+from dotenv import load_dotenv
 
+from app.images.derivatives import image_fields_projection
+from app.pagination import apply_after
 
-def user_helper(user) -> dict:
-    """
-    Convert MongoDB user document to a dict with properly formatted fields
-    """
-    user_id = str(user["_id"]) if "_id" in user else user.get("id")
+load_dotenv()
+
+DASHBOARD_HISTORY_PAGE_SIZE = int(os.getenv("DASHBOARD_HISTORY_PAGE_SIZE", 10))
+DASHBOARD_HISTORY_PAGE_MAX = int(os.getenv("DASHBOARD_HISTORY_PAGE_MAX", 100))
+
+# Newest first; user_id + request_date come from the (user_id, request_date) index
+VERIFICATION_HISTORY_SORT = [("request_date", -1), ("_id", -1)]
+
+# History rows leave out the ID scans and profile image
+VERIFICATION_HISTORY_PROJECTION = {
+    "_id": 1,
+    "status": 1,
+    "request_date": 1,
+    "reviewed_at": 1,
+    "address": 1,
+    "about_user_article_link": 1,
+}
 
-    return {
-        "id": user_id,
-        "first_name": user["first_name"],
-        "last_name": user["last_name"],
-        "email": user["email"],
-        "contact": user["contact"],
-        "birthday": user["birthday"],
-        "created_at": user["created_at"],
-        "updated_at": user["updated_at"]
-    }
+
+# The /me representation, shaped by MongoDB itself
+USER_PROJECTION = {
+    "_id": 0,
+    "id": {"$toString": "$_id"},
+    "first_name": 1,
+    "last_name": 1,
+    "email": 1,
+    "contact": 1,
+    "birthday": 1,
+    "created_at": 1,
+    "updated_at": 1,
+}
+
+
+def _or_empty(field: str, default=""):
+    return {"$ifNull": [f"${field}", default]}
+
+
+# The user details representation; every field is an expression, so it can also be nested
+# under another field of a $project (see user_dashboard_pipeline)
+USER_DETAILS_FIELDS = {
+    "id": {"$toString": "$_id"},
+    "first_name": _or_empty("first_name"),
+    "last_name": _or_empty("last_name"),
+    "email": _or_empty("email"),
+    "contact": _or_empty("contact"),
+    "birthday": _or_empty("birthday"),
+    # Stored images are returned as URLs to /api/images instead of base64
+    **image_fields_projection("profile_image"),
+    **image_fields_projection("cover_image"),
+    "user_type": _or_empty("user_type"),
+    "bio": _or_empty("bio"),
+    "facebook": _or_empty("facebook"),
+    "instagram": _or_empty("instagram"),
+    "twitter": _or_empty("twitter"),
+    "linkedin": _or_empty("linkedin"),
+    "verification_status": _or_empty("verification_status"),
+    "artworks_count": _or_empty("artworks_count", 0),
+    "created_at": _or_empty("created_at"),
+    "updated_at": _or_empty("updated_at"),
+}
+
+USER_DETAILS_PROJECTION = {"_id": 0, **USER_DETAILS_FIELDS}
 
 
 def parse_user_from_db(user_data):
@@ -55,26 +107,42 @@ def verification_request_helper(request) -> dict:
 
 
 
-def user_details_helper(user) -> dict:
+def user_dashboard_pipeline(user_id: str, limit: int, after: Optional[str] = None) -> list:
     """
-    Format user details for response
+    The user's profile (shaped like /users/me) and NFT counters, one page of their verification
+    history and their latest request in one round trip; each $lookup is an equality join on the
+    user_id index. Raises ValueError for a bad cursor.
     """
-    return {
-        "id": str(user["id"]),
-        "first_name": user.get("first_name", ""),
-        "last_name": user.get("last_name", ""),
-        "email": user.get("email", ""),
-        "contact": user.get("contact", ""),
-        "birthday": user.get("birthday", ""),
-        "profile_image": user.get("profile_image", ""),
-        "cover_image": user.get("cover_image", ""),
-        "user_type": user.get("user_type", ""),
-        "bio": user.get("bio", ""),
-        "facebook": user.get("facebook", ""),
-        "instagram": user.get("instagram", ""),
-        "twitter": user.get("twitter", ""),
-        "linkedin": user.get("linkedin", ""),
-        "verification_status": user.get("verification_status", ""),
-        "created_at": user.get("created_at", ""),
-        "updated_at": user.get("updated_at", "")
-    }
\ No newline at end of file
+    sort = dict(VERIFICATION_HISTORY_SORT)
+    return [
+        {"$match": {"_id": user_id}},
+        {"$lookup": {
+            "from": "VerificationRequests",
+            "localField": "_id",
+            "foreignField": "user_id",
+            "pipeline": [
+                {"$match": apply_after({}, VERIFICATION_HISTORY_SORT, after)},
+                {"$sort": sort},
+                {"$limit": limit + 1},
+                {"$project": VERIFICATION_HISTORY_PROJECTION},
+            ],
+            "as": "verification_history",
+        }},
+        {"$lookup": {
+            "from": "VerificationRequests",
+            "localField": "_id",
+            "foreignField": "user_id",
+            "pipeline": [{"$sort": sort}, {"$limit": 1}, {"$project": VERIFICATION_HISTORY_PROJECTION}],
+            "as": "latest_verification",
+        }},
+        {"$project": {
+            "_id": 0,
+            "profile": USER_DETAILS_FIELDS,
+            "verification_status": 1,
+            "artworks_count": 1,
+            "artworks_total_price": 1,
+            "artworks_by_art_type": 1,
+            "verification_history": 1,
+            "latest_verification": 1,
+        }},
+    ]
@@ -0,0 +1,147 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+
+class WorkerPoolBusy(Exception):
+    """
+    Raised when a bounded worker pool has no room left in its queue
+    """
+
+
+def _timed_call(fn: Callable, *args):
+    """
+    Run fn inside the worker and report how long the call itself took
+    """
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+class BoundedExecutor:
+    """
+    Run blocking (CPU-bound) callables off the event loop in a thread or process pool.
+
+    At most max_workers jobs run at once and at most max_queue more may wait for a worker;
+    anything beyond that is rejected straight away with WorkerPoolBusy instead of piling up.
+    """
+
+    def __init__(self, name: str, kind: str = "thread", max_workers: Optional[int] = None, max_queue: int = 64):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown worker pool kind: {kind}")
+
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._executor = None
+
+        # Guards _pending, which the done-callbacks decrement from the pool's threads
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+        self._failed = 0
+        self._timings: Dict[str, Dict[str, float]] = {}
+
+    def _get_executor(self):
+        # Created lazily so importing a module that owns a pool never forks or spawns threads
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix=self.name)
+        return self._executor
+
+    async def run(self, label: str, fn: Callable, *args):
+        """
+        Run fn(*args) in the pool and return its result
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise WorkerPoolBusy(f"{self.name} pool is busy, try again later")
+            self._pending += 1
+
+        submitted = time.perf_counter()
+        try:
+            future = self._get_executor().submit(_timed_call, fn, *args)
+        except BrokenExecutor:
+            self._release()
+            self._reset_executor()
+            raise
+        except Exception:
+            self._release()
+            raise
+        # The slot is freed when the work finishes, not when the caller stops waiting: a cancelled
+        # caller leaves a started job running in the pool, and it still counts against the bound
+        future.add_done_callback(self._release)
+
+        try:
+            result, run_time = await asyncio.wrap_future(future)
+        except BrokenExecutor:
+            # A process worker died (e.g. killed for memory); start a fresh pool for the next call
+            self._failed += 1
+            self._reset_executor()
+            raise
+        except Exception:
+            self._failed += 1
+            raise
+
+        self._record(label, run_time, time.perf_counter() - submitted - run_time)
+        return result
+
+    def _release(self, future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def _record(self, label: str, run_time: float, wait_time: float):
+        timing = self._timings.setdefault(label, {
+            "count": 0,
+            "total_seconds": 0.0,
+            "max_seconds": 0.0,
+            "total_wait_seconds": 0.0,
+        })
+        timing["count"] += 1
+        timing["total_seconds"] += run_time
+        timing["max_seconds"] = max(timing["max_seconds"], run_time)
+        timing["total_wait_seconds"] += max(wait_time, 0.0)
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self._pending - self.max_workers, 0)
+
+    def stats(self) -> dict:
+        """
+        Snapshot of queue depth and per-operation timings
+        """
+        operations = {}
+        for label, timing in self._timings.items():
+            count = timing["count"]
+            operations[label] = {
+                **timing,
+                "avg_seconds": timing["total_seconds"] / count if count else 0.0,
+                "avg_wait_seconds": timing["total_wait_seconds"] / count if count else 0.0,
+            }
+
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._pending,
+            "queue_depth": self.queue_depth,
+            "rejected": self._rejected,
+            "failed": self._failed,
+            "operations": operations,
+        }
+
+    def _reset_executor(self):
+        broken, self._executor = self._executor, None
+        if broken is not None:
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        self._reset_executor()
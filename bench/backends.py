@@ -0,0 +1,103 @@
+import os
+import time
+import asyncio
+import shutil
+import socket
+import tempfile
+import subprocess
+from contextlib import asynccontextmanager
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_for_ping(client, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await client.admin.command("ping")
+            return
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+@asynccontextmanager
+async def mongod_backend(mongod_path: str = None):
+    """
+    A throwaway mongod on a free local port with its data in a temporary directory
+    """
+    binary = mongod_path or shutil.which("mongod")
+    if not binary:
+        raise RuntimeError("mongod was not found on PATH; pass --mongod or use --mongo mongomock")
+
+    data_dir = tempfile.mkdtemp(prefix="pixora-bench-")
+    port = _free_port()
+    process = subprocess.Popen(
+        [binary, "--dbpath", data_dir, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.STDOUT,
+    )
+    client = AsyncIOMotorClient(f"mongodb://127.0.0.1:{port}")
+    try:
+        await _wait_for_ping(client)
+        yield client
+    finally:
+        client.close()
+        process.terminate()
+        process.wait(timeout=30)
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+@asynccontextmanager
+async def uri_backend(uri: str, db_name: str):
+    """
+    An existing server; the bench database is dropped before and after the run
+    """
+    client = AsyncIOMotorClient(uri)
+    await _wait_for_ping(client)
+    await client.drop_database(db_name)
+    try:
+        yield client
+    finally:
+        await client.drop_database(db_name)
+        client.close()
+
+
+@asynccontextmanager
+async def mongomock_backend():
+    """
+    In-memory stand-in from mongomock-motor. Good for smoke runs; it has no $text search and
+    its query performance says nothing about a real server's.
+    """
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        raise RuntimeError("mongomock-motor is not installed (pip install -r bench/requirements.txt)")
+
+    yield AsyncMongoMockClient()
+
+
+def open_backend(kind: str, db_name: str, mongod_path: str = None, uri: str = None):
+    if kind == "auto":
+        if uri:
+            kind = "uri"
+        elif mongod_path or shutil.which("mongod"):
+            kind = "mongod"
+        else:
+            kind = "mongomock"
+    print(f"Using MongoDB backend: {kind}")
+
+    if kind == "uri":
+        return uri_backend(uri or os.getenv("MONGODB_URI"), db_name)
+    if kind == "mongod":
+        return mongod_backend(mongod_path)
+    if kind == "mongomock":
+        return mongomock_backend()
+    raise ValueError(f"Unknown MongoDB backend: {kind}")
@@ -0,0 +1,42 @@
+import json
+import asyncio
+import base64
+
+import httpx
+from fastapi import HTTPException
+
+from app.auth.jwt_handler import get_user_from_token
+from app.database import get_db
+
+
+def fake_upstreams(latency_seconds: float = 0.0) -> httpx.MockTransport:
+    """
+    Stand-in for the upload service and the user API, served from inside the process.
+
+    The upload service is expected to insert the NFT document itself (frontend_upload then
+    finds it by id), so the fake does the same against the bench database.
+    """
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        if latency_seconds:
+            await asyncio.sleep(latency_seconds)
+
+        if request.method == "POST" and request.url.path.endswith("/upload"):
+            payload = json.loads(request.content)
+            # Validate like the real service would before storing anything
+            base64.b64decode(payload["imageBase64"], validate=True)
+            db = await get_db()
+            result = await db["NFT"].insert_one({"name": payload["name"], "imageBase64": payload["imageBase64"]})
+            return httpx.Response(200, json={"message": "Image uploaded", "_id": str(result.inserted_id)})
+
+        if request.method == "GET" and request.url.path.endswith("/api/user/me"):
+            token = request.headers.get("authorization", "").removeprefix("Bearer ")
+            try:
+                user = await get_user_from_token(token)
+            except HTTPException as e:
+                return httpx.Response(e.status_code, json={"detail": e.detail})
+            return httpx.Response(200, json={"id": user["id"], "email": user["email"]})
+
+        return httpx.Response(404, json={"detail": "Not found"})
+
+    return httpx.MockTransport(handle)
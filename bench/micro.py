@@ -0,0 +1,66 @@
+import timeit
+from datetime import datetime
+from typing import Callable, Dict
+
+from bson import ObjectId
+
+from app.conditional import make_etag
+from app.pagination import cursor_for, decode_cursor
+from app.responses import dumps
+
+# A user as USER_PROJECTION returns it for /me
+SAMPLE_USER = {
+    "id": str(ObjectId()),
+    "first_name": "Bench",
+    "last_name": "User",
+    "email": "bench@example.com",
+    "contact": "+15550000000",
+    "birthday": "1990-01-01",
+    "created_at": datetime(2024, 1, 1),
+    "updated_at": datetime(2024, 1, 2),
+}
+
+SAMPLE_VERIFICATION_REQUEST = {
+    "_id": ObjectId(),
+    "user_id": SAMPLE_USER["id"],
+    "user_email": SAMPLE_USER["email"],
+    "user_name": "Bench User",
+    "address": "1 Bench Street",
+    "id_front_image": "A" * 20000,
+    "id_back_image": "A" * 20000,
+    "about_user_article_link": "https://example.com/article",
+    "status": "pending",
+    "request_date": datetime(2024, 1, 1, 12, 0),
+    "profile_image": "A" * 8000,
+}
+
+SAMPLE_NFT = {"_id": ObjectId(), "name": "Artwork", "price": 12.5, "art_type": "digital_art"}
+PRICE_SORT = [("price", 1), ("_id", 1)]
+SAMPLE_CURSOR = cursor_for(SAMPLE_NFT, PRICE_SORT)
+
+MICROBENCHMARKS: Dict[str, Callable[[], object]] = {
+    "dumps_user": lambda: dumps(SAMPLE_USER),
+    "dumps_verification_request": lambda: dumps(SAMPLE_VERIFICATION_REQUEST),
+    "make_etag": lambda: make_etag("nfts", 42, [("limit", "50"), ("sort", "recent")]),
+    "cursor_for": lambda: cursor_for(SAMPLE_NFT, PRICE_SORT),
+    "decode_cursor": lambda: decode_cursor(SAMPLE_CURSOR, PRICE_SORT),
+    "dumps_nft_page": lambda: dumps([SAMPLE_NFT] * 50),
+}
+
+
+def run_microbenchmarks(repeat: int = 5, min_seconds: float = 0.2) -> Dict[str, dict]:
+    """
+    Best-of-repeat time per call for each helper, in microseconds
+    """
+    results = {}
+    for name, fn in MICROBENCHMARKS.items():
+        timer = timeit.Timer(fn)
+        number, _ = timer.autorange()
+        number = max(number, int(number * min_seconds / 0.2))
+        timings = timer.repeat(repeat=repeat, number=number)
+        results[name] = {
+            "calls": number,
+            "best_us": min(timings) / number * 1e6,
+            "median_us": sorted(timings)[len(timings) // 2] / number * 1e6,
+        }
+    return results
@@ -0,0 +1,227 @@
+"""
+Load test Pixora in-process against a local MongoDB and fake upstream services.
+
+    python -m bench.run --mongo mongod --concurrency 32 --requests 2000
+    python -m bench.run --scenarios nft_all,user_me --compare bench/results/baseline.json
+
+Boots main:app behind httpx's ASGI transport (no sockets), seeds a fresh database, drives
+each scenario at the requested concurrency and writes throughput, latency percentiles and
+peak RSS to a JSON file that later runs can be compared against.
+"""
+import os
+
+# The app reads its configuration at import time
+os.environ.setdefault("DB_NAME", "pixora_bench")
+os.environ.setdefault("JWT_SECRET_KEY", "pixora-bench-secret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "600")
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import resource
+import subprocess
+from collections import Counter
+from datetime import datetime
+from typing import List
+
+import httpx
+
+from app.auth.password_handler import password_engine
+from app.database import db, init_db
+from app.http_client import init_http_client, close_http_client
+from app.nft.similarity import near_duplicate_index
+from bench.backends import open_backend
+from bench.fakes import fake_upstreams
+from bench.micro import run_microbenchmarks
+from bench.scenarios import SCENARIOS, BenchContext, make_context
+from bench.seed import SeedConfig, seed_database
+from main import app
+
+DEFAULT_SCENARIOS = ",".join(SCENARIOS)
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+async def run_scenario(name: str, context: BenchContext, requests: int, concurrency: int, warmup: int) -> dict:
+    scenario = SCENARIOS[name]
+    for _ in range(warmup):
+        await scenario(context)
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    exceptions: Counter = Counter()
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                response = await scenario(context)
+                statuses[response.status_code] += 1
+            except Exception as e:
+                exceptions[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if status >= 400) + sum(exceptions.values())
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "errors": errors,
+        "status_counts": {str(status): count for status, count in sorted(statuses.items())},
+        "exceptions": dict(exceptions),
+        "elapsed_seconds": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "max": latencies[-1] * 1000 if latencies else 0.0,
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(results: dict, baseline: dict = None):
+    print(f"\n{'scenario':<30}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'rss MB':>9}")
+    for name, result in results["scenarios"].items():
+        latency = result["latency_ms"]
+        line = (f"{name:<30}{result['throughput_rps']:>10.1f}{latency['p50']:>10.2f}{latency['p95']:>10.2f}"
+                f"{latency['p99']:>10.2f}{result['errors']:>8}{result['peak_rss_mb']:>9.1f}")
+        previous = (baseline or {}).get("scenarios", {}).get(name)
+        if previous:
+            rps_change = (result["throughput_rps"] / previous["throughput_rps"] - 1) * 100 if previous["throughput_rps"] else 0.0
+            p95_change = (latency["p95"] / previous["latency_ms"]["p95"] - 1) * 100 if previous["latency_ms"]["p95"] else 0.0
+            line += f"   rps {rps_change:+.1f}%  p95 {p95_change:+.1f}%"
+        print(line)
+
+    if results.get("micro"):
+        print(f"\n{'helper':<30}{'best us':>10}{'median us':>12}")
+        for name, result in results["micro"].items():
+            line = f"{name:<30}{result['best_us']:>10.3f}{result['median_us']:>12.3f}"
+            previous = (baseline or {}).get("micro", {}).get(name)
+            if previous and previous["best_us"]:
+                line += f"   {(result['best_us'] / previous['best_us'] - 1) * 100:+.1f}%"
+            print(line)
+
+
+async def main(args) -> dict:
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)} (available: {DEFAULT_SCENARIOS})")
+
+    seed_config = SeedConfig(users=args.users, nfts=args.nfts, verification_requests=args.verification_requests,
+                             image_size=args.image_size, seed=args.seed)
+    results = {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "backend": args.mongo,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "upstream_latency_ms": args.upstream_latency_ms,
+            "seed": vars(seed_config),
+        },
+        "scenarios": {},
+    }
+
+    async with open_backend(args.mongo, db.db_name, args.mongod, args.mongo_uri) as client:
+        # Same startup as the app lifespan, but with the stand-in database and upstreams
+        db.client = client
+        await init_db()
+        await init_http_client(transport=fake_upstreams(args.upstream_latency_ms / 1000))
+        data = await seed_database(seed_config)
+        await near_duplicate_index.rebuild()
+
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+                context = make_context(http, data, args.seed, args.image_size)
+                for name in names:
+                    print(f"Running {name}...")
+                    results["scenarios"][name] = await run_scenario(
+                        name, context, args.requests, args.concurrency, args.warmup
+                    )
+        finally:
+            await close_http_client()
+            password_engine.shutdown()
+            db.client = None
+
+    if not args.skip_micro:
+        results["micro"] = run_microbenchmarks()
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo", default="auto", choices=("auto", "mongod", "mongomock", "uri"),
+                        help="MongoDB stand-in; auto prefers --mongo-uri, then a mongod binary, then mongomock")
+    parser.add_argument("--mongod", help="Path to the mongod binary (default: from PATH)")
+    parser.add_argument("--mongo-uri", help="Existing server to use; its bench database is dropped")
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS, help="Comma-separated scenario names")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests before each scenario")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--nfts", type=int, default=1000)
+    parser.add_argument("--verification-requests", type=int, default=300)
+    parser.add_argument("--image-size", type=int, default=256, help="NFT image width/height in pixels")
+    parser.add_argument("--upstream-latency-ms", type=float, default=0.0,
+                        help="Delay added by the fake upload/user services")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-micro", action="store_true", help="Skip the helper microbenchmarks")
+    parser.add_argument("--output", help="Results file (default: bench/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(main(args))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.utcnow().strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
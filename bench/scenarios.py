@@ -0,0 +1,94 @@
+import random
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+import numpy as np
+
+from app.auth.jwt_handler import create_access_token
+from bench.seed import BENCH_PASSWORD, SeedData, make_image_base64
+
+
+@dataclass
+class BenchContext:
+    client: httpx.AsyncClient
+    data: SeedData
+    tokens: List[str]
+    rng: random.Random
+    image_rng: np.random.Generator
+    image_size: int
+
+
+def make_context(client: httpx.AsyncClient, data: SeedData, seed: int, image_size: int) -> BenchContext:
+    tokens = [create_access_token(data={"sub": user_id}) for user_id in data.user_ids]
+    return BenchContext(client, data, tokens, random.Random(seed), np.random.default_rng(seed + 1), image_size)
+
+
+def _auth(context: BenchContext) -> dict:
+    return {"Authorization": f"Bearer {context.rng.choice(context.tokens)}"}
+
+
+async def login(context: BenchContext) -> httpx.Response:
+    email = context.rng.choice(context.data.emails)
+    return await context.client.post("/api/auth/login", data={"username": email, "password": BENCH_PASSWORD})
+
+
+async def user_me(context: BenchContext) -> httpx.Response:
+    return await context.client.get("/api/user/me", headers=_auth(context))
+
+
+async def user_dashboard(context: BenchContext) -> httpx.Response:
+    return await context.client.get("/api/user/dashboard", headers=_auth(context))
+
+
+async def nft_all(context: BenchContext) -> httpx.Response:
+    return await context.client.get("/api/nft/all", params={"limit": 50})
+
+
+async def nft_all_images(context: BenchContext) -> httpx.Response:
+    return await context.client.get("/api/nft/all", params={"limit": 20, "include_image": "true"})
+
+
+async def nft_owner_portfolio(context: BenchContext) -> httpx.Response:
+    return await context.client.get(f"/api/nft/owners/{context.rng.choice(context.data.user_ids)}",
+                                    params={"limit": 50})
+
+
+async def frontend_upload(context: BenchContext) -> httpx.Response:
+    # Every upload is a new image, so the duplicate checks never short-circuit the work
+    return await context.client.post("/api/nft/frontend_upload", data={
+        "imageBase64": make_image_base64(context.image_rng, context.image_size),
+        "name": f"Bench upload {context.rng.getrandbits(48):x}",
+        "access_token": context.rng.choice(context.tokens),
+        "art_type": context.rng.choice(("digital_art", "photography")),
+        "description": "Uploaded by the benchmark",
+        "price": f"{context.rng.uniform(1, 2000):.2f}",
+    })
+
+
+async def admin_verification_requests(context: BenchContext) -> httpx.Response:
+    return await context.client.get("/api/admin/verification-requests")
+
+
+async def admin_pending_requests(context: BenchContext) -> httpx.Response:
+    return await context.client.get("/api/admin/pending-verification-requests")
+
+
+async def admin_verification_queue(context: BenchContext) -> httpx.Response:
+    return await context.client.get("/api/admin/verification-queue", params={"status": "pending"})
+
+
+Scenario = Callable[[BenchContext], Awaitable[httpx.Response]]
+
+SCENARIOS: Dict[str, Scenario] = {
+    "login": login,
+    "user_me": user_me,
+    "user_dashboard": user_dashboard,
+    "nft_all": nft_all,
+    "nft_all_images": nft_all_images,
+    "nft_owner_portfolio": nft_owner_portfolio,
+    "frontend_upload": frontend_upload,
+    "admin_verification_requests": admin_verification_requests,
+    "admin_pending_requests": admin_pending_requests,
+    "admin_verification_queue": admin_verification_queue,
+}
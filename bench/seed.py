@@ -0,0 +1,133 @@
+import io
+import base64
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List
+
+import numpy as np
+from bson import ObjectId
+from PIL import Image
+
+from app.auth.password_handler import password_engine
+from app.database import get_db
+from app.images.store import content_hash
+from app.nft.counters import rebuild_artwork_counters
+
+BENCH_PASSWORD = "BenchPassword1!"
+
+ART_TYPES = ("digital_art", "photography")
+STATUSES = ("pending", "approved", "rejected")
+
+
+@dataclass
+class SeedConfig:
+    users: int = 200
+    nfts: int = 1000
+    verification_requests: int = 300
+    image_size: int = 256  # pixels per side of NFT images; profile and ID images are smaller
+    seed: int = 42
+
+
+@dataclass
+class SeedData:
+    user_ids: List[str] = field(default_factory=list)
+    emails: List[str] = field(default_factory=list)
+
+
+def make_image(rng: np.random.Generator, size: int, fmt: str = "PNG") -> bytes:
+    """
+    A distinct image: a random colour gradient with noise, so sizes are photo-like rather than tiny
+    """
+    x = np.linspace(0, 1, size)[None, :, None]
+    y = np.linspace(0, 1, size)[:, None, None]
+    start, end = rng.integers(0, 256, 3), rng.integers(0, 256, 3)
+    gradient = start + (end - start) * (x + y) / 2
+    noise = rng.normal(0, 24, (size, size, 3))
+    pixels = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+
+    buffer = io.BytesIO()
+    Image.fromarray(pixels, "RGB").save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def make_image_base64(rng: np.random.Generator, size: int, fmt: str = "PNG") -> str:
+    return base64.b64encode(make_image(rng, size, fmt)).decode("ascii")
+
+
+async def seed_database(config: SeedConfig) -> SeedData:
+    """
+    Users with profile images, NFTs with inline base64 images (as the upload service leaves
+    them) and verification requests with ID images
+    """
+    db = await get_db()
+    rng = np.random.default_rng(config.seed)
+    chooser = random.Random(config.seed)
+    data = SeedData()
+    now = datetime.utcnow()
+
+    # One bcrypt hash shared by every account keeps seeding fast; login still pays full cost
+    hashed_password = await password_engine.hash(BENCH_PASSWORD)
+
+    users = []
+    for n in range(config.users):
+        user_id = str(ObjectId())
+        created_at = now - timedelta(days=chooser.randint(0, 365))
+        users.append({
+            "_id": user_id,
+            "first_name": f"Bench{n}",
+            "last_name": "User",
+            "email": f"bench{n}@example.com",
+            "password": hashed_password,
+            "contact": f"+1555{n:07d}",
+            "birthday": "1990-01-01",
+            "bio": "Digital artist " * 8,
+            "profile_image": make_image_base64(rng, 96, "JPEG"),
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+        data.user_ids.append(user_id)
+        data.emails.append(users[-1]["email"])
+    if users:
+        await db["users"].insert_many(users)
+
+    batch = []
+    for n in range(config.nfts):
+        image = make_image(rng, config.image_size)
+        batch.append({
+            "name": f"Artwork {n}",
+            "imageBase64": base64.b64encode(image).decode("ascii"),
+            "art_type": chooser.choice(ART_TYPES),
+            "nft_owner": chooser.choice(data.user_ids) if data.user_ids else None,
+            "description": f"Bench artwork number {n}",
+            "price": round(chooser.uniform(1, 2000), 2),
+            "content_hash": content_hash(image),
+        })
+        if len(batch) == 200:
+            await db["NFT"].insert_many(batch)
+            batch = []
+    if batch:
+        await db["NFT"].insert_many(batch)
+    # Inserted directly, so the per-artist counters are computed the way a backfill would
+    await rebuild_artwork_counters()
+
+    requests = []
+    for n in range(config.verification_requests):
+        user_index = n % max(len(data.user_ids), 1)
+        requests.append({
+            "user_id": data.user_ids[user_index] if data.user_ids else str(ObjectId()),
+            "user_email": data.emails[user_index] if data.emails else "",
+            "user_name": f"Bench{user_index} User",
+            "address": f"{n} Bench Street",
+            "id_front_image": make_image_base64(rng, 128, "JPEG"),
+            "id_back_image": make_image_base64(rng, 128, "JPEG"),
+            "about_user_article_link": f"https://example.com/articles/{n}",
+            "status": chooser.choice(STATUSES),
+            "request_date": now - timedelta(minutes=n),
+            "profile_image": users[user_index]["profile_image"] if users else "",
+        })
+    if requests:
+        await db["VerificationRequests"].insert_many(requests)
+
+    print(f"Seeded {len(users)} users, {config.nfts} NFTs and {len(requests)} verification requests")
+    return data
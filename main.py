@@ -1,17 +1,52 @@
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.admin.routes import admin_router
 from app.auth.routes import auth_router
+from app.images.routes import images_router
 from app.nft.routes import nft_router
 from app.user.routes import user_router
-from app.database import init_db, db
+from app.auth.jwt_handler import user_cache, user_view_cache
+from app.auth.password_handler import password_engine
+from app.auth.user_import import import_pool
+from app.database import init_db, close_db, db, pool_stats
+from app.http_client import init_http_client, close_http_client, http_client_stats
+from app.images.derivatives import image_pool
+from app.images.uploads import UploadSizeLimitMiddleware
+from app.metrics import CONTENT_TYPE, MetricsMiddleware, registry, stats_collector
+from app.nft.jobs import upload_workers
+from app.nft.models import NFT_BATCH_MAX_BYTES
+from app.nft.similarity import near_duplicate_index
+from app.responses import FastJSONResponse
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Code to run on startup
+    await init_db()
+    await init_http_client()
+    await near_duplicate_index.rebuild()
+    await upload_workers.start()
+    yield
+    # Code to run on shutdown
+    await upload_workers.stop()
+    await close_http_client()
+    password_engine.shutdown()
+    import_pool.shutdown()
+    close_db()
 
 app = FastAPI(title="pixora API",
-              description="Blockchain-based Photos/Digital Art publishing, buying & selling platform")
+              description="Blockchain-based Photos/Digital Art publishing, buying & selling platform",
+              lifespan=lifespan,
+              default_response_class=FastJSONResponse)
 
+# Refuses oversized request bodies before they are parsed; added before CORS (so it runs
+# inside it) for its 413 to carry the CORS headers the browser needs to read it. Multipart
+# batch uploads get room for their images plus the form fields.
+app.add_middleware(UploadSizeLimitMiddleware,
+                   multipart_path_limits={"/api/nft/batch_upload/files": NFT_BATCH_MAX_BYTES + 1024 * 1024})
 #CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -20,16 +55,23 @@ app.add_middleware(
     allow_methods=["*"],  # Allow all HTTP methods
     allow_headers=["*"],  # Allow all headers
 )
+# Outermost, so latency includes every other middleware
+app.add_middleware(MetricsMiddleware)
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Code to run on startup
-    await init_db()
-    yield
+# Component stats that /health reports, scraped as gauges
+stats_collector("pixora_mongo_pool", "MongoDB connection pool", pool_stats)
+stats_collector("pixora_password_pool", "Password hashing pool", password_engine.stats)
+stats_collector("pixora_image_pool", "Image processing pool", image_pool.stats)
+stats_collector("pixora_user_cache", "Token user cache", user_cache.stats)
+stats_collector("pixora_user_view_cache", "Projected user response cache", user_view_cache.stats)
+stats_collector("pixora_upstream", "Upstream circuit breaker", http_client_stats, label="host")
+stats_collector("pixora_near_duplicate_index", "Near-duplicate index", near_duplicate_index.stats)
+stats_collector("pixora_upload_jobs", "Upload job workers", upload_workers.stats)
 
 app.include_router(auth_router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(user_router, prefix="/api/user", tags=["Users"])
 app.include_router(nft_router, prefix="/api/nft", tags=["NFTs"])
+app.include_router(images_router, prefix="/api/images", tags=["Images"])
 
 app.include_router(admin_router, prefix="/api/admin", tags=["Admin"])
 
@@ -37,11 +79,24 @@ app.include_router(admin_router, prefix="/api/admin", tags=["Admin"])
 def read_root():
     return {"Pixora FastAPI"}
 
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+def metrics():
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
 @app.get("/health", tags=["Health"])
 async def health_check():
+    stats = {
+        "password_engine": password_engine.stats(),
+        "user_cache": user_cache.stats(),
+        "user_view_cache": user_view_cache.stats(),
+        "upstreams": http_client_stats(),
+        "mongo_pool": pool_stats(),
+        "near_duplicate_index": near_duplicate_index.stats(),
+        "upload_jobs": upload_workers.stats(),
+    }
     try:
         # Check if MongoDB is connected
         await db.client.admin.command('ping')
-        return {"status": "healthy", "database": "connected"}
+        return {"status": "healthy", "database": "connected", **stats}
     except Exception as e:
-        return {"status": "unhealthy", "database": str(e)}
\ No newline at end of file
+        return {"status": "unhealthy", "database": str(e), **stats}
\ No newline at end of file
@@ -0,0 +1,5 @@
+import os
+
+# Importing the app needs the JWT settings; real values come from .env in a deployment
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
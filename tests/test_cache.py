@@ -0,0 +1,87 @@
+import pytest
+
+from app import cache
+from app.cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_get_returns_stored_value(clock):
+    users = TTLCache(max_size=4, ttl_seconds=10)
+    users.set("a", {"name": "Ann"})
+
+    assert users.get("a") == {"name": "Ann"}
+    assert users.get("b") is None
+    assert users.stats()["hits"] == 1
+    assert users.stats()["misses"] == 1
+
+
+def test_entries_expire_after_ttl(clock):
+    users = TTLCache(max_size=4, ttl_seconds=10)
+    users.set("a", 1)
+
+    clock[0] += 9.9
+    assert users.get("a") == 1
+    clock[0] += 0.1
+    assert users.get("a") is None
+    assert len(users) == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    users = TTLCache(max_size=2, ttl_seconds=10)
+    users.set("a", 1)
+    users.set("b", 2)
+    users.get("a")
+    users.set("c", 3)
+
+    assert users.get("b") is None
+    assert users.get("a") == 1
+    assert users.get("c") == 3
+    assert users.stats()["evictions"] == 1
+
+
+def test_set_refreshes_expiry(clock):
+    users = TTLCache(max_size=2, ttl_seconds=10)
+    users.set("a", 1)
+    clock[0] += 8
+    users.set("a", 2)
+    clock[0] += 8
+
+    assert users.get("a") == 2
+
+
+def test_invalidate_counts_only_present_keys(clock):
+    users = TTLCache(max_size=2, ttl_seconds=10)
+    users.set("a", 1)
+    users.invalidate("a")
+    users.invalidate("a")
+
+    assert users.get("a") is None
+    assert users.stats()["invalidations"] == 1
+
+
+@pytest.mark.parametrize("max_size, ttl_seconds", [(0, 10), (4, 0)])
+def test_disabled_cache_stores_nothing(clock, max_size, ttl_seconds):
+    users = TTLCache(max_size=max_size, ttl_seconds=ttl_seconds)
+    users.set("a", 1)
+
+    assert users.get("a") is None
+    assert len(users) == 0
+
+
+def test_clear_and_hit_ratio(clock):
+    users = TTLCache(max_size=4, ttl_seconds=10)
+    users.set("a", 1)
+    users.get("a")
+    users.get("a")
+    users.get("b")
+    users.clear()
+
+    stats = users.stats()
+    assert stats["size"] == 0
+    assert stats["hit_ratio"] == pytest.approx(2 / 3)
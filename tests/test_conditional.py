@@ -0,0 +1,30 @@
+import pytest
+from starlette.requests import Request
+
+from app.conditional import etag_matches, make_etag
+
+
+def request_with(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match is not None else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_make_etag_is_stable_and_quoted():
+    etag = make_etag(3, "user-1", {"limit": 20, "after": None})
+
+    assert etag == make_etag(3, "user-1", {"after": None, "limit": 20})
+    assert etag != make_etag(4, "user-1", {"limit": 20, "after": None})
+    assert etag.startswith('"') and etag.endswith('"') and len(etag) == 34
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ("", False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"other", W/"abc"', True),
+    ("*", True),
+    ('"abcd"', False),
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(request_with(header), '"abc"') is matches
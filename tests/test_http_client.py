@@ -0,0 +1,80 @@
+import pytest
+
+from app import http_client
+from app.http_client import CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(http_client.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("upstream", failure_threshold=3, reset_seconds=30)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == "closed"
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.stats() == {"state": "open", "failures": 3, "rejected": 1}
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker("upstream", failure_threshold=2, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == "closed"
+    assert breaker.failures == 1
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker("upstream", failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+
+    clock[0] += 30
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker("upstream", failure_threshold=5, reset_seconds=30)
+    for _ in range(5):
+        breaker.record_failure()
+
+    clock[0] += 30
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock[0] += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_released_probe_lets_next_call_probe(clock):
+    breaker = CircuitBreaker("upstream", failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+
+    clock[0] += 30
+    breaker.before_call()
+    breaker.release_probe()
+    assert breaker.state == "open"
+
+    breaker.before_call()
+    assert breaker.state == "half_open"
@@ -0,0 +1,26 @@
+import importlib
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+MODULES = ["main"] + sorted(
+    ".".join(path.relative_to(ROOT).with_suffix("").parts)
+    for package in ("app", "bench")
+    for path in (ROOT / package).rglob("*.py")
+)
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_module_imports(module):
+    importlib.import_module(module)
+
+
+def test_bench_entry_point_parses_help(capsys):
+    from bench.run import parse_args
+
+    with pytest.raises(SystemExit) as exit_info:
+        parse_args(["--help"])
+
+    assert exit_info.value.code == 0
+    assert "--mongo" in capsys.readouterr().out
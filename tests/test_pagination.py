@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+
+from app.pagination import apply_after, cursor_for, decode_cursor, encode_cursor, keyset_filter
+
+SORT = [("created_at", -1), ("_id", -1)]
+
+
+def test_cursor_round_trips_object_ids_and_datetimes():
+    document = {
+        "_id": ObjectId(),
+        "created_at": datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc),
+        "name": "not part of the cursor",
+    }
+
+    token = cursor_for(document, SORT)
+
+    assert "=" not in token
+    assert decode_cursor(token, SORT) == {"_id": document["_id"], "created_at": document["created_at"]}
+
+
+def test_cursor_round_trips_plain_values():
+    sort = [("price", 1), ("_id", 1)]
+    token = encode_cursor({"price": 12.5, "_id": "abc"})
+
+    assert decode_cursor(token, sort) == {"price": 12.5, "_id": "abc"}
+
+
+@pytest.mark.parametrize("token", ["not a cursor!", "e30", encode_cursor({"price": 1, "_id": 1})])
+def test_bad_cursor_raises_value_error(token):
+    # "e30" is an empty object, the last one was made for a different sort
+    with pytest.raises(ValueError):
+        decode_cursor(token, SORT)
+
+
+def test_malformed_values_raise_value_error():
+    token = encode_cursor({"created_at": {"$date": "yesterday"}, "_id": {"$oid": "zz"}})
+
+    with pytest.raises(ValueError):
+        decode_cursor(token, SORT)
+
+
+def test_keyset_filter_breaks_ties_on_later_fields():
+    last = {"created_at": datetime(2024, 5, 1), "_id": ObjectId()}
+
+    assert keyset_filter(SORT, last) == {"$or": [
+        {"created_at": {"$lt": last["created_at"]}},
+        {"created_at": last["created_at"], "_id": {"$lt": last["_id"]}},
+    ]}
+    assert keyset_filter([("_id", 1)], last) == {"_id": {"$gt": last["_id"]}}
+
+
+def test_apply_after():
+    last = {"_id": ObjectId()}
+    token = cursor_for(last, [("_id", 1)])
+
+    assert apply_after({"status": "listed"}, [("_id", 1)]) == {"status": "listed"}
+    assert apply_after({}, [("_id", 1)], token) == {"_id": {"$gt": last["_id"]}}
+    assert apply_after({"status": "listed"}, [("_id", 1)], token) == {
+        "$and": [{"status": "listed"}, {"_id": {"$gt": last["_id"]}}]
+    }
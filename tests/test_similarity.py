@@ -0,0 +1,86 @@
+import random
+
+import numpy as np
+import pytest
+
+from app.nft.similarity import BKTree, _popcount64, cluster_near_duplicates, hamming, near_duplicate_pairs
+
+
+def random_hashes(count, seed=7):
+    rng = random.Random(seed)
+    base = [rng.getrandbits(64) for _ in range(count // 4)]
+    # Flip a few bits of existing hashes so that there are near duplicates to find
+    hashes = list(base)
+    while len(hashes) < count:
+        value = rng.choice(base)
+        for _ in range(rng.randint(0, 8)):
+            value ^= 1 << rng.randrange(64)
+        hashes.append(value)
+    return hashes
+
+
+def brute_force_pairs(hashes, max_distance):
+    return {
+        (i, j)
+        for i in range(len(hashes))
+        for j in range(i + 1, len(hashes))
+        if hamming(hashes[i], hashes[j]) <= max_distance
+    }
+
+
+def test_popcount64_matches_bit_count():
+    values = random_hashes(200) + [0, 2 ** 64 - 1]
+
+    counts = _popcount64(np.array(values, dtype=np.uint64))
+
+    assert counts.tolist() == [value.bit_count() for value in values]
+
+
+@pytest.mark.parametrize("radius", [0, 3, 6, 12])
+def test_bk_tree_search_matches_brute_force(radius):
+    hashes = random_hashes(300)
+    tree = BKTree()
+    for index, value in enumerate(hashes):
+        tree.add(value, index)
+
+    for query in hashes[:40]:
+        expected = {(index, hamming(query, value)) for index, value in enumerate(hashes)
+                    if hamming(query, value) <= radius}
+        assert set(tree.search(query, radius)) == expected
+
+    assert tree.size == len(hashes)
+
+
+def test_bk_tree_empty_and_duplicate_keys():
+    tree = BKTree()
+    assert tree.search(0, 64) == []
+
+    tree.add(5, "a")
+    tree.add(5, "b")
+    assert sorted(tree.search(5, 0)) == [("a", 0), ("b", 0)]
+
+
+@pytest.mark.parametrize("block_bytes", [8, 1024, 32 * 1024 * 1024])
+def test_near_duplicate_pairs_matches_brute_force(block_bytes):
+    hashes = random_hashes(150)
+
+    pairs = near_duplicate_pairs(np.array(hashes, dtype=np.uint64), 6, block_bytes=block_bytes)
+
+    assert {(int(i), int(j)) for i, j in pairs} == brute_force_pairs(hashes, 6)
+    assert len(pairs) == len(brute_force_pairs(hashes, 6))
+
+
+def test_near_duplicate_pairs_empty():
+    assert near_duplicate_pairs(np.array([], dtype=np.uint64), 6).shape == (0, 2)
+
+
+def test_cluster_near_duplicates_joins_chains():
+    # a-b and b-c are within 2 bits, a-c is not: all three still end up in one group
+    a, b, c, far = 0, 0b11, 0b1111, 2 ** 64 - 1
+    groups = cluster_near_duplicates(["a", "b", "c", "far", "d"], [a, b, c, far, far ^ 1], 2)
+
+    assert groups == [["a", "b", "c"], ["far", "d"]]
+
+
+def test_cluster_near_duplicates_drops_singletons():
+    assert cluster_near_duplicates(["a", "b"], [0, 2 ** 64 - 1], 6) == []
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.workers import BoundedExecutor, WorkerPoolBusy
+
+
+def test_run_returns_result_and_records_timing():
+    async def main():
+        pool = BoundedExecutor("test", max_workers=2, max_queue=2)
+        try:
+            assert await pool.run("add", lambda a, b: a + b, 2, 3) == 5
+            return pool.stats()
+        finally:
+            pool.shutdown()
+
+    stats = asyncio.run(main())
+    assert stats["in_flight"] == 0
+    assert stats["operations"]["add"]["count"] == 1
+
+
+def test_rejects_beyond_workers_plus_queue():
+    release = threading.Event()
+
+    async def main():
+        pool = BoundedExecutor("test", max_workers=1, max_queue=1)
+        try:
+            running = [asyncio.ensure_future(pool.run("wait", release.wait)) for _ in range(2)]
+            await asyncio.sleep(0)
+            assert pool.queue_depth == 1
+
+            with pytest.raises(WorkerPoolBusy):
+                await pool.run("wait", release.wait)
+
+            release.set()
+            await asyncio.gather(*running)
+            return pool.stats()
+        finally:
+            release.set()
+            pool.shutdown()
+
+    stats = asyncio.run(main())
+    assert stats["rejected"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_failure_releases_slot():
+    def fail():
+        raise RuntimeError("boom")
+
+    async def main():
+        pool = BoundedExecutor("test", max_workers=1, max_queue=0)
+        try:
+            with pytest.raises(RuntimeError):
+                await pool.run("fail", fail)
+            assert await pool.run("ok", lambda: "ok") == "ok"
+            return pool.stats()
+        finally:
+            pool.shutdown()
+
+    stats = asyncio.run(main())
+    assert stats["failed"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_cancelled_caller_keeps_slot_until_work_finishes():
+    started = threading.Event()
+    release = threading.Event()
+
+    def work():
+        started.set()
+        release.wait()
+
+    async def main():
+        pool = BoundedExecutor("test", max_workers=1, max_queue=0)
+        try:
+            caller = asyncio.ensure_future(pool.run("work", work))
+            await asyncio.to_thread(started.wait)
+            caller.cancel()
+            await asyncio.gather(caller, return_exceptions=True)
+
+            # The job is still running in the pool, so the only slot is still taken
+            with pytest.raises(WorkerPoolBusy):
+                await pool.run("work", work)
+
+            release.set()
+            for _ in range(100):
+                if pool.stats()["in_flight"] == 0:
+                    break
+                await asyncio.sleep(0.01)
+            return pool.stats()
+        finally:
+            release.set()
+            pool.shutdown()
+
+    assert asyncio.run(main())["in_flight"] == 0
+
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(ValueError):
+        BoundedExecutor("test", kind="fiber")